@@ -0,0 +1,182 @@
+"""Resumable re-evaluation of every player's achievements.
+
+Progress and achievements documents are read as two keyset-paged streams
+in playerId order and merged, so each player is evaluated once against
+both documents and the current DEFAULT_ACHIEVEMENTS. Changes go out as one
+grouped write per batch, at most `concurrency` writes at a time and no
+faster than `rate` players per second.
+
+The checkpoint file holds the last playerId whose batch, and every batch
+before it, has been written. A restarted job resumes after it; batches
+written past the checkpoint are applied again, which changes nothing
+because every change is conditional on the stored document.
+"""
+from collections import deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import time
+
+from achievements import DEFAULT_ACHIEVEMENT_DOCUMENTS, reevaluate_achievements
+from storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+LOG_INTERVAL = 10.0
+
+
+class RateLimiter:
+    """Paces callers to at most `rate` units per second, unlimited when 0"""
+
+    def __init__(self, rate: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.clock = clock
+        self._next = clock()
+
+    async def acquire(self, units: int = 1):
+        if not self.rate:
+            return
+        now = self.clock()
+        wait = self._next - now
+        self._next = max(now, self._next) + units / self.rate
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class Checkpoint:
+    """Job state kept in a JSON file, replaced atomically on every save"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path) as stream:
+                return json.load(stream)
+        except FileNotFoundError:
+            return None
+
+    def save(self, state: Dict[str, Any]):
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as stream:
+            json.dump(state, stream)
+            stream.flush()
+            os.fsync(stream.fileno())
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+async def _documents(page: Callable, after: Optional[str], batch_size: int) -> AsyncIterator[Dict[str, Any]]:
+    while True:
+        documents = await page(after, batch_size)
+        for document in documents:
+            yield document
+        if len(documents) < batch_size:
+            return
+        after = documents[-1]["playerId"]
+
+
+async def _next(documents: AsyncIterator[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    try:
+        return await documents.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def iter_players(storage: StorageBackend, after: Optional[str] = None, batch_size: int = 500) -> AsyncIterator[Tuple[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]:
+    """Every player with a progress or achievements document, as (playerId, progress, achievements)"""
+    progress_documents = _documents(storage.progress_page, after, batch_size)
+    achievement_documents = _documents(storage.achievements_page, after, batch_size)
+    progress_data = await _next(progress_documents)
+    achievements_data = await _next(achievement_documents)
+    while progress_data is not None or achievements_data is not None:
+        progress_id = progress_data["playerId"] if progress_data is not None else None
+        achievements_id = achievements_data["playerId"] if achievements_data is not None else None
+        if achievements_id is None or (progress_id is not None and progress_id < achievements_id):
+            yield progress_id, progress_data, None
+            progress_data = await _next(progress_documents)
+        elif progress_id is None or achievements_id < progress_id:
+            yield achievements_id, None, achievements_data
+            achievements_data = await _next(achievement_documents)
+        else:
+            yield progress_id, progress_data, achievements_data
+            progress_data = await _next(progress_documents)
+            achievements_data = await _next(achievement_documents)
+
+
+async def backfill_achievements(storage: StorageBackend, checkpoint: Checkpoint, batch_size: int = 500,
+                                concurrency: int = 4, rate: float = 0.0, restart: bool = False) -> Dict[str, int]:
+    """Re-evaluate every player's achievements, resuming from the checkpoint unless `restart`"""
+    state = None if restart else checkpoint.load()
+    if state:
+        logger.info("Resuming after player %s", state["after"])
+    else:
+        state = {"after": None, "scanned": 0, "changed": 0}
+
+    limiter = RateLimiter(rate)
+    slots = asyncio.Semaphore(concurrency)
+    # In-flight writes in batch order: (task, last playerId, players scanned, players changed)
+    pending: "deque[Tuple[asyncio.Task, str, int, int]]" = deque()
+    logged_at = time.monotonic()
+
+    async def write(changes: List[Dict[str, Any]]):
+        try:
+            await storage.apply_achievement_changes(changes)
+        finally:
+            slots.release()
+
+    def settle():
+        # The checkpoint only moves past batches whose predecessors are all written
+        nonlocal logged_at
+        settled = False
+        while pending and pending[0][0].done():
+            task, last_id, scanned, changed = pending.popleft()
+            task.result()
+            state["after"] = last_id
+            state["scanned"] += scanned
+            state["changed"] += changed
+            settled = True
+        if settled:
+            checkpoint.save(state)
+            if time.monotonic() - logged_at >= LOG_INTERVAL:
+                logged_at = time.monotonic()
+                logger.info("Scanned %d players, changed %d, at %s", state["scanned"], state["changed"], state["after"])
+
+    async def submit(batch: List[Tuple[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]):
+        await limiter.acquire(len(batch))
+        now = datetime.utcnow()
+        changes = [
+            change for change in (reevaluate_achievements(*player, DEFAULT_ACHIEVEMENT_DOCUMENTS, now) for player in batch)
+            if change is not None
+        ]
+        await slots.acquire()
+        pending.append((asyncio.ensure_future(write(changes)), batch[-1][0], len(batch), len(changes)))
+        settle()
+
+    try:
+        batch = []
+        async for player in iter_players(storage, state["after"], batch_size):
+            batch.append(player)
+            if len(batch) >= batch_size:
+                await submit(batch)
+                batch = []
+        if batch:
+            await submit(batch)
+        while pending:
+            await asyncio.wait([pending[0][0]])
+            settle()
+    except BaseException:
+        for task, *_ in pending:
+            task.cancel()
+        raise
+
+    checkpoint.clear()
+    return {"scanned": state["scanned"], "changed": state["changed"]}
@@ -1,7 +1,8 @@
-from typing import List, Dict, Any
-from models import Achievement, PlayerAchievements, PlayerProgress
+from typing import List, Dict, Any, Optional, Tuple
+from models import Achievement, PlayerAchievements, PlayerProgress, SyncLevelComplete, SyncInfiniteScore
 from database import database
 from datetime import datetime
+from progress_format import decode_progress, encode_progress
 
 # Default achievements
 DEFAULT_ACHIEVEMENTS = [
@@ -10,202 +11,305 @@ DEFAULT_ACHIEVEMENTS = [
         "name": "First Steps",
         "description": "Complete your first level",
         "icon": "🌟",
-        "target": 1
+        "target": 1,
+        "metric": "completedLevels"
     },
     {
         "id": "rising-star",
         "name": "Rising Star",
         "description": "Complete 5 levels",
         "icon": "⭐",
-        "target": 5
+        "target": 5,
+        "metric": "completedLevels"
     },
     {
         "id": "cosmic-explorer",
         "name": "Cosmic Explorer",
         "description": "Complete 10 levels",
         "icon": "🚀",
-        "target": 10
+        "target": 10,
+        "metric": "completedLevels"
     },
     {
         "id": "nebula-master",
         "name": "Nebula Master",
         "description": "Complete 25 levels",
         "icon": "🌌",
-        "target": 25
+        "target": 25,
+        "metric": "completedLevels"
     },
     {
         "id": "transcendent",
         "name": "Transcendent",
         "description": "Complete all 50 levels",
         "icon": "✨",
-        "target": 50
+        "target": 50,
+        "metric": "completedLevels"
     },
     {
         "id": "perfect-shot",
         "name": "Perfect Shot",
         "description": "Complete a level with 3 stars",
         "icon": "🎯",
-        "target": 1
+        "target": 1,
+        "metric": "perfectLevels"
     },
     {
         "id": "star-collector",
         "name": "Star Collector",
         "description": "Earn 50 stars total",
         "icon": "⭐",
-        "target": 50
+        "target": 50,
+        "metric": "totalStars"
     },
     {
         "id": "cosmic-perfectionist",
         "name": "Cosmic Perfectionist",
         "description": "Earn 100 stars total",
         "icon": "💫",
-        "target": 100
+        "target": 100,
+        "metric": "totalStars"
     },
     {
         "id": "high-scorer",
         "name": "High Scorer",
         "description": "Score 50,000 points in a single level",
         "icon": "💯",
-        "target": 50000
+        "target": 50000,
+        "metric": "bestLevelScore"
     },
     {
         "id": "infinite-warrior",
         "name": "Infinite Warrior",
         "description": "Reach wave 10 in Infinite mode",
         "icon": "⚔️",
-        "target": 10
+        "target": 10,
+        "metric": "bestWave"
     },
     {
         "id": "endless-champion",
         "name": "Endless Champion",
         "description": "Score 100,000 points in Infinite mode",
         "icon": "🏆",
-        "target": 100000
+        "target": 100000,
+        "metric": "bestInfiniteScore"
     },
     {
         "id": "bubble-destroyer",
         "name": "Bubble Destroyer",
         "description": "Pop 1000 bubbles total",
         "icon": "💥",
-        "target": 1000
+        "target": 1000,
+        "metric": "bubblesPopped"
     }
 ]
 
-async def get_or_create_achievements(player_id: str) -> PlayerAchievements:
-    """Get player achievements or create default ones"""
+# Metrics each event can feed, and how to read them from the event context.
+# Metrics are stored per player under `stats` and only ever move forward.
+EVENT_METRICS = {
+    "level-complete": {
+        "completedLevels": lambda ctx: len([l for l in ctx["progress"].levels if l.completed]),
+        "totalStars": lambda ctx: ctx["progress"].totalStars,
+        "perfectLevels": lambda ctx: len([l for l in ctx["progress"].levels if l.stars >= 3]),
+        "bestLevelScore": lambda ctx: ctx["score"],
+        "bubblesPopped": lambda ctx: ctx.get("bubblesPopped", 0),
+    },
+    "infinite-score": {
+        "bestWave": lambda ctx: ctx["wave"],
+        "bestInfiniteScore": lambda ctx: ctx["score"],
+        "bubblesPopped": lambda ctx: ctx.get("bubblesPopped", 0),
+    },
+}
+
+# Counters accumulate with $inc, every other metric is a high-water mark kept with $max.
+# bubblesPopped is only ever taken from a verified replay, the server zeroes client-sent counts.
+COUNTER_METRICS = {"bubblesPopped"}
+
+# Metrics that can be recomputed from a stored progress document, for backfills
+PROGRESS_METRICS = {
+    "completedLevels": lambda progress_data: bin(progress_data.get("completedMask") or 0).count("1"),
+    "totalStars": lambda progress_data: progress_data.get("totalStars", 0),
+    "perfectLevels": lambda progress_data: (progress_data.get("stars") or "").count("3"),
+    "bestLevelScore": lambda progress_data: max((progress_data.get("bestScores") or {}).values(), default=0),
+    "bestWave": lambda progress_data: progress_data.get("infiniteHighWave", 0),
+    "bestInfiniteScore": lambda progress_data: progress_data.get("infiniteHighScore", 0),
+}
+
+# Definition fields refreshed on locked achievements when a rule is retuned
+DEFINITION_FIELDS = ("name", "description", "icon", "target")
+
+ACHIEVEMENTS_BY_ID = {ach_data["id"]: ach_data for ach_data in DEFAULT_ACHIEVEMENTS}
+
+# Rules indexed by the events that can move their metric
+RULES_BY_EVENT = {
+    event: [ach_data for ach_data in DEFAULT_ACHIEVEMENTS if ach_data["metric"] in metrics]
+    for event, metrics in EVENT_METRICS.items()
+}
+
+
+def default_achievements() -> List[Achievement]:
+    """Build the locked default achievement list"""
+    return [Achievement(**ach_data) for ach_data in DEFAULT_ACHIEVEMENTS]
+
+
+# The same list as documents, for storage to copy into new achievement documents
+DEFAULT_ACHIEVEMENT_DOCUMENTS = [achievement.dict() for achievement in default_achievements()]
+
+
+def apply_stats(achievements: PlayerAchievements) -> PlayerAchievements:
+    """Fill the progress of locked achievements from the player's stats"""
+    for achievement in achievements.achievements:
+        ach_data = ACHIEVEMENTS_BY_ID.get(achievement.id)
+        if ach_data and not achievement.unlocked:
+            achievement.progress = min(achievements.stats.get(ach_data["metric"], 0), achievement.target)
+    return achievements
+
+
+async def get_achievements_or_default(player_id: str) -> PlayerAchievements:
+    """Get player achievements, or locked defaults for a player with nothing stored yet.
+
+    Defaults are not written; the first recorded stat creates the document.
+    """
     achievements = await database.get_player_achievements(player_id)
     
     if not achievements:
-        # Create default achievements
-        default_achievements = []
-        for ach_data in DEFAULT_ACHIEVEMENTS:
-            achievement = Achievement(**ach_data)
-            default_achievements.append(achievement)
-        
         achievements = PlayerAchievements(
             playerId=player_id,
-            achievements=default_achievements
+            achievements=default_achievements()
         )
-        await database.update_player_achievements(player_id, achievements)
     
-    return achievements
+    return apply_stats(achievements)
 
-async def check_level_achievements(player_id: str, progress: PlayerProgress, level_data: Dict[str, Any]) -> List[Achievement]:
-    """Check and unlock level-related achievements"""
-    achievements = await get_or_create_achievements(player_id)
-    unlocked = []
-    
-    completed_levels = len([l for l in progress.levels if l.completed])
-    total_stars = progress.totalStars
-    
-    for achievement in achievements.achievements:
-        if achievement.unlocked:
+
+def reevaluate_achievements(player_id: str, progress_data: Optional[Dict[str, Any]], achievements_data: Optional[Dict[str, Any]], defaults: List[Dict[str, Any]], now: datetime) -> Optional[Dict[str, Any]]:
+    """Re-evaluate every rule for one player from stored documents.
+
+    `defaults` is the default achievement list as documents, used when the
+    player has no achievements document yet. Returns the change that brings the achievements document up to date with
+    DEFAULT_ACHIEVEMENTS, or None if it already is. The change only ever
+    raises stats, adds missing achievements, refreshes the definition of
+    locked ones and unlocks, so applying it commutes with live events.
+    """
+    maximums = {}
+    if progress_data is not None:
+        if "levels" in progress_data:
+            progress_data = encode_progress(decode_progress(progress_data))
+        stored_stats = (achievements_data or {}).get("stats", {})
+        for metric, extract in PROGRESS_METRICS.items():
+            value = extract(progress_data)
+            if value > stored_stats.get(metric, 0):
+                maximums[metric] = value
+
+    if achievements_data is None:
+        if not maximums:
+            # Nothing to record; the player keeps reading defaults
+            return None
+        stats = maximums
+        stored = {}
+    else:
+        stats = {**achievements_data.get("stats", {}), **maximums}
+        stored = {a["id"]: a for a in achievements_data.get("achievements", [])}
+        defaults = None
+
+    add = []
+    refresh = []
+    unlocks = []
+    for ach_data in DEFAULT_ACHIEVEMENTS:
+        achievement = stored.get(ach_data["id"])
+        if achievement is None and defaults is None:
+            add.append(Achievement(**ach_data).dict())
+        elif achievement is not None and not achievement.get("unlocked"):
+            definition = {field: ach_data[field] for field in DEFINITION_FIELDS}
+            if any(achievement.get(field) != value for field, value in definition.items()):
+                refresh.append({"id": ach_data["id"], **definition})
+        elif achievement is not None:
             continue
-            
-        # Level completion achievements
-        if achievement.id == "first-steps" and completed_levels >= 1:
-            achievement.unlocked = True
-            achievement.progress = completed_levels
-            achievement.unlockedAt = datetime.utcnow()
-            unlocked.append(achievement)
-        
-        elif achievement.id == "rising-star" and completed_levels >= 5:
-            achievement.unlocked = True
-            achievement.progress = completed_levels
-            achievement.unlockedAt = datetime.utcnow()
-            unlocked.append(achievement)
-        
-        elif achievement.id == "cosmic-explorer" and completed_levels >= 10:
-            achievement.unlocked = True
-            achievement.progress = completed_levels
-            achievement.unlockedAt = datetime.utcnow()
-            unlocked.append(achievement)
-        
-        elif achievement.id == "nebula-master" and completed_levels >= 25:
-            achievement.unlocked = True
-            achievement.progress = completed_levels
-            achievement.unlockedAt = datetime.utcnow()
-            unlocked.append(achievement)
-        
-        elif achievement.id == "transcendent" and completed_levels >= 50:
-            achievement.unlocked = True
-            achievement.progress = completed_levels
-            achievement.unlockedAt = datetime.utcnow()
-            unlocked.append(achievement)
-        
-        # Star achievements
-        elif achievement.id == "perfect-shot" and level_data.get("stars", 0) == 3:
-            achievement.unlocked = True
-            achievement.progress = 1
-            achievement.unlockedAt = datetime.utcnow()
-            unlocked.append(achievement)
-        
-        elif achievement.id == "star-collector" and total_stars >= 50:
-            achievement.unlocked = True
-            achievement.progress = total_stars
-            achievement.unlockedAt = datetime.utcnow()
-            unlocked.append(achievement)
-        
-        elif achievement.id == "cosmic-perfectionist" and total_stars >= 100:
-            achievement.unlocked = True
-            achievement.progress = total_stars
-            achievement.unlockedAt = datetime.utcnow()
-            unlocked.append(achievement)
-        
-        # Score achievements
-        elif achievement.id == "high-scorer" and level_data.get("score", 0) >= 50000:
-            achievement.unlocked = True
-            achievement.progress = level_data.get("score", 0)
-            achievement.unlockedAt = datetime.utcnow()
-            unlocked.append(achievement)
-    
+        value = stats.get(ach_data["metric"], 0)
+        if value >= ach_data["target"]:
+            unlocks.append({"id": ach_data["id"], "progress": value, "unlockedAt": now})
+
+    if not (maximums or add or refresh or unlocks):
+        return None
+    return {
+        "playerId": player_id,
+        "maximums": maximums,
+        "defaults": defaults,
+        "add": add,
+        "refresh": refresh,
+        "unlocks": unlocks,
+        "updatedAt": now
+    }
+
+
+async def evaluate_events(player_id: str, events: List[Tuple[str, Dict[str, Any]]]) -> List[Achievement]:
+    """Record the metrics of one or more events and unlock the achievements they complete"""
+    rules: Dict[str, Dict[str, Any]] = {}
+    increments: Dict[str, int] = {}
+    maximums: Dict[str, int] = {}
+    for event, context in events:
+        event_rules = RULES_BY_EVENT.get(event, [])
+        extractors = EVENT_METRICS.get(event, {})
+        for metric in {ach_data["metric"] for ach_data in event_rules}:
+            value = extractors[metric](context)
+            if metric in COUNTER_METRICS:
+                if value:
+                    increments[metric] = increments.get(metric, 0) + value
+            else:
+                maximums[metric] = max(maximums.get(metric, value), value)
+        rules.update((ach_data["id"], ach_data) for ach_data in event_rules)
+
+    if not rules:
+        return []
+
+    state = await database.record_achievement_stats(
+        player_id, increments, maximums, DEFAULT_ACHIEVEMENT_DOCUMENTS
+    )
+    stats = state.get("stats", {})
+    already_unlocked = {a["id"] for a in state.get("achievements", []) if a.get("unlocked")}
+
+    unlocked_at = datetime.utcnow()
+    unlocked = [
+        Achievement(**ach_data, unlocked=True, progress=stats.get(ach_data["metric"], 0), unlockedAt=unlocked_at)
+        for ach_data in rules.values()
+        if ach_data["id"] not in already_unlocked and stats.get(ach_data["metric"], 0) >= ach_data["target"]
+    ]
     if unlocked:
-        await database.update_player_achievements(player_id, achievements)
-    
+        await database.unlock_achievements(player_id, unlocked)
+
     return unlocked
 
-async def check_infinite_achievements(player_id: str, score: int, wave: int) -> List[Achievement]:
+
+async def evaluate_event(player_id: str, event: str, context: Dict[str, Any]) -> List[Achievement]:
+    """Record an event's metrics and unlock the achievements it completes"""
+    return await evaluate_events(player_id, [(event, context)])
+
+
+async def check_level_achievements(player_id: str, progress: PlayerProgress, level_data: Dict[str, Any]) -> List[Achievement]:
+    """Check and unlock level-related achievements"""
+    return await evaluate_event(player_id, "level-complete", {"progress": progress, **level_data})
+
+
+async def check_infinite_achievements(player_id: str, score: int, wave: int, bubbles_popped: int = 0) -> List[Achievement]:
     """Check and unlock infinite mode achievements"""
-    achievements = await get_or_create_achievements(player_id)
-    unlocked = []
-    
-    for achievement in achievements.achievements:
-        if achievement.unlocked:
-            continue
-        
-        if achievement.id == "infinite-warrior" and wave >= 10:
-            achievement.unlocked = True
-            achievement.progress = wave
-            achievement.unlockedAt = datetime.utcnow()
-            unlocked.append(achievement)
-        
-        elif achievement.id == "endless-champion" and score >= 100000:
-            achievement.unlocked = True
-            achievement.progress = score
-            achievement.unlockedAt = datetime.utcnow()
-            unlocked.append(achievement)
-    
-    if unlocked:
-        await database.update_player_achievements(player_id, achievements)
-    
-    return unlocked
\ No newline at end of file
+    return await evaluate_event(
+        player_id, "infinite-score", {"score": score, "wave": wave, "bubblesPopped": bubbles_popped}
+    )
+
+
+async def check_sync_achievements(player_id: str, progress: PlayerProgress, completions: List[SyncLevelComplete], scores: List[SyncInfiniteScore]) -> List[Achievement]:
+    """Check achievements once over a merged batch of synced events"""
+    events = []
+    if completions:
+        events.append(("level-complete", {
+            "progress": progress,
+            "score": max(c.score for c in completions),
+            "stars": max(c.stars for c in completions),
+            "bubblesPopped": sum(c.bubblesPopped for c in completions)
+        }))
+    if scores:
+        events.append(("infinite-score", {
+            "score": max(s.score for s in scores),
+            "wave": max(s.wave for s in scores),
+            "bubblesPopped": sum(s.bubblesPopped for s in scores)
+        }))
+    return await evaluate_events(player_id, events)
@@ -0,0 +1,206 @@
+"""Admission control and load shedding for storage-bound routes.
+
+`@admit(name)` goes under the route decorator, like `@coalesce`:
+
+    @api_router.post("/progress/{player_id}/complete-level", response_model=PlayerProgress)
+    @admit("complete-level")
+    async def complete_level(player_id: str, level_data: LevelCompleteRequest): ...
+
+Two checks run before the handler:
+
+- Per player, a token bucket for the route, kept in a bounded table.
+  An empty bucket answers 429 with Retry-After set to the time until
+  the next token.
+- Across all admitted routes, a limit on requests in flight. A request
+  that would queue waits for a slot up to the latency budget. If the
+  expected wait is already over the budget it is shed at once, and a
+  wait that runs past the budget is shed too, both with 503 and a
+  Retry-After.
+
+Per-player limits are set with ADMISSION_PLAYER_LIMITS as
+"route=rate/burst,...", for example "complete-level=2/10,sync=0.5/5";
+these override the defaults below. A rate of 0 turns a route's bucket off.
+"""
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+import asyncio
+import functools
+import math
+import os
+import time
+
+from fastapi import HTTPException
+
+from metrics import registry
+
+# Route name -> (tokens per second, burst) per player
+DEFAULT_PLAYER_LIMITS: Dict[str, Tuple[float, float]] = {
+    "complete-level": (2.0, 20),
+    "infinite-score": (1.0, 10),
+    "update-progress": (1.0, 10),
+    "sync": (0.5, 5),
+}
+
+admission_rejected = registry.counter(
+    "nebula_admission_rejected_total", "Requests refused by admission control", ("route", "reason")
+)
+admission_queue_wait = registry.histogram(
+    "nebula_admission_queue_seconds", "Time admitted requests waited for an in-flight slot", ("route",)
+)
+
+
+def parse_limits(spec: Optional[str]) -> Dict[str, Tuple[float, float]]:
+    """Parse "complete-level=2/10,sync=0.5/5" into per-route (rate, burst)"""
+    limits = {}
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        name, _, value = part.partition("=")
+        rate, _, burst = value.partition("/")
+        limits[name.strip()] = (float(rate), float(burst or rate))
+    return limits
+
+
+class TokenBuckets:
+    """Per-key token buckets in a bounded LRU table.
+
+    A bucket idle for long enough to refill is dropped, since a missing key
+    reads as a full bucket, so the table only holds recently active keys.
+    """
+
+    def __init__(self, rate: float, burst: float, max_size: int = 100000, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_size = max_size
+        self.clock = clock
+        self.idle_expiry = burst / rate
+        # key -> (tokens, last update)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, key: str, cost: float = 1.0) -> float:
+        """Take tokens for a key; returns 0 if allowed, else seconds until they are available"""
+        now = self.clock()
+        bucket = self._buckets.pop(key, None)
+        tokens = self.burst if bucket is None else min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        if tokens >= cost:
+            tokens -= cost
+            wait = 0.0
+        else:
+            wait = (cost - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        self._expire(now)
+        return wait
+
+    def _expire(self, now: float):
+        while self._buckets:
+            key, (_, updated) = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_size and now - updated < self.idle_expiry:
+                return
+            del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class InFlightLimit:
+    """Caps concurrent requests and sheds those whose queue wait would exceed the budget"""
+
+    def __init__(self, limit: int, budget: float, clock: Callable[[], float] = time.monotonic):
+        self.limit = limit
+        self.budget = budget
+        self.clock = clock
+        self.in_flight = 0
+        self.waiting = 0
+        # Moving average of how long admitted requests hold a slot
+        self.service_time = 0.0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    def expected_wait(self) -> float:
+        return (self.waiting + 1) / self.limit * self.service_time
+
+    async def acquire(self) -> Optional[float]:
+        """Take a slot and return the queue wait, or None if the request should be shed"""
+        start = self.clock()
+        if self._semaphore.locked():
+            if self.expected_wait() > self.budget:
+                return None
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.budget)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.in_flight += 1
+        return self.clock() - start
+
+    def release(self, held: float):
+        self.in_flight -= 1
+        self.service_time += (held - self.service_time) * 0.1
+        self._semaphore.release()
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.expected_wait()))
+
+
+class Admission:
+    def __init__(self):
+        self.enabled = os.environ.get('ADMISSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+        self.limits = {**DEFAULT_PLAYER_LIMITS, **parse_limits(os.environ.get('ADMISSION_PLAYER_LIMITS'))}
+        table_size = int(os.environ.get('ADMISSION_TABLE_SIZE', '100000'))
+        self.buckets = {
+            name: TokenBuckets(rate, burst, table_size)
+            for name, (rate, burst) in self.limits.items() if rate > 0
+        }
+        self.in_flight = InFlightLimit(
+            int(os.environ.get('ADMISSION_MAX_IN_FLIGHT', '64')),
+            int(os.environ.get('ADMISSION_QUEUE_BUDGET_MS', '100')) / 1000
+        )
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "inFlight": self.in_flight.in_flight,
+            "waiting": self.in_flight.waiting,
+            "serviceTimeMs": round(self.in_flight.service_time * 1000, 3),
+            "players": {name: len(buckets) for name, buckets in self.buckets.items()},
+        }
+
+
+admission = Admission()
+
+
+def admit(name: str):
+    """Apply the per-player bucket of route `name`, if any, and the in-flight limit to an endpoint"""
+    def decorator(endpoint: Callable):
+        @functools.wraps(endpoint)
+        async def wrapper(**arguments):
+            if not admission.enabled:
+                return await endpoint(**arguments)
+
+            buckets = admission.buckets.get(name)
+            player_id = arguments.get("player_id")
+            if buckets is not None and player_id is not None:
+                wait = buckets.take(player_id)
+                if wait:
+                    admission_rejected.labels(name, "player").inc()
+                    raise HTTPException(
+                        status_code=429, detail="Too many requests", headers={"Retry-After": str(math.ceil(wait))}
+                    )
+
+            limit = admission.in_flight
+            waited = await limit.acquire()
+            if waited is None:
+                admission_rejected.labels(name, "overload").inc()
+                raise HTTPException(
+                    status_code=503, detail="Server busy", headers={"Retry-After": str(limit.retry_after())}
+                )
+            admission_queue_wait.labels(name).observe(waited)
+            start = time.monotonic()
+            try:
+                return await endpoint(**arguments)
+            finally:
+                limit.release(time.monotonic() - start)
+        return wrapper
+    return decorator
@@ -0,0 +1,16 @@
+"""Load and benchmark suite for the /api routes.
+
+Drives the FastAPI app in-process through an ASGI transport, over a real
+uvicorn server started in-process, or against an already running server,
+with a seeded player population and a weighted mix of routes. Reports
+throughput and p50/p95/p99 per route plus Mongo commands per request, and
+compares a run against a saved JSON baseline. Scenarios benchmark single
+components, such as the leaderboard index, against what they replaced.
+
+Run from the backend directory:
+
+    python -m benchmarks run --storage memory --output baseline.json
+    python -m benchmarks run --storage mongo --baseline baseline.json
+    python -m benchmarks compare baseline.json results.json
+    python -m benchmarks scenario leaderboard --size 1000000
+"""
@@ -0,0 +1,120 @@
+"""Command line entry point: python -m benchmarks <run|scenario|compare> [options]"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+from benchmarks import baseline
+from benchmarks.workload import ROUTES, parse_mix
+
+
+def run_command(args) -> int:
+    # Set before `server` is imported, which happens when the in-process target starts
+    if args.target != "url":
+        os.environ['STORAGE_BACKEND'] = args.storage
+        if args.storage == "sqlite" and args.sqlite_path:
+            os.environ['SQLITE_PATH'] = args.sqlite_path
+    from benchmarks.runner import run_benchmark
+
+    result = asyncio.run(run_benchmark(
+        parse_mix(args.mix), args.target, args.url, args.players, args.requests,
+        args.concurrency, args.warmup, args.seed, args.operation_samples, args.cpu_samples,
+        args.abusers, args.abuse_route, args.abuse_rate, args.rate
+    ))
+    print(baseline.format_table(result))
+    if args.output:
+        baseline.save(result, args.output)
+    if args.baseline:
+        return report(baseline.load(args.baseline), result, args)
+    return 1 if result["errors"] and args.fail_on_errors else 0
+
+
+def scenario_command(args) -> int:
+    from benchmarks.scenarios import format_results, run_scenario
+
+    result = asyncio.run(run_scenario(args.name, args.size, args.seed))
+    print(format_results(result))
+    if args.output:
+        baseline.save(result, args.output)
+    return 0
+
+
+def compare_command(args) -> int:
+    return report(baseline.load(args.baseline), baseline.load(args.current), args)
+
+
+def report(before, after, args) -> int:
+    changed = sorted(key for key in before["config"] if before["config"][key] != after["config"].get(key))
+    if changed:
+        print(f"WARNING runs differ in {', '.join(changed)}; comparing anyway")
+    regressions = baseline.compare(before, after, args.threshold, args.metrics.split(","), args.min_delta_ms)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"No route regressed by more than {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def add_compare_options(command: argparse.ArgumentParser):
+    command.add_argument("--threshold", type=float, default=0.25, help="allowed relative growth, 0.25 for 25%%")
+    command.add_argument("--metrics", default="p50,p95", help="latency percentiles to compare")
+    command.add_argument("--min-delta-ms", type=float, default=0.5, help="ignore latency growth smaller than this")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Nebula API load and benchmark suite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("run", help="run a workload and report per-route latency")
+    command.add_argument("--target", choices=("asgi", "uvicorn", "url"), default="asgi",
+                         help="in-process ASGI transport, in-process uvicorn, or a running server at --url")
+    command.add_argument("--url", help="base URL of a running server for --target url")
+    command.add_argument("--storage", choices=("memory", "sqlite", "mongo"), default="memory",
+                         help="storage backend of the in-process app; mongo reads MONGO_URL and DB_NAME")
+    command.add_argument("--sqlite-path", help="database file for --storage sqlite")
+    command.add_argument("--players", type=int, default=1000)
+    command.add_argument("--requests", type=int, default=20000, help="measured requests")
+    command.add_argument("--warmup", type=int, default=2000, help="requests before measuring")
+    command.add_argument("--concurrency", type=int, default=50, help="simulated clients")
+    command.add_argument("--rate", type=float, default=0, help="total req/s offered by the clients, 0 to send back to back")
+    command.add_argument("--seed", type=int, default=1)
+    command.add_argument("--mix", help=f"route weights such as progress=50,highscores=20; routes: {', '.join(ROUTES)}")
+    command.add_argument("--operation-samples", type=int, default=20, help="sequential requests per route when counting Mongo commands")
+    command.add_argument("--cpu-samples", type=int, default=200, help="sequential requests per route when timing CPU, 0 to skip")
+    command.add_argument("--abusers", type=int, default=0, help="extra clients flooding --abuse-route during the run")
+    command.add_argument("--abuse-route", choices=list(ROUTES), default="complete-level")
+    command.add_argument("--abuse-rate", type=float, default=50.0, help="requests per second sent by each abuser")
+    command.add_argument("--output", help="write the results as JSON, e.g. a new baseline")
+    command.add_argument("--baseline", help="compare against this JSON baseline and fail on regressions")
+    command.add_argument("--fail-on-errors", action="store_true", help="fail when any request errored")
+    add_compare_options(command)
+    command.set_defaults(handler=run_command)
+
+    from benchmarks.scenarios import SCENARIOS
+    command = commands.add_parser("scenario", help="benchmark one component against the approach it replaced")
+    command.add_argument("name", choices=list(SCENARIOS))
+    command.add_argument("--size", type=int, default=0, help="data set size, 0 for the scenario's default")
+    command.add_argument("--seed", type=int, default=1)
+    command.add_argument("--output", help="write the results as JSON")
+    command.set_defaults(handler=scenario_command)
+
+    command = commands.add_parser("compare", help="compare two saved results")
+    command.add_argument("baseline")
+    command.add_argument("current")
+    add_compare_options(command)
+    command.set_defaults(handler=compare_command)
+
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    if args.command == "run" and args.target == "url" and not args.url:
+        sys.exit("--target url needs --url")
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Result summaries, JSON baselines and regression checks"""
+from typing import Any, Dict, List, Optional, Sequence
+import json
+import math
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(ordered: Sequence[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending sequence"""
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(config: Dict[str, Any], latencies: Dict[str, List[float]], errors: Dict[str, int],
+              duration: float, operations: Optional[Dict[str, float]], cpu: Optional[Dict[str, float]] = None,
+              flood: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """Build the result document; latencies and CPU times are in milliseconds"""
+    routes = {}
+    for name in sorted(latencies):
+        ordered = sorted(latencies[name])
+        route = {
+            "requests": len(ordered),
+            "errors": errors.get(name, 0),
+            "throughput": round(len(ordered) / duration, 1),
+        }
+        route.update({f"p{p}": round(percentile(ordered, p) * 1000, 3) for p in PERCENTILES})
+        route["mongoOpsPerRequest"] = round(operations[name], 2) if operations and name in operations else None
+        route["cpuMsPerRequest"] = round(cpu[name] * 1000, 3) if cpu and name in cpu else None
+        routes[name] = route
+
+    total = sum(len(samples) for samples in latencies.values())
+    return {
+        "config": config,
+        "durationSeconds": round(duration, 3),
+        "throughput": round(total / duration, 1),
+        "errors": sum(errors.values()),
+        "routes": routes,
+        "flood": flood
+    }
+
+
+def save(result: Dict[str, Any], path: str):
+    with open(path, "w") as stream:
+        json.dump(result, stream, indent=2, sort_keys=True)
+        stream.write("\n")
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path) as stream:
+        return json.load(stream)
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.25,
+            metrics: Sequence[str] = ("p50", "p95"), min_delta_ms: float = 0.5) -> List[str]:
+    """Describe every route that regressed against the baseline.
+
+    A latency regresses when it grew by more than `threshold` of the
+    baseline and by at least `min_delta_ms`, so sub-millisecond noise on
+    fast routes does not fail a run. CPU time per request is compared the
+    same way. Mongo commands per request regress on any growth beyond the
+    same threshold, and new errors always do.
+    """
+    regressions = []
+    for name, before in baseline["routes"].items():
+        after = current["routes"].get(name)
+        if after is None:
+            continue
+        for metric in list(metrics) + ["cpuMsPerRequest"]:
+            old, new = before.get(metric), after.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + threshold) and new - old >= min_delta_ms:
+                regressions.append(f"{name}: {metric} {old:.3f}ms -> {new:.3f}ms (+{(new / old - 1) * 100 if old else math.inf:.0f}%)")
+        old_ops, new_ops = before.get("mongoOpsPerRequest"), after.get("mongoOpsPerRequest")
+        if old_ops is not None and new_ops is not None and new_ops > old_ops * (1 + threshold) + 1e-9:
+            regressions.append(f"{name}: Mongo commands per request {old_ops} -> {new_ops}")
+        if after["errors"] > before["errors"]:
+            regressions.append(f"{name}: errors {before['errors']} -> {after['errors']}")
+    return regressions
+
+
+def format_table(result: Dict[str, Any]) -> str:
+    lines = [
+        f"{'route':<18}{'requests':>9}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        f"{'cpu ms':>10}{'mongo/req':>11}"
+    ]
+    for name, route in result["routes"].items():
+        cpu = route.get("cpuMsPerRequest")
+        operations = route["mongoOpsPerRequest"]
+        lines.append(
+            f"{name:<18}{route['requests']:>9}{route['errors']:>8}{route['throughput']:>10.1f}"
+            f"{route['p50']:>10.3f}{route['p95']:>10.3f}{route['p99']:>10.3f}"
+            f"{'-' if cpu is None else f'{cpu:.3f}':>10}{'-' if operations is None else f'{operations:.2f}':>11}"
+        )
+    lines.append(f"total {result['throughput']:.1f} req/s over {result['durationSeconds']:.1f}s, {result['errors']} errors")
+    if result.get("flood"):
+        statuses = ", ".join(f"{status}: {count}" for status, count in sorted(result["flood"].items()))
+        config = result["config"]
+        lines.append(f"flood of {config['abuseRoute']} by {config['abusers']} clients at {config['abuseRate']:g} req/s each: {statuses}")
+    return "\n".join(lines)
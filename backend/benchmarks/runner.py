@@ -0,0 +1,209 @@
+"""Drive a workload against the app and measure it.
+
+The in-process targets import `server` lazily, so the storage settings
+chosen on the command line are in the environment before the app reads
+them. Mongo commands are counted from the app's command listener, which
+only sees in-process traffic; against a remote URL they, and CPU time per
+request, are reported as null.
+"""
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+import asyncio
+import os
+import random
+import socket
+import time
+
+import httpx
+
+from benchmarks.baseline import summarize
+from benchmarks.workload import EXPECTED_STATUS, ROUTES, Player, Workload
+
+TARGETS = ("asgi", "uvicorn", "url")
+
+
+def mongo_commands() -> int:
+    """Mongo commands completed by this process so far"""
+    from metrics import mongo_duration
+    return int(sum(value for name, _, value in mongo_duration.samples() if name.endswith("_count")))
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+@asynccontextmanager
+async def open_client(target: str, url: Optional[str] = None) -> AsyncIterator[httpx.AsyncClient]:
+    """A client for the target, with the in-process app started and stopped around it"""
+    timeout = httpx.Timeout(30.0)
+    if target == "url":
+        async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+            yield client
+        return
+
+    from server import app
+    if target == "asgi":
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=timeout) as client:
+                yield client
+        return
+
+    import uvicorn
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    try:
+        while not server.started:
+            if serving.done():
+                serving.result()
+            await asyncio.sleep(0.05)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            yield client
+    finally:
+        server.should_exit = True
+        await serving
+
+
+async def _drive(client: httpx.AsyncClient, workload: Workload, requests: int, concurrency: int,
+                 latencies: Optional[Dict[str, List[float]]], errors: Optional[Dict[str, int]], rate: float = 0.0):
+    # Without a rate every client sends its next request as soon as the last one
+    # returns; with one, clients are paced so together they offer `rate` req/s
+    remaining = requests
+
+    async def user():
+        nonlocal remaining
+        due = time.perf_counter()
+        while remaining > 0:
+            if rate:
+                await asyncio.sleep(max(0.0, due - time.perf_counter()))
+                due += concurrency / rate
+            remaining -= 1
+            name, (method, path, body) = workload.next()
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                ok = response.status_code in EXPECTED_STATUS.get(name, range(200, 300))
+            except httpx.HTTPError:
+                ok = False
+            elapsed = time.perf_counter() - start
+            if latencies is not None:
+                latencies[name].append(elapsed)
+                if not ok:
+                    errors[name] += 1
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+
+
+async def _flood(client: httpx.AsyncClient, route: str, abusers: int, rate: float, seed: int, stop: asyncio.Event,
+                 statuses: Dict[str, int]):
+    # Each abuser sends `rate` requests per second for one player without waiting
+    # for responses or honouring Retry-After, like a scripted client would
+    flood = Workload(abusers, {route: 1}, seed, prefix="abuser")
+    outstanding = set()
+
+    async def send(method: str, path: str, body):
+        try:
+            response = await client.request(method, path, json=body)
+            statuses[str(response.status_code)] += 1
+        except httpx.HTTPError:
+            statuses["error"] += 1
+
+    async def abuser(player: Player):
+        rng = random.Random(player.id)
+        due = time.perf_counter()
+        while not stop.is_set():
+            task = asyncio.ensure_future(send(*ROUTES[route][1](player, rng)))
+            outstanding.add(task)
+            task.add_done_callback(outstanding.discard)
+            due += 1 / rate
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+
+    await asyncio.gather(*(abuser(player) for player in flood.players))
+    await asyncio.gather(*outstanding)
+
+
+async def _count_operations(client: httpx.AsyncClient, workload: Workload, samples: int) -> Dict[str, float]:
+    # One route at a time and one request at a time, so every command belongs to that route.
+    # The wait lets batched score writes flush before the count is read.
+    settle = int(os.environ.get('SCORE_FLUSH_DELAY_MS', '50')) / 1000 * 2
+    operations = {}
+    for name in workload.names:
+        await asyncio.sleep(settle)
+        before = mongo_commands()
+        for _ in range(samples):
+            method, path, body = workload.sample(name)
+            await client.request(method, path, json=body)
+        await asyncio.sleep(settle)
+        operations[name] = (mongo_commands() - before) / samples
+    return operations
+
+
+async def _measure_cpu(client: httpx.AsyncClient, workload: Workload, samples: int) -> Dict[str, float]:
+    # Process CPU time of sequential requests, client side included, so only
+    # differences between runs on the same machine are meaningful
+    cpu = {}
+    for name in workload.names:
+        start = time.process_time()
+        for _ in range(samples):
+            method, path, body = workload.sample(name)
+            await client.request(method, path, json=body)
+        cpu[name] = (time.process_time() - start) / samples
+    return cpu
+
+
+async def run_benchmark(mix: Dict[str, int], target: str = "asgi", url: Optional[str] = None, players: int = 1000,
+                        requests: int = 20000, concurrency: int = 50, warmup: int = 2000, seed: int = 1,
+                        operation_samples: int = 20, cpu_samples: int = 200, abusers: int = 0,
+                        abuse_route: str = "complete-level", abuse_rate: float = 50.0, rate: float = 0.0) -> Dict[str, Any]:
+    """Warm up, run the measured mix, then measure CPU time and Mongo commands per request of each route.
+
+    With `abusers`, that many extra clients each send `abuse_rate` requests
+    per second to `abuse_route` during the measured run; their responses
+    are counted by status, apart from the mix.
+    """
+    workload = Workload(players, mix, seed)
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    flood_statuses: Dict[str, int] = defaultdict(int)
+
+    async with open_client(target, url) as client:
+        await _drive(client, workload, warmup, concurrency, None, None)
+        stop = asyncio.Event()
+        flood = asyncio.ensure_future(_flood(client, abuse_route, abusers, abuse_rate, seed, stop, flood_statuses)) if abusers else None
+        start = time.perf_counter()
+        await _drive(client, workload, requests, concurrency, latencies, errors, rate)
+        duration = time.perf_counter() - start
+        if flood is not None:
+            stop.set()
+            await flood
+
+        cpu = None
+        operations = None
+        if target != "url":
+            if cpu_samples:
+                cpu = await _measure_cpu(client, workload, cpu_samples)
+            from database import database
+            if database.storage.name == "mongo":
+                operations = await _count_operations(client, workload, operation_samples)
+
+    return summarize(
+        {
+            "target": target,
+            "storage": os.environ.get('STORAGE_BACKEND', 'mongo') if target != "url" else None,
+            "players": players,
+            "requests": requests,
+            "concurrency": concurrency,
+            "rate": rate,
+            "warmup": warmup,
+            "seed": seed,
+            "mix": mix,
+            "abusers": abusers,
+            "abuseRoute": abuse_route if abusers else None,
+            "abuseRate": abuse_rate if abusers else None
+        },
+        latencies, errors, duration, operations, cpu, dict(flood_statuses) if abusers else None
+    )
@@ -0,0 +1,390 @@
+"""Component benchmarks, apart from the route mix.
+
+Each scenario builds its own seeded data in process, times one component
+against the approach it replaced, and returns flat {metric: value}
+results; times are in milliseconds unless the name says otherwise. `size`
+scales the data set, so the published numbers come from the defaults and
+CI can run every scenario small.
+
+    python -m benchmarks scenario leaderboard --size 1000000
+"""
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+import heapq
+import random
+import time
+
+# name -> (default size, scenario)
+Scenario = Callable[[int, int], Awaitable[Dict[str, Any]]]
+SCENARIOS: Dict[str, Tuple[int, Scenario]] = {}
+
+
+def scenario(name: str, size: int):
+    """Register a scenario under `name` with its default size"""
+    def decorator(function: Scenario) -> Scenario:
+        SCENARIOS[name] = (size, function)
+        return function
+    return decorator
+
+
+def per_call(function: Callable[[], Any], calls: int) -> float:
+    """Mean milliseconds per call of `function` over `calls` calls"""
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - start) / calls * 1000
+
+
+async def per_call_async(function: Callable[[], Awaitable[Any]], calls: int) -> float:
+    """Mean milliseconds per awaited call of `function` over `calls` calls"""
+    start = time.perf_counter()
+    for _ in range(calls):
+        await function()
+    return (time.perf_counter() - start) / calls * 1000
+
+
+def score_runs(count: int, players: int, rng: random.Random, start: datetime, span: timedelta) -> List[Dict[str, Any]]:
+    """Infinite score documents spread over `players` players and the time span"""
+    seconds = max(int(span.total_seconds()), 1)
+    runs = []
+    for index in range(count):
+        wave = rng.randint(1, 30)
+        runs.append({
+            "id": f"run-{index:09d}",
+            "playerId": f"player-{rng.randrange(players):07d}",
+            "score": wave * rng.randint(500, 5000),
+            "wave": wave,
+            "timestamp": start + timedelta(seconds=rng.randrange(seconds))
+        })
+    return runs
+
+
+@scenario("leaderboard", 1_000_000)
+async def leaderboard_scenario(size: int, seed: int) -> Dict[str, Any]:
+    """Ranked index reads against sorting the stored runs, as the old highscores query did"""
+    from leaderboard import Leaderboard
+    from models import InfiniteScore
+
+    rng = random.Random(seed)
+    players = max(size // 10, 1)
+    runs = score_runs(size, players, rng, datetime(2026, 1, 1), timedelta(days=365))
+
+    start = time.perf_counter()
+    leaderboard = Leaderboard()
+    leaderboard.load(InfiniteScore(**run) for run in runs)
+    load_seconds = time.perf_counter() - start
+
+    player_ids = [rng.choice(runs)["playerId"] for _ in range(1000)]
+    queries = iter(player_ids * 10)
+
+    def rank():
+        index = leaderboard.rank(next(queries)) - 1
+        leaderboard.ranked(index - 2, index + 3)
+
+    fresh = iter(InfiniteScore(**run) for run in score_runs(1000, players, rng, datetime(2027, 1, 1), timedelta(days=1)))
+    return {
+        "runs": size,
+        "players": len(leaderboard),
+        "loadSeconds": round(load_seconds, 3),
+        "sortedScanTop100": per_call(lambda: heapq.nlargest(100, runs, key=lambda run: run["score"]), 5),
+        "indexTop100": per_call(lambda: leaderboard.top(100), 1000),
+        "indexTop100Offset": per_call(lambda: leaderboard.top(100, players // 2), 1000),
+        "indexRankWithNeighbours": per_call(rank, 1000),
+        "indexSubmit": per_call(lambda: leaderboard.submit(next(fresh)), 1000),
+    }
+
+
+async def _legacy_event(database, player_id: str, checks: Dict[str, Tuple[int, int]]) -> list:
+    """The if/elif evaluation that preceded the rules table: load the whole
+    document, walk every achievement, and rewrite the document on an unlock.
+    `checks` maps the achievements an event could unlock to (value, target)."""
+    from achievements import default_achievements
+    from models import PlayerAchievements
+
+    achievements = await database.get_player_achievements(player_id)
+    if not achievements:
+        achievements = PlayerAchievements(playerId=player_id, achievements=default_achievements())
+        await database.update_player_achievements(player_id, achievements)
+    unlocked = []
+    for achievement in achievements.achievements:
+        if achievement.unlocked or achievement.id not in checks:
+            continue
+        value, target = checks[achievement.id]
+        if value >= target:
+            achievement.unlocked = True
+            achievement.progress = value
+            achievement.unlockedAt = datetime.utcnow()
+            unlocked.append(achievement)
+    if unlocked:
+        await database.update_player_achievements(player_id, achievements)
+    return unlocked
+
+
+def _legacy_level_checks(progress, level_data: Dict[str, Any]) -> Dict[str, Tuple[int, int]]:
+    completed_levels = len([level for level in progress.levels if level.completed])
+    return {
+        "first-steps": (completed_levels, 1), "rising-star": (completed_levels, 5),
+        "cosmic-explorer": (completed_levels, 10), "nebula-master": (completed_levels, 25),
+        "transcendent": (completed_levels, 50), "perfect-shot": (1 if level_data["stars"] == 3 else 0, 1),
+        "star-collector": (progress.totalStars, 50), "cosmic-perfectionist": (progress.totalStars, 100),
+        "high-scorer": (level_data["score"], 50000),
+    }
+
+
+@scenario("achievements", 20_000)
+async def achievements_scenario(size: int, seed: int) -> Dict[str, Any]:
+    """Per-event evaluation through the rules table against the if/elif chains it replaced.
+
+    Both run on the memory backend with the achievements cache off, so each
+    event pays for its storage reads and writes as it would against Mongo.
+    """
+    import achievements
+    from cache import TTLCache
+    from database import Database
+    from progress_format import default_progress
+    from storage.memory import MemoryStorage
+
+    rng = random.Random(seed)
+    players = max(size // 20, 1)
+    progress = default_progress("bench")
+    for level in progress.levels[:rng.randint(3, 12)]:
+        level.completed = True
+        level.stars = rng.randint(1, 3)
+    progress.totalStars = sum(level.stars for level in progress.levels)
+    events = [
+        (f"player-{rng.randrange(players):07d}", rng.randint(500, 60000), rng.randint(1, 3), rng.randint(1, 30))
+        for _ in range(size)
+    ]
+
+    evaluators = {
+        "legacyLevelEvent": lambda db, player_id, score, stars, wave: _legacy_event(
+            db, player_id, _legacy_level_checks(progress, {"score": score, "stars": stars})
+        ),
+        "rulesLevelEvent": lambda db, player_id, score, stars, wave: achievements.check_level_achievements(
+            player_id, progress, {"levelId": 1, "score": score, "stars": stars, "shots": 20}
+        ),
+        "legacyInfiniteEvent": lambda db, player_id, score, stars, wave: _legacy_event(
+            db, player_id, {"infinite-warrior": (wave, 10), "endless-champion": (score * 2, 100000)}
+        ),
+        "rulesInfiniteEvent": lambda db, player_id, score, stars, wave: achievements.check_infinite_achievements(
+            player_id, score * 2, wave
+        ),
+    }
+    results = {
+        "events": size,
+        "rulesPerLevelEvent": len(achievements.RULES_BY_EVENT["level-complete"]),
+        "rulesPerInfiniteEvent": len(achievements.RULES_BY_EVENT["infinite-score"]),
+    }
+    live = achievements.database
+    try:
+        for name, evaluate in evaluators.items():
+            # The rules engine reads the module's database, so each run swaps in a fresh one
+            database = Database(MemoryStorage())
+            database.achievements_cache = TTLCache(max_size=0)
+            achievements.database = database
+            queue = iter(events)
+            results[name] = await per_call_async(lambda: evaluate(database, *next(queue)), size)
+    finally:
+        achievements.database = live
+    return results
+
+
+@scenario("progress-cache", 50_000)
+async def progress_cache_scenario(size: int, seed: int) -> Dict[str, Any]:
+    """Progress reads through Database with the read-through cache on and off.
+
+    Storage is SQLite in a temporary file, so a miss pays for a real read and
+    document decode. Reads follow a skewed popularity, as polling clients do.
+    """
+    import tempfile
+    from cache import TTLCache
+    from database import Database
+    from progress_format import default_progress, encode_progress
+    from storage.sqlite import SQLiteStorage
+
+    rng = random.Random(seed)
+    players = [f"player-{index:07d}" for index in range(max(size // 50, 1))]
+    reads = [players[min(int(rng.paretovariate(1.2)) - 1, len(players) - 1)] for _ in range(size)]
+
+    results: Dict[str, Any] = {"reads": size, "players": len(players)}
+    with tempfile.TemporaryDirectory() as directory:
+        storage = SQLiteStorage(f"{directory}/nebula.db")
+        await storage.connect()
+        try:
+            played_at = datetime(2026, 1, 1)
+            for player_id in players:
+                for level_id in range(1, rng.randint(2, 20)):
+                    await storage.complete_level(
+                        player_id, (level_id, rng.randint(500, 60000), rng.randint(1, 3)),
+                        encode_progress(default_progress(player_id)), played_at
+                    )
+            for name, cache in (("cacheOff", TTLCache(max_size=0)), ("cacheOn", TTLCache(max_size=10000, ttl=30))):
+                database = Database(storage)
+                database.progress_cache = cache
+                queue = iter(reads)
+                results[f"{name}Read"] = await per_call_async(lambda: database.get_progress_or_default(next(queue)), size)
+                results[f"{name}HitRate"] = round(cache.hits / max(cache.hits + cache.misses, 1), 4)
+        finally:
+            await storage.close()
+    return results
+
+
+@scenario("progress-format", 100_000)
+async def progress_format_scenario(size: int, seed: int) -> Dict[str, Any]:
+    """Stored size and decode time of the compact progress format against the legacy `levels` documents"""
+    import bson
+    from progress_format import decode_progress, default_progress, encode_progress
+
+    rng = random.Random(seed)
+    played_at = datetime(2026, 1, 1)
+    legacy, compact = [], []
+    for index in range(size):
+        progress = default_progress(f"player-{index:07d}")
+        # Most players stop early; anonymous visitors never finish a level
+        for level in progress.levels[:min(int(rng.paretovariate(0.8)) - 1, len(progress.levels))]:
+            level.unlocked = level.completed = True
+            level.stars = rng.randint(1, 3)
+            level.bestScore = rng.randint(500, 60000)
+            level.lastPlayed = played_at
+        legacy.append(progress.dict())
+        compact.append(encode_progress(progress))
+
+    legacy_bytes = sum(len(bson.encode(progress_data)) for progress_data in legacy)
+    compact_bytes = sum(len(bson.encode(progress_data)) for progress_data in compact)
+    legacy_queue, compact_queue = iter(legacy), iter(compact)
+    return {
+        "players": size,
+        "legacyBytesPerDocument": round(legacy_bytes / size, 1),
+        "compactBytesPerDocument": round(compact_bytes / size, 1),
+        "legacyDecode": per_call(lambda: decode_progress(next(legacy_queue)), size),
+        "compactDecode": per_call(lambda: decode_progress(next(compact_queue)), size),
+    }
+
+
+@scenario("boards", 100_000)
+async def boards_scenario(size: int, seed: int) -> Dict[str, Any]:
+    """Board generation throughput, and the board cache under a daily challenge rush.
+
+    In the rush every player starts the day's seed at wave 1 and plays on
+    until they lose, with players interleaved as concurrent clients are.
+    """
+    import numpy as np
+    from waves import BoardCache, daily_seed, generate_board, generate_boards
+
+    rng = random.Random(seed)
+    day_seed = daily_seed(datetime(2026, 1, 1).date())
+
+    start = time.perf_counter()
+    generate_boards(day_seed, np.arange(1, size + 1))
+    vectorized = time.perf_counter() - start
+    singles = max(size // 10, 1)
+    start = time.perf_counter()
+    for wave in range(1, singles + 1):
+        generate_board(day_seed, wave)
+    one_by_one = time.perf_counter() - start
+
+    # Each player's last wave, then their requests in interleaved order
+    players = [min(int(rng.expovariate(1 / 12)) + 1, 100) for _ in range(max(size // 12, 1))]
+    requests = [(player, wave) for player, last in enumerate(players) for wave in range(1, last + 1)]
+    requests.sort(key=lambda request: (request[1], rng.random()))
+    cache = BoardCache()
+    queue = iter(requests)
+    per_request = per_call(lambda: cache.get(day_seed, next(queue)[1]), len(requests))
+    stats = cache.stats()
+    return {
+        "vectorizedBoardsPerSecond": round(size / vectorized),
+        "singleBoardsPerSecond": round(singles / one_by_one),
+        "rushPlayers": len(players),
+        "rushRequests": len(requests),
+        "rushRequest": per_request,
+        "rushHitRate": round(stats["hits"] / max(stats["hits"] + stats["misses"], 1), 4),
+    }
+
+
+@scenario("windows", 1_000_000)
+async def windows_scenario(size: int, seed: int) -> Dict[str, Any]:
+    """Day and week leaderboard reads as stored history grows to `size` runs.
+
+    The window boards only ever hold the current window's bests, so their
+    reads should stay flat while a date-range scan of the stored runs grows
+    with the history.
+    """
+    from leaderboard import WindowedLeaderboard, window_bounds
+    from models import InfiniteScore
+
+    rng = random.Random(seed)
+    now = datetime(2026, 12, 31, 12, 0, 0)
+    results: Dict[str, Any] = {}
+    for history in sorted({max(size // 100, 1), max(size // 10, 1), size}):
+        runs = score_runs(history, max(history // 10, 1), rng, now - timedelta(days=365), timedelta(days=365))
+        boards = {window: WindowedLeaderboard(window, clock=lambda: now) for window in ("day", "week")}
+        for window, board in boards.items():
+            start, end = window_bounds(window, now)
+            for run in runs:
+                if start <= run["timestamp"] < end:
+                    board.submit(InfiniteScore(**run))
+        day_start, day_end = window_bounds("day", now)
+        week = boards["week"].current()
+        players = [score.playerId for score in week.top(len(week))] or [None]
+        queue = iter(players * (1000 // len(players) + 1))
+
+        def week_rank():
+            player_id = next(queue)
+            if player_id is not None:
+                index = week.rank(player_id) - 1
+                week.ranked(index - 2, index + 3)
+
+        results[f"history{history}RangeScanDayTop100"] = per_call(lambda: heapq.nlargest(
+            100, (run for run in runs if day_start <= run["timestamp"] < day_end), key=lambda run: run["score"]
+        ), 5)
+        results[f"history{history}DayTop100"] = per_call(lambda: boards["day"].current().top(100), 1000)
+        results[f"history{history}WeekRank"] = per_call(week_rank, 1000)
+    return results
+
+
+@scenario("coalesce", 10_000)
+async def coalesce_scenario(size: int, seed: int) -> Dict[str, Any]:
+    """Backing calls of a coalesced route as request concurrency grows to `size`.
+
+    Each level sends five bursts of identical concurrent requests, 100ms
+    apart, to a coalesced endpoint whose call stands in for a 5ms query.
+    Without coalescing every request would make its own call.
+    """
+    import asyncio
+    from coalesce import DEFAULT_STALE, DEFAULT_TTL, Coalescer
+
+    bursts = 5
+    results: Dict[str, Any] = {}
+    levels = sorted({min(level, size) for level in (10, 100, 1000)} | {size})
+    for concurrency in levels:
+        calls = 0
+
+        async def highscores(limit: int):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.005)
+            return [{"playerId": f"player-{rank:07d}", "score": 100000 - rank} for rank in range(limit)]
+
+        coalescer = Coalescer("highscores", highscores, DEFAULT_TTL, DEFAULT_STALE, 10000)
+        start = time.perf_counter()
+        for _ in range(bursts):
+            await asyncio.gather(*(coalescer.get({"limit": 100}) for _ in range(concurrency)))
+            await asyncio.sleep(0.1)
+        results[f"concurrency{concurrency}Requests"] = concurrency * bursts
+        results[f"concurrency{concurrency}Calls"] = calls
+        results[f"concurrency{concurrency}Burst"] = ((time.perf_counter() - start) / bursts - 0.1) * 1000
+    return results
+
+
+async def run_scenario(name: str, size: int = 0, seed: int = 1) -> Dict[str, Any]:
+    """Run a scenario at `size`, or at its default size when 0"""
+    default_size, function = SCENARIOS[name]
+    results = await function(size or default_size, seed)
+    return {"scenario": name, "size": size or default_size, "seed": seed, "results": results}
+
+
+def format_results(result: Dict[str, Any]) -> str:
+    lines = [f"{result['scenario']} at size {result['size']}"]
+    for metric, value in result["results"].items():
+        lines.append(f"  {metric:<32}{value:>14.4f}" if isinstance(value, float) else f"  {metric:<32}{value:>14}")
+    return "\n".join(lines)
@@ -0,0 +1,96 @@
+"""Seeded player population and weighted route mix"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import random
+
+LEVEL_COUNT = 50
+
+# method, path, JSON body
+Request = Tuple[str, str, Optional[Dict[str, Any]]]
+
+
+class Player:
+    __slots__ = ("id", "level")
+
+    def __init__(self, player_id: str):
+        self.id = player_id
+        self.level = 1
+
+
+def _completion(player: Player, rng: random.Random) -> Dict[str, Any]:
+    level_id = rng.randint(1, player.level)
+    player.level = min(max(player.level, level_id + 1), LEVEL_COUNT)
+    return {
+        "levelId": level_id,
+        "score": rng.randint(500, 60000),
+        "stars": rng.randint(1, 3),
+        "shots": rng.randint(5, 40),
+        "bubblesPopped": rng.randint(10, 120)
+    }
+
+
+def _infinite_score(rng: random.Random) -> Dict[str, Any]:
+    wave = rng.randint(1, 30)
+    return {"score": wave * rng.randint(500, 5000), "wave": wave, "bubblesPopped": rng.randint(10, 400)}
+
+
+def _sync(player: Player, rng: random.Random) -> Dict[str, Any]:
+    events = [{"type": "level-complete", **_completion(player, rng)} for _ in range(2)]
+    events.append({"type": "infinite-score", **_infinite_score(rng)})
+    return {"events": events}
+
+
+# Route name -> (default weight, request builder). Operator routes have no weight by default.
+ROUTES: Dict[str, Tuple[int, Callable[[Player, random.Random], Request]]] = {
+    "health": (1, lambda p, rng: ("GET", "/api/", None)),
+    "levels": (3, lambda p, rng: ("GET", "/api/levels", None)),
+    "level": (2, lambda p, rng: ("GET", f"/api/levels/{rng.randint(1, LEVEL_COUNT)}", None)),
+    "level-stats": (2, lambda p, rng: ("GET", f"/api/levels/{rng.randint(1, LEVEL_COUNT)}/stats", None)),
+    "level-attempt": (4, lambda p, rng: ("POST", f"/api/levels/{rng.randint(1, p.level)}/attempts", None)),
+    "progress": (25, lambda p, rng: ("GET", f"/api/progress/{p.id}", None)),
+    "update-progress": (1, lambda p, rng: ("POST", f"/api/progress/{p.id}", {"currentLevel": p.level})),
+    "complete-level": (20, lambda p, rng: ("POST", f"/api/progress/{p.id}/complete-level", _completion(p, rng))),
+    "highscores": (8, lambda p, rng: ("GET", "/api/infinite/highscores?limit=100", None)),
+    "highscores-day": (2, lambda p, rng: ("GET", "/api/infinite/highscores?limit=100&window=day", None)),
+    "rank": (4, lambda p, rng: ("GET", f"/api/infinite/rank/{p.id}", None)),
+    "daily": (1, lambda p, rng: ("GET", "/api/infinite/daily", None)),
+    "board": (3, lambda p, rng: ("GET", f"/api/infinite/board/{rng.randint(0, 9)}/{rng.randint(1, 30)}", None)),
+    "infinite-score": (10, lambda p, rng: ("POST", f"/api/infinite/highscores/{p.id}", _infinite_score(rng))),
+    "achievements": (8, lambda p, rng: ("GET", f"/api/achievements/{p.id}", None)),
+    "sync": (2, lambda p, rng: ("POST", f"/api/sync/{p.id}", _sync(p, rng))),
+    "cache-stats": (0, lambda p, rng: ("GET", "/api/cache/stats", None)),
+    "metrics": (0, lambda p, rng: ("GET", "/api/metrics", None)),
+}
+
+# Responses that are part of normal traffic rather than errors, e.g. rank before a first score
+EXPECTED_STATUS = {"rank": {200, 404}}
+
+
+def parse_mix(spec: Optional[str]) -> Dict[str, int]:
+    """Parse "progress=50,highscores=20" into route weights; no spec gives the default mix"""
+    if not spec:
+        return {name: weight for name, (weight, _) in ROUTES.items() if weight}
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise ValueError(f"Unknown route {name!r}, expected one of {', '.join(ROUTES)}")
+        mix[name] = int(weight or 1)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+class Workload:
+    """Deterministic stream of (route, request) for a population and mix"""
+
+    def __init__(self, players: int, mix: Dict[str, int], seed: int = 1, prefix: str = "bench"):
+        self.rng = random.Random(seed)
+        self.players = [Player(f"{prefix}-{index:07d}") for index in range(players)]
+        self.names: List[str] = list(mix)
+        self.weights: List[int] = [mix[name] for name in self.names]
+
+    def next(self) -> Tuple[str, Request]:
+        name = self.rng.choices(self.names, self.weights)[0]
+        return name, ROUTES[name][1](self.rng.choice(self.players), self.rng)
+
+    def sample(self, name: str) -> Request:
+        return ROUTES[name][1](self.rng.choice(self.players), self.rng)
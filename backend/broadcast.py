@@ -0,0 +1,123 @@
+"""Messages between the worker processes of one server.
+
+Each worker binds a Unix datagram socket named after its pid in a
+directory shared by the workers of one server, BROADCAST_DIR, which
+serve.py creates. `publish` sends a message to every other socket in that
+directory; receivers run the handlers subscribed to its topic. Nothing is
+sent when the directory is not set, as with a single plain uvicorn process.
+
+Delivery is best effort: a message to a worker whose socket buffer is full
+is dropped and counted. Topics carry cache invalidations and leaderboard
+submissions, where a lost message costs at most a cache TTL of staleness
+or a missed leaderboard entry until that worker restarts.
+"""
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import logging
+import os
+import socket
+import time
+
+import orjson
+
+from responses import dumps
+
+logger = logging.getLogger(__name__)
+
+# How long the list of peer sockets is reused before the directory is read again
+PEER_REFRESH = 1.0
+
+
+class Broadcast:
+    """Best-effort publish/subscribe between the workers sharing a socket directory"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.directory: Optional[str] = None
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+        self._handlers: Dict[str, List[Callable[[Any], None]]] = defaultdict(list)
+        self._socket: Optional[socket.socket] = None
+        self._path: Optional[str] = None
+        self._peers: List[str] = []
+        self._peers_at = float("-inf")
+
+    @property
+    def open(self) -> bool:
+        return self._socket is not None
+
+    def subscribe(self, topic: str, handler: Callable[[Any], None]):
+        """Run `handler` with the payload of every message on `topic` from another worker"""
+        self._handlers[topic].append(handler)
+
+    def start(self, directory: Optional[str], name: Optional[str] = None):
+        """Bind this worker's socket in `directory`, named after its pid by default, and receive on the running loop; no-op without a directory"""
+        if not directory or self._socket is not None:
+            return
+        self.directory = directory
+        self._path = os.path.join(directory, f"{name or os.getpid()}.sock")
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._socket.bind(self._path)
+        asyncio.get_running_loop().add_reader(self._socket.fileno(), self._receive)
+
+    def stop(self):
+        if self._socket is None:
+            return
+        asyncio.get_running_loop().remove_reader(self._socket.fileno())
+        self._socket.close()
+        self._socket = None
+        try:
+            os.unlink(self._path)
+        except FileNotFoundError:
+            pass
+
+    def publish(self, topic: str, payload: Any):
+        """Send a message to every other worker"""
+        if self._socket is None:
+            return
+        message = dumps([topic, payload])
+        for peer in self._peer_paths():
+            try:
+                self._socket.sendto(message, peer)
+                self.sent += 1
+            except BlockingIOError:
+                self.dropped += 1
+            except (FileNotFoundError, ConnectionRefusedError):
+                # The worker went away; its socket disappears on the next refresh
+                self.dropped += 1
+                self._peers_at = float("-inf")
+
+    def _peer_paths(self) -> List[str]:
+        now = self.clock()
+        if now - self._peers_at >= PEER_REFRESH:
+            self._peers = [
+                os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                if name.endswith(".sock") and os.path.join(self.directory, name) != self._path
+            ]
+            self._peers_at = now
+        return self._peers
+
+    def _receive(self):
+        while True:
+            try:
+                message = self._socket.recv(65536)
+            except BlockingIOError:
+                return
+            self.received += 1
+            try:
+                topic, payload = orjson.loads(message)
+                for handler in self._handlers.get(topic, ()):
+                    handler(payload)
+            except Exception:
+                logger.exception("Could not handle a broadcast message")
+
+    def stats(self) -> Dict[str, int]:
+        return {"peers": len(self._peer_paths()) if self.open else 0, "sent": self.sent, "received": self.received, "dropped": self.dropped}
+
+
+broadcast = Broadcast()
@@ -0,0 +1,116 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import asyncio
+import time
+
+MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU cache with per-entry TTL and single-flight loading.
+
+    Concurrent misses for the same key share one loader call. Invalidating a
+    key while it is loading drops the in-flight result instead of caching it,
+    so a write can never be overwritten by an older read. A `max_size` of 0
+    disables caching but keeps the single-flight behaviour.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any:
+        """Get a live entry or MISSING"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        if entry[0] <= self.clock():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return MISSING
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def peek(self, key: Hashable) -> Any:
+        """Get a live entry or MISSING without touching LRU order or counters"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self.clock():
+            return MISSING
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store an entry, evicting the least recently used ones past max_size"""
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Drop an entry and any load of it that is still in flight"""
+        self._entries.pop(key, None)
+        self._inflight.pop(key, None)
+
+    def clear(self):
+        """Drop all entries"""
+        self._entries.clear()
+        self._inflight.clear()
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], cache_none: bool = False) -> Any:
+        """Get an entry, loading it once for all concurrent callers on a miss"""
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except BaseException as e:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            future.set_exception(e)
+            # Waiters re-raise it; mark it retrieved so an unobserved failure is not logged
+            future.exception()
+            raise
+
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+            if value is not None or cache_none:
+                self.set(key, value)
+        future.set_result(value)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        """Get the cache counters"""
+        return {
+            "size": len(self._entries),
+            "maxSize": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,137 @@
+from fastapi import Request, Response
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+
+from models import Level
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledResource(NamedTuple):
+    body: bytes
+    gzipped: bytes
+    etag: str
+
+
+def compile_resource(payload, version: int) -> CompiledResource:
+    """Serialize a payload once into plain and gzipped bytes with a content ETag"""
+    body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    digest = hashlib.sha256(body).hexdigest()[:16]
+    return CompiledResource(body, gzip.compress(body, mtime=0), f'"v{version}-{digest}"')
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """Check an Accept-Encoding header for gzip with a non-zero q-value, directly or through *"""
+    qualities = {}
+    for item in (accept_encoding or "").split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+class LevelCatalog:
+    """Static level data compiled into ready-to-send responses.
+
+    The catalog is validated and serialized once per load. The data file is
+    polled for changes at most every `reload_interval` seconds so a new
+    version can be rolled out without a restart.
+    """
+
+    def __init__(self, path: Path, reload_interval: float = 5.0):
+        self.path = Path(path)
+        self.reload_interval = reload_interval
+        self.version = 0
+        self.levels: List[Level] = []
+        self._catalog: Optional[CompiledResource] = None
+        self._by_id: Dict[int, CompiledResource] = {}
+        self._levels: Dict[int, Level] = {}
+        self._mtime = 0.0
+        self._checked_at = 0.0
+
+    def load(self):
+        """Load and compile the level data file"""
+        mtime = self.path.stat().st_mtime
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        version = data["version"]
+        levels = [Level(**level_data) for level_data in data["levels"]]
+        level_dicts = [level.dict() for level in levels]
+
+        self._catalog = compile_resource(level_dicts, version)
+        self._by_id = {level["id"]: compile_resource(level, version) for level in level_dicts}
+        self.levels = levels
+        self._levels = {level.id: level for level in levels}
+        self.version = version
+        self._mtime = mtime
+        self._checked_at = time.monotonic()
+        logger.info("Loaded level catalog v%s (%d levels)", version, len(levels))
+
+    def maybe_reload(self):
+        """Reload the data file if it changed since the last check"""
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+
+        try:
+            if self.path.stat().st_mtime != self._mtime:
+                self.load()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error("Keeping level catalog v%s, reload failed: %s", self.version, e)
+
+    def catalog(self) -> CompiledResource:
+        """Get the compiled list of all levels"""
+        self.maybe_reload()
+        return self._catalog
+
+    def get(self, level_id: int) -> Optional[CompiledResource]:
+        """Get a compiled level by ID"""
+        self.maybe_reload()
+        return self._by_id.get(level_id)
+
+    def level(self, level_id: int) -> Optional[Level]:
+        """Get a level's data by ID"""
+        self.maybe_reload()
+        return self._levels.get(level_id)
+
+
+def compiled_response(resource: CompiledResource, request: Request) -> Response:
+    """Send a compiled resource, honouring If-None-Match and gzip negotiation"""
+    headers = {"ETag": resource.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), resource.etag):
+        return Response(status_code=304, headers=headers)
+
+    if accepts_gzip(request.headers.get("accept-encoding")):
+        headers["Content-Encoding"] = "gzip"
+        return Response(resource.gzipped, media_type="application/json", headers=headers)
+    return Response(resource.body, media_type="application/json", headers=headers)
+
+
+level_catalog = LevelCatalog(
+    Path(os.environ.get("LEVELS_FILE", Path(__file__).parent / "data" / "levels.json")),
+    float(os.environ.get("LEVELS_RELOAD_INTERVAL", "5"))
+)
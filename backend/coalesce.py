@@ -0,0 +1,152 @@
+"""Single-flight coalescing and micro-caching for GET routes.
+
+`@coalesce()` goes under the route decorator:
+
+    @api_router.get("/infinite/highscores", response_model=List[InfiniteScore])
+    @coalesce(ttl=0.25)
+    async def get_infinite_highscores(limit: int = 100): ...
+
+Requests with the same endpoint arguments share one call of the handler,
+and its result is serialized once and served as bytes for `ttl` seconds.
+For `stale` seconds after that the old body is still served while a
+single background call refreshes it. Errors are never cached. Writes that
+change a coalesced resource call `invalidate` with the same arguments.
+"""
+from collections import OrderedDict
+from fastapi import Response
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+import asyncio
+import functools
+import os
+import time
+
+from responses import dumps
+
+DEFAULT_TTL = int(os.environ.get('COALESCE_TTL_MS', '250')) / 1000
+DEFAULT_STALE = int(os.environ.get('COALESCE_STALE_MS', '2000')) / 1000
+
+coalescers: List["Coalescer"] = []
+
+
+class Coalescer:
+    """Shared in-flight calls and short-lived serialized results of one endpoint"""
+
+    def __init__(self, name: str, endpoint: Callable, ttl: float, stale: float, max_size: int,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.endpoint = endpoint
+        self.ttl = ttl
+        self.stale = stale
+        self.max_size = max_size
+        self.clock = clock
+        self.hits = 0
+        self.stale_hits = 0
+        self.coalesced = 0
+        self.calls = 0
+        # key -> (fresh until, stale until, body)
+        self._entries: "OrderedDict[Hashable, Tuple[float, float, bytes]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    @staticmethod
+    def key(arguments: Dict[str, Any]) -> Hashable:
+        return tuple(sorted(arguments.items()))
+
+    def invalidate(self, **arguments):
+        """Drop the cached result and any in-flight call for these arguments"""
+        key = self.key(arguments)
+        self._entries.pop(key, None)
+        self._inflight.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._inflight.clear()
+
+    async def get(self, arguments: Dict[str, Any]) -> bytes:
+        key = self.key(arguments)
+        entry = self._entries.get(key)
+        if entry is not None:
+            now = self.clock()
+            if now < entry[0]:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[2]
+            if now < entry[1]:
+                self.stale_hits += 1
+                if key not in self._inflight:
+                    self._start(key, arguments)
+                return entry[2]
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = self._start(key, arguments)
+        # Shielded so one caller going away does not cancel the shared call
+        return await asyncio.shield(future)
+
+    def _start(self, key: Hashable, arguments: Dict[str, Any]) -> asyncio.Future:
+        future = asyncio.ensure_future(self._call(key, arguments))
+        future.add_done_callback(_consume)
+        self._inflight[key] = future
+        self.calls += 1
+        return future
+
+    async def _call(self, key: Hashable, arguments: Dict[str, Any]) -> bytes:
+        try:
+            body = dumps(await self.endpoint(**arguments))
+        finally:
+            future = self._inflight.get(key)
+            if future is not None and future is asyncio.current_task():
+                del self._inflight[key]
+            else:
+                # Invalidated during the call, so its result is not cached
+                future = None
+
+        if future is not None:
+            now = self.clock()
+            self._entries[key] = (now + self.ttl, now + self.ttl + self.stale, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return body
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "staleHits": self.stale_hits,
+            "coalesced": self.coalesced,
+            "calls": self.calls,
+        }
+
+
+def _consume(task: asyncio.Future):
+    # Background refreshes report errors to nobody; the next request retries
+    if not task.cancelled():
+        task.exception()
+
+
+def coalesce(ttl: Optional[float] = None, stale: Optional[float] = None, max_size: int = 10000):
+    """Coalesce and micro-cache a GET endpoint whose arguments are all hashable"""
+    def decorator(endpoint: Callable):
+        coalescer = Coalescer(
+            endpoint.__name__, endpoint,
+            DEFAULT_TTL if ttl is None else ttl,
+            DEFAULT_STALE if stale is None else stale,
+            max_size
+        )
+        coalescers.append(coalescer)
+
+        @functools.wraps(endpoint)
+        async def wrapper(**arguments):
+            return Response(await coalescer.get(arguments), media_type="application/json")
+
+        wrapper.coalescer = coalescer
+        wrapper.invalidate = coalescer.invalidate
+        return wrapper
+    return decorator
+
+
+def coalescer_stats() -> Dict[str, Dict[str, int]]:
+    """Counters of every coalesced endpoint"""
+    return {coalescer.name: coalescer.stats() for coalescer in coalescers}
@@ -1,97 +1,346 @@
-from motor.motor_asyncio import AsyncIOMotorClient
-from typing import List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 import os
-from models import PlayerProgress, InfiniteScore, PlayerAchievements, Level, LevelProgress
+from models import (
+    PlayerProgress, InfiniteScore, PlayerAchievements, Achievement, Level, PlayerRank, LevelStats,
+    LevelCompleteRequest, InfiniteScoreRequest
+)
+from leaderboard import Leaderboard, WINDOWS, WindowedLeaderboard
+from cache import TTLCache
+from progress_format import encode_progress, decode_progress, default_progress, LEVEL_COUNT
+from level_stats import (
+    attempt_increments, build_level_stats, completion_increments, count_progress, counter_fields, merge_increments
+)
+from storage import StorageBackend, create_storage
+from broadcast import broadcast
 from datetime import datetime
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ScoreWriteBuffer:
+    """Write-behind queue that groups inserts into batches.
+
+    A batch is flushed once it reaches `batch_size` documents or its oldest
+    document has waited `max_delay` seconds. At most `max_pending` documents
+    are held; `put` waits for room when the queue is full.
+
+    A failed batch is retried up to `max_retries` times, waiting
+    `retry_delay` seconds and doubling after each attempt, before anything
+    queued behind it; the flush must therefore be safe to repeat. Only then
+    is it dropped and counted in `failed`.
+    """
+
+    def __init__(self, batch_size: int = 500, max_delay: float = 0.05, max_pending: int = 10000,
+                 max_retries: int = 3, retry_delay: float = 0.5):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.flush: Optional[Callable[[List[dict]], Awaitable[None]]] = None
+        self.flushed = 0
+        self.retried = 0
+        self.failed = 0
+        self.retrying = False
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self, flush: Callable[[List[dict]], Awaitable[None]]):
+        """Start flushing batches through a coroutine function"""
+        self.flush = flush
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = asyncio.create_task(self._run())
+
+    async def put(self, document: dict):
+        """Queue a document, waiting while the buffer is full"""
+        await self._queue.put(document)
+
+    async def close(self):
+        """Flush everything still queued and stop"""
+        if not self._task:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[dict]):
+        attempt = 0
+        try:
+            while True:
+                try:
+                    await self.flush(batch)
+                    self.flushed += len(batch)
+                    return
+                except Exception as e:
+                    if attempt >= self.max_retries:
+                        self.failed += len(batch)
+                        logger.error("Dropped %d buffered documents after %d attempts: %s", len(batch), attempt + 1, e)
+                        return
+                    delay = self.retry_delay * 2 ** attempt
+                    attempt += 1
+                    self.retried += len(batch)
+                    self.retrying = True
+                    logger.warning("Failed to flush %d buffered documents, retrying in %.1fs: %s", len(batch), delay, e)
+                    await asyncio.sleep(delay)
+        finally:
+            self.retrying = False
+            for _ in batch:
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue depth and write outcomes"""
+        return {
+            "pending": self.pending,
+            "flushed": self.flushed,
+            "retried": self.retried,
+            "dropped": self.failed,
+            "retrying": self.retrying
+        }
+
 
 class Database:
-    def __init__(self):
-        self.client: AsyncIOMotorClient = None
-        self.database = None
+    def __init__(self, storage: Optional[StorageBackend] = None):
+        self.storage = storage
+        self.leaderboard = Leaderboard()
+        self.window_leaderboards = {window: WindowedLeaderboard(window) for window in WINDOWS}
+        self.score_writer = ScoreWriteBuffer()
+        self.progress_cache = TTLCache()
+        self.achievements_cache = TTLCache()
+        self.level_stats_cache = TTLCache()
+        self._schema_task: Optional[asyncio.Task] = None
+        self.ready = False
+        self._subscribe()
+
+    async def connect(self, serve: bool = True):
+        """Open the storage backend, warming in-process state when serving requests"""
+        if self.storage is None:
+            self.storage = create_storage(os.environ.get('STORAGE_BACKEND', 'mongo'))
+        await self.storage.connect()
+        if not serve:
+            return
+
+        # Strict mode blocks startup until indexes exist; otherwise they build in the background
+        index_mode = os.environ.get('MONGO_INDEX_MODE', 'warn')
+        if index_mode == 'strict':
+            await self.storage.ensure_schema(index_mode)
+        else:
+            self._schema_task = asyncio.create_task(self.storage.ensure_schema(index_mode))
 
-    async def connect_to_mongo(self):
-        """Create database connection"""
-        self.client = AsyncIOMotorClient(os.environ['MONGO_URL'])
-        self.database = self.client[os.environ['DB_NAME']]
+        # Open pooled connections up front so the first requests do not pay for them
+        if not await self.storage.ping(int(os.environ.get('STORAGE_WARM_CONNECTIONS', '10'))):
+            raise RuntimeError(f"{self.storage.name} storage is not answering")
 
-    async def close_mongo_connection(self):
-        """Close database connection"""
-        if self.client:
-            self.client.close()
+        # Receive from other workers before loading, so no run submitted meanwhile is missed
+        broadcast.start(os.environ.get('BROADCAST_DIR'))
+        await self.load_leaderboard()
+        self.score_writer = ScoreWriteBuffer(
+            batch_size=int(os.environ.get('SCORE_BATCH_SIZE', '500')),
+            max_delay=int(os.environ.get('SCORE_FLUSH_DELAY_MS', '50')) / 1000,
+            max_pending=int(os.environ.get('SCORE_QUEUE_SIZE', '10000')),
+            max_retries=int(os.environ.get('SCORE_FLUSH_RETRIES', '3')),
+            retry_delay=int(os.environ.get('SCORE_RETRY_DELAY_MS', '500')) / 1000
+        )
+        self.score_writer.start(self._write_scores)
+
+        cache_size = int(os.environ.get('PLAYER_CACHE_SIZE', '10000'))
+        cache_ttl = float(os.environ.get('PLAYER_CACHE_TTL', '30'))
+        self.progress_cache = TTLCache(max_size=cache_size, ttl=cache_ttl)
+        self.achievements_cache = TTLCache(max_size=cache_size, ttl=cache_ttl)
+        # Stats change on every completion, so they are served up to a TTL stale rather than invalidated
+        self.level_stats_cache = TTLCache(max_size=1000, ttl=float(os.environ.get('LEVEL_STATS_CACHE_TTL', '60')))
+        self.ready = True
+
+    async def load_leaderboard(self):
+        """Warm the in-memory leaderboard with each player's best infinite score"""
+        await self._reload(self.leaderboard, self.storage.best_scores())
+        for windowed in self.window_leaderboards.values():
+            await self._reload(windowed.current(), self.storage.window_bests(windowed.id))
+
+    @staticmethod
+    async def _reload(leaderboard: Leaderboard, stored):
+        scores = [InfiniteScore(**score_data) async for score_data in stored]
+        # Runs other workers broadcast while the stored ones were read are kept
+        received = leaderboard.top(len(leaderboard))
+        leaderboard.load(scores)
+        for score in received:
+            leaderboard.submit(score)
+
+    def submit_score(self, infinite_score: InfiniteScore, publish: bool = True):
+        """Add a run to the all-time and current window leaderboards of every worker"""
+        self.leaderboard.submit(infinite_score)
+        for windowed in self.window_leaderboards.values():
+            windowed.submit(infinite_score)
+        if publish:
+            broadcast.publish("score", infinite_score)
+
+    def invalidate_progress(self, player_id: str):
+        """Drop a player's cached progress in every worker"""
+        self.progress_cache.invalidate(player_id)
+        broadcast.publish("progress", player_id)
+
+    def invalidate_achievements(self, player_id: str):
+        """Drop a player's cached achievements in every worker"""
+        self.achievements_cache.invalidate(player_id)
+        broadcast.publish("achievements", player_id)
+
+    def _subscribe(self):
+        # Messages from other workers apply locally without being sent on again
+        broadcast.subscribe("score", lambda score_data: self.submit_score(InfiniteScore(**score_data), publish=False))
+        broadcast.subscribe("progress", lambda player_id: self.progress_cache.invalidate(player_id))
+        broadcast.subscribe("achievements", lambda player_id: self.achievements_cache.invalidate(player_id))
+
+    def leaderboard_for(self, window: str = "all") -> Leaderboard:
+        """Get the all-time leaderboard or the current one of a window"""
+        if window == "all":
+            return self.leaderboard
+        return self.window_leaderboards[window].current()
+
+    async def _write_scores(self, scores: List[dict]):
+        """Insert score runs and raise the stored window bests they beat"""
+        await self.storage.insert_scores(scores)
+        infinite_scores = [InfiniteScore(**score_data) for score_data in scores]
+        entries = [entry for windowed in self.window_leaderboards.values() for entry in windowed.entries(infinite_scores)]
+        await self.storage.raise_window_bests(entries)
+
+    async def close(self):
+        """Flush pending writes and close the storage backend"""
+        self.ready = False
+        await self.score_writer.close()
+        broadcast.stop()
+        if self._schema_task and not self._schema_task.done():
+            self._schema_task.cancel()
+        if self.storage:
+            await self.storage.close()
+
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Get hit/miss/eviction counters of the player caches"""
+        return {
+            "progress": self.progress_cache.stats(),
+            "achievements": self.achievements_cache.stats(),
+            "levelStats": self.level_stats_cache.stats()
+        }
 
     async def get_player_progress(self, player_id: str) -> Optional[PlayerProgress]:
         """Get player progress by ID"""
-        progress_data = await self.database.player_progress.find_one({"playerId": player_id})
+        return await self.progress_cache.get_or_load(player_id, lambda: self._load_player_progress(player_id))
+
+    async def _load_player_progress(self, player_id: str) -> Optional[PlayerProgress]:
+        progress_data = await self.storage.get_progress(player_id)
         if progress_data:
-            return PlayerProgress(**progress_data)
+            return decode_progress(progress_data)
         return None
 
-    async def create_player_progress(self, player_id: str) -> PlayerProgress:
-        """Create new player progress with default values"""
-        # Initialize with first 3 levels unlocked
-        initial_levels = []
-        for i in range(50):
-            level_progress = LevelProgress(
-                id=i + 1,
-                unlocked=i < 3,  # First 3 levels unlocked
-                completed=False,
-                stars=0,
-                bestScore=0
-            )
-            initial_levels.append(level_progress)
-
-        progress = PlayerProgress(
-            playerId=player_id,
-            currentLevel=1,
-            totalScore=0,
-            totalStars=0,
-            infiniteHighScore=0,
-            infiniteHighWave=0,
-            levels=initial_levels
-        )
-        
-        progress_dict = progress.dict()
-        await self.database.player_progress.insert_one(progress_dict)
-        return progress
+    async def get_progress_or_default(self, player_id: str) -> PlayerProgress:
+        """Get player progress, or defaults for a player with nothing stored yet.
+
+        Defaults are not written; the first real write creates the document.
+        """
+        return await self.get_player_progress(player_id) or default_progress(player_id)
 
     async def update_player_progress(self, player_id: str, progress: PlayerProgress) -> PlayerProgress:
         """Update player progress"""
         progress.updatedAt = datetime.utcnow()
-        progress_dict = progress.dict()
-        
-        await self.database.player_progress.update_one(
-            {"playerId": player_id},
-            {"$set": progress_dict},
-            upsert=True
-        )
+        await self.storage.save_progress(player_id, encode_progress(progress))
+        self.invalidate_progress(player_id)
         return progress
 
     async def complete_level(self, player_id: str, level_id: int, score: int, stars: int, shots: int) -> PlayerProgress:
-        """Complete a level and update progress"""
-        progress = await self.get_player_progress(player_id)
-        if not progress:
-            progress = await self.create_player_progress(player_id)
-
-        # Update level progress
-        level_progress = next((l for l in progress.levels if l.id == level_id), None)
-        if level_progress:
-            level_progress.completed = True
-            level_progress.stars = max(level_progress.stars, stars)
-            level_progress.bestScore = max(level_progress.bestScore, score)
-            level_progress.lastPlayed = datetime.utcnow()
-
-            # Unlock next level
-            if level_id < 50:
-                next_level = next((l for l in progress.levels if l.id == level_id + 1), None)
-                if next_level:
-                    next_level.unlocked = True
-
-            # Update totals
-            progress.totalScore += score
-            progress.totalStars = sum(l.stars for l in progress.levels)
-            progress.currentLevel = max(progress.currentLevel, level_id + 1)
-
-        return await self.update_player_progress(player_id, progress)
+        """Complete a level and update progress in a single atomic update"""
+        progress_data, _ = await asyncio.gather(
+            self.storage.complete_level(
+                player_id,
+                (level_id, score, stars),
+                encode_progress(default_progress(player_id)),
+                datetime.utcnow()
+            ),
+            self._increment_level_stats({level_id: completion_increments(score, stars)})
+        )
+        # Concurrent writes can finish out of order, so drop the entry rather than write through
+        self.invalidate_progress(player_id)
+        return decode_progress(progress_data)
+
+    async def record_level_attempt(self, level_id: int):
+        """Count a level run that ended without clearing it"""
+        await self._increment_level_stats({level_id: attempt_increments()})
+
+    async def _increment_level_stats(self, increments: Dict[int, Dict[str, int]]):
+        # Stats are secondary, a failed increment must not fail the player's request
+        results = await asyncio.gather(
+            *(
+                self.storage.increment_level_stats(level_id, fields)
+                for level_id, fields in increments.items()
+                if 1 <= level_id <= LEVEL_COUNT
+            ),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error("Failed to update level stats: %s", result)
+
+    async def get_level_stats(self, level_id: int) -> LevelStats:
+        """Get a level's aggregated statistics"""
+        return await self.level_stats_cache.get_or_load(
+            level_id,
+            lambda: self._load_level_stats(level_id)
+        )
+
+    async def _load_level_stats(self, level_id: int) -> LevelStats:
+        return build_level_stats(level_id, await self.storage.get_level_stats(level_id))
+
+    async def backfill_level_stats(self, batch_size: int = 1000) -> int:
+        """Rebuild every level's statistics from stored progress, returns how many players were scanned.
+
+        The counters are moved from what they were before the scan to the
+        rebuilt totals by increments, not replaced, so completions recorded
+        while the scan runs are kept. One whose progress the scan also read
+        is counted twice.
+        """
+        before = {
+            level_id: counter_fields(await self.storage.get_level_stats(level_id))
+            for level_id in range(1, LEVEL_COUNT + 1)
+        }
+        scanned = 0
+        totals: Dict[int, Dict[str, int]] = {}
+        async for progress_data in self.storage.iter_progress(batch_size):
+            count_progress(totals, decode_progress(progress_data))
+            scanned += 1
+
+        for level_id, fields in totals.items():
+            current = before.get(level_id, {})
+            increments = {field: fields.get(field, 0) - current.get(field, 0) for field in {*fields, *current}}
+            increments = {field: value for field, value in increments.items() if value}
+            if increments:
+                await self.storage.increment_level_stats(level_id, increments)
+        self.level_stats_cache.clear()
+        return scanned
 
     async def save_infinite_score(self, player_id: str, score: int, wave: int) -> InfiniteScore:
         """Save infinite mode score"""
@@ -102,30 +351,92 @@ class Database:
         )
         
         score_dict = infinite_score.dict()
-        await self.database.infinite_scores.insert_one(score_dict)
+        await self.score_writer.put(score_dict)
+        self.submit_score(infinite_score)
 
         # Update player's high scores
-        progress = await self.get_player_progress(player_id)
-        if progress:
-            if score > progress.infiniteHighScore:
-                progress.infiniteHighScore = score
-            if wave > progress.infiniteHighWave:
-                progress.infiniteHighWave = wave
-            await self.update_player_progress(player_id, progress)
+        await self.storage.raise_infinite_high(
+            player_id, score, wave, encode_progress(default_progress(player_id)), infinite_score.timestamp
+        )
+        self.invalidate_progress(player_id)
 
         return infinite_score
 
-    async def get_infinite_leaderboard(self, limit: int = 100) -> List[InfiniteScore]:
-        """Get top infinite mode scores"""
-        cursor = self.database.infinite_scores.find().sort("score", -1).limit(limit)
-        scores = []
-        async for score_data in cursor:
-            scores.append(InfiniteScore(**score_data))
-        return scores
+    async def sync_events(self, player_id: str, completions: List[LevelCompleteRequest], scores: List[InfiniteScoreRequest]) -> Tuple[PlayerProgress, List[InfiniteScore]]:
+        """Apply a batch of queued level completions and infinite scores in order.
+
+        Scores are written in one batch and progress in one atomic update,
+        using the same rules the per-event endpoints apply, so the result
+        matches a sequential replay of the batch.
+        """
+        infinite_scores = [InfiniteScore(playerId=player_id, score=s.score, wave=s.wave) for s in scores]
+        if infinite_scores:
+            await self._write_scores([score.dict() for score in infinite_scores])
+            for infinite_score in infinite_scores:
+                self.submit_score(infinite_score)
+
+        infinite_high = None
+        if infinite_scores:
+            infinite_high = (max(s.score for s in infinite_scores), max(s.wave for s in infinite_scores))
+        level_increments: Dict[int, Dict[str, int]] = {}
+        for c in completions:
+            merge_increments(level_increments.setdefault(c.levelId, {}), completion_increments(c.score, c.stars))
+        progress_data, _ = await asyncio.gather(
+            self.storage.apply_batch(
+                player_id,
+                [(c.levelId, c.score, c.stars) for c in completions],
+                infinite_high,
+                encode_progress(default_progress(player_id)),
+                datetime.utcnow()
+            ),
+            self._increment_level_stats(level_increments)
+        )
+        self.invalidate_progress(player_id)
+        return decode_progress(progress_data), infinite_scores
+
+    async def migrate_progress_documents(self, batch_size: int = 1000) -> int:
+        """Convert legacy `levels` progress documents to the compact format in batches"""
+        migrated = await self.storage.migrate_progress(batch_size)
+        if migrated:
+            self.progress_cache.clear()
+        return migrated
+
+    async def prune_untouched_players(self, batch_size: int = 1000) -> Dict[str, int]:
+        """Delete player documents that still read as defaults, returns deletions per collection"""
+        deleted = await self.storage.prune_untouched(batch_size)
+        self.progress_cache.clear()
+        self.achievements_cache.clear()
+        return deleted
+
+    async def get_infinite_leaderboard(self, limit: int = 100, offset: int = 0, window: str = "all") -> List[InfiniteScore]:
+        """Get top infinite mode scores, best run per player"""
+        return self.leaderboard_for(window).top(limit, offset)
+
+    async def get_infinite_rank(self, player_id: str, radius: int = 2, window: str = "all") -> Optional[PlayerRank]:
+        """Get a player's leaderboard rank with the entries around it"""
+        leaderboard = self.leaderboard_for(window)
+        rank = leaderboard.rank(player_id)
+        if rank is None:
+            return None
+
+        index = rank - 1
+        neighbours = leaderboard.ranked(index - radius, index + radius + 1)
+        position = min(index, radius)
+        return PlayerRank(
+            playerId=player_id,
+            rank=rank,
+            total=len(leaderboard),
+            entry=neighbours[position],
+            above=neighbours[:position],
+            below=neighbours[position + 1:]
+        )
 
     async def get_player_achievements(self, player_id: str) -> Optional[PlayerAchievements]:
         """Get player achievements"""
-        achievements_data = await self.database.player_achievements.find_one({"playerId": player_id})
+        return await self.achievements_cache.get_or_load(player_id, lambda: self._load_player_achievements(player_id))
+
+    async def _load_player_achievements(self, player_id: str) -> Optional[PlayerAchievements]:
+        achievements_data = await self.storage.get_achievements(player_id)
         if achievements_data:
             return PlayerAchievements(**achievements_data)
         return None
@@ -133,14 +444,25 @@ class Database:
     async def update_player_achievements(self, player_id: str, achievements: PlayerAchievements) -> PlayerAchievements:
         """Update player achievements"""
         achievements.updatedAt = datetime.utcnow()
-        achievements_dict = achievements.dict()
-        
-        await self.database.player_achievements.update_one(
-            {"playerId": player_id},
-            {"$set": achievements_dict},
-            upsert=True
-        )
+        await self.storage.save_achievements(player_id, achievements.dict())
+        self.achievements_cache.set(player_id, achievements)
+        broadcast.publish("achievements", player_id)
         return achievements
 
+    async def record_achievement_stats(self, player_id: str, increments: Dict[str, int], maximums: Dict[str, int], defaults: List[dict]) -> dict:
+        """Advance a player's achievement stats and return them with the unlock flags"""
+        state = await self.storage.record_achievement_stats(player_id, increments, maximums, defaults, datetime.utcnow())
+        self.invalidate_achievements(player_id)
+        return state
+
+    async def unlock_achievements(self, player_id: str, achievements: List[Achievement]):
+        """Unlock achievements that are still locked"""
+        await self.storage.unlock_achievements(player_id, [
+            {"id": a.id, "progress": a.progress, "unlockedAt": a.unlockedAt}
+            for a in achievements
+        ])
+        self.invalidate_achievements(player_id)
+
+
 # Global database instance
-database = Database()
\ No newline at end of file
+database = Database()
@@ -0,0 +1,40 @@
+"""Streaming NDJSON export of infinite scores and player progress.
+
+Rows are read page by page with keyset pagination and encoded straight
+from the stored documents, without building models, so memory use depends
+on the batch size rather than on the size of the export. Each line holds
+the keys to resume from: (score, id) for scores, playerId for progress.
+"""
+from typing import AsyncIterator, Optional
+import json
+
+from storage import StorageBackend
+from storage.base import ScoreKey
+
+_encode = json.JSONEncoder(separators=(",", ":"), default=lambda value: value.isoformat()).encode
+
+
+def _chunk(rows) -> bytes:
+    return "".join([_encode(row) + "\n" for row in rows]).encode()
+
+
+async def export_scores(storage: StorageBackend, batch_size: int = 1000, after: Optional[ScoreKey] = None) -> AsyncIterator[bytes]:
+    """Every infinite score run by score descending then id, one NDJSON chunk per batch"""
+    while True:
+        page = await storage.scores_page(after, batch_size)
+        if page:
+            yield _chunk(page)
+        if len(page) < batch_size:
+            return
+        after = (page[-1]["score"], page[-1]["id"])
+
+
+async def export_progress(storage: StorageBackend, batch_size: int = 1000, after: Optional[str] = None) -> AsyncIterator[bytes]:
+    """Every stored progress document by playerId, one NDJSON chunk per batch"""
+    while True:
+        page = await storage.progress_page(after, batch_size)
+        if page:
+            yield _chunk(page)
+        if len(page) < batch_size:
+            return
+        after = page[-1]["playerId"]
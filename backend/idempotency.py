@@ -0,0 +1,245 @@
+"""Idempotency-Key handling for POST routes.
+
+A client that may send a POST again, after a timeout or on a flaky mobile
+network, sends the same `Idempotency-Key` header with every attempt. The
+first attempt runs and its response is kept; later attempts with that key
+get the kept response back, marked with `Idempotent-Replayed: true`,
+without running the route again.
+
+Keys are scoped to the request path and live for IDEMPOTENCY_TTL_SECONDS.
+Responses are kept in a bounded in-process cache and in storage, so a
+retry that lands on another worker is answered too. While the first
+attempt runs, duplicates on this worker wait for its response, and
+duplicates on other workers poll storage for up to IDEMPOTENCY_WAIT_MS
+before getting 409. Reusing a key with a different body answers 422.
+
+Server errors and transient refusals (408, 409, 425, 429) are not kept,
+so retrying them runs the request again. Requests without the header are
+not affected.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+from database import database
+from metrics import registry
+
+HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+TRANSIENT_STATUSES = {408, 409, 425, 429}
+
+idempotency_requests = registry.counter(
+    "nebula_idempotency_requests_total", "POST requests carrying an Idempotency-Key by outcome", ("outcome",)
+)
+
+
+class StoredResponse(NamedTuple):
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+    @classmethod
+    def from_record(cls, record: Dict) -> "StoredResponse":
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in record["headers"]]
+        return cls(record["status"], headers, bytes(record["body"]))
+
+    def storable(self) -> bool:
+        return 200 <= self.status < 500 and self.status not in TRANSIENT_STATUSES
+
+
+def _error(status: int, detail: str, headers: Optional[List[Tuple[bytes, bytes]]] = None) -> StoredResponse:
+    body = json.dumps({"detail": detail}).encode()
+    return StoredResponse(
+        status,
+        [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *(headers or [])],
+        body
+    )
+
+
+class IdempotencyStore:
+    """Kept responses of this worker in front of the storage records shared by all workers"""
+
+    def __init__(self, ttl: float, lock: float, wait: float, max_size: int, poll: float = 0.05,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.lock = lock
+        self.wait = wait
+        self.max_size = max_size
+        self.poll = poll
+        self.clock = clock
+        # key -> (expires at, fingerprint, response)
+        self._responses: "OrderedDict[str, Tuple[float, str, StoredResponse]]" = OrderedDict()
+        self._inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    def _remember(self, key: str, fingerprint: str, response: StoredResponse):
+        self._responses[key] = (self.clock() + self.ttl, fingerprint, response)
+        self._responses.move_to_end(key)
+        while len(self._responses) > self.max_size:
+            self._responses.popitem(last=False)
+
+    def _recall(self, key: str) -> Optional[Tuple[str, StoredResponse]]:
+        entry = self._responses.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= self.clock():
+            del self._responses[key]
+            return None
+        return entry[1], entry[2]
+
+    async def run(self, key: str, fingerprint: str, execute: Callable[[], Awaitable[StoredResponse]]) -> Tuple[StoredResponse, str]:
+        """Answer a keyed request, returns the response and how it was answered"""
+        kept = self._recall(key)
+        if kept is not None:
+            if kept[0] != fingerprint:
+                return _mismatch(), "mismatch"
+            return kept[1], "replayed"
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            if inflight[0] != fingerprint:
+                return _mismatch(), "mismatch"
+            # Shielded so a duplicate going away does not cancel the first attempt
+            return await asyncio.shield(inflight[1]), "joined"
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (fingerprint, future)
+        try:
+            response, outcome = await self._claim_and_execute(key, fingerprint, execute)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Joined duplicates see the error; nobody may be waiting to retrieve it
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+        future.set_result(response)
+        return response, outcome
+
+    async def _claim_and_execute(self, key: str, fingerprint: str,
+                                 execute: Callable[[], Awaitable[StoredResponse]]) -> Tuple[StoredResponse, str]:
+        storage = database.storage
+        deadline = self.clock() + self.wait
+        while True:
+            now = datetime.utcnow()
+            record = await storage.claim_idempotency_key(
+                key, fingerprint, now, now + timedelta(seconds=self.lock), now + timedelta(seconds=self.ttl)
+            )
+            if record is None:
+                break
+            if record["fingerprint"] != fingerprint:
+                return _mismatch(), "mismatch"
+            if record["status"] is not None:
+                response = StoredResponse.from_record(record)
+                self._remember(key, fingerprint, response)
+                return response, "replayed"
+            if self.clock() >= deadline:
+                return _error(409, "A request with this Idempotency-Key is in progress", [(b"retry-after", b"1")]), "conflict"
+            await asyncio.sleep(self.poll)
+
+        try:
+            response = await execute()
+        except BaseException:
+            await storage.release_idempotency_key(key)
+            raise
+        if response.storable():
+            headers = [[name.decode("latin-1"), value.decode("latin-1")] for name, value in response.headers]
+            expires_at = datetime.utcnow() + timedelta(seconds=self.ttl)
+            await storage.complete_idempotency_key(key, response.status, headers, response.body, expires_at)
+            self._remember(key, fingerprint, response)
+        else:
+            await storage.release_idempotency_key(key)
+        return response, "executed"
+
+
+def _mismatch() -> StoredResponse:
+    return _error(422, "Idempotency-Key was already used with a different request")
+
+
+store = IdempotencyStore(
+    int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '86400')),
+    int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', '30')),
+    int(os.environ.get('IDEMPOTENCY_WAIT_MS', '10000')) / 1000,
+    int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '10000'))
+)
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware answering repeated POSTs that carry an Idempotency-Key"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        key = next((value for name, value in scope["headers"] if name == HEADER), None)
+        if key is None:
+            return await self.app(scope, receive, send)
+
+        if not key or len(key) > MAX_KEY_LENGTH:
+            idempotency_requests.labels("invalid").inc()
+            return await _send(send, _error(400, f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"))
+
+        body, receive = await _buffer_body(receive)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        response, outcome = await store.run(
+            f"{scope['path']} {key.decode('latin-1')}", fingerprint, lambda: self._execute(scope, receive)
+        )
+        idempotency_requests.labels(outcome).inc()
+        replayed = [(b"idempotent-replayed", b"true")] if outcome in ("replayed", "joined") else []
+        await _send(send, response, replayed)
+
+    async def _execute(self, scope, receive) -> StoredResponse:
+        status = 500
+        headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+
+        async def capture(message):
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        return StoredResponse(status, headers, b"".join(chunks))
+
+
+async def _buffer_body(receive) -> Tuple[bytes, Callable]:
+    # Read the whole body for the fingerprint, then hand it to the app as one message
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    body = b"".join(chunks)
+    delivered = False
+
+    async def replay():
+        nonlocal delivered
+        if delivered:
+            return await receive()
+        delivered = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return body, replay
+
+
+async def _send(send, response: StoredResponse, extra_headers: Optional[List[Tuple[bytes, bytes]]] = None):
+    await send({"type": "http.response.start", "status": response.status, "headers": response.headers + (extra_headers or [])})
+    await send({"type": "http.response.body", "body": response.body})
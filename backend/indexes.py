@@ -0,0 +1,110 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Indexes every collection needs, declared once and built idempotently
+INDEXES: Dict[str, List[IndexModel]] = {
+    "player_progress": [
+        IndexModel([("playerId", ASCENDING)], name="playerId_unique", unique=True, background=True),
+    ],
+    "player_achievements": [
+        IndexModel([("playerId", ASCENDING)], name="playerId_unique", unique=True, background=True),
+    ],
+    "level_stats": [
+        IndexModel([("levelId", ASCENDING)], name="levelId_unique", unique=True, background=True),
+    ],
+    "leaderboard_windows": [
+        IndexModel([("window", ASCENDING), ("playerId", ASCENDING)], name="window_playerId_unique", unique=True, background=True),
+        IndexModel([("expiresAt", ASCENDING)], name="expiresAt_ttl", expireAfterSeconds=0, background=True),
+    ],
+    "idempotency_keys": [
+        IndexModel([("expiresAt", ASCENDING)], name="expiresAt_ttl", expireAfterSeconds=0, background=True),
+    ],
+    "infinite_scores": [
+        IndexModel([("score", DESCENDING), ("timestamp", ASCENDING)], name="score_desc_timestamp", background=True),
+        IndexModel([("playerId", ASCENDING), ("score", DESCENDING)], name="playerId_score_desc", background=True),
+        IndexModel([("score", DESCENDING), ("id", ASCENDING)], name="score_desc_id", background=True),
+        IndexModel([("timestamp", ASCENDING), ("id", ASCENDING)], name="timestamp_id", background=True),
+    ],
+    "infinite_score_days": [
+        IndexModel([("day", ASCENDING), ("playerId", ASCENDING)], name="day_playerId_unique", unique=True, background=True),
+    ],
+}
+
+# Representative query shape of each hot Database method: (collection, filter, sort)
+HOT_QUERIES: Dict[str, Tuple[str, Dict[str, Any], List[Tuple[str, int]]]] = {
+    "get_player_progress": ("player_progress", {"playerId": ""}, []),
+    "complete_level": ("player_progress", {"playerId": ""}, []),
+    "get_player_achievements": ("player_achievements", {"playerId": ""}, []),
+    "record_achievement_stats": ("player_achievements", {"playerId": ""}, []),
+    "level_stats": ("level_stats", {"levelId": 0}, []),
+    "load_window_leaderboard": ("leaderboard_windows", {"window": ""}, []),
+    "load_leaderboard": ("infinite_scores", {}, [("score", DESCENDING), ("timestamp", ASCENDING)]),
+    "player_best_score": ("infinite_scores", {"playerId": ""}, [("score", DESCENDING)]),
+    "export_scores": ("infinite_scores", {"score": {"$lte": 0}}, [("score", DESCENDING), ("id", ASCENDING)]),
+    "next_score_time": ("infinite_scores", {"timestamp": {"$gte": datetime(1970, 1, 1)}}, [("timestamp", ASCENDING)]),
+    "runs_page": ("infinite_scores", {"timestamp": {"$gte": datetime(1970, 1, 1)}}, [("timestamp", ASCENDING), ("id", ASCENDING)]),
+}
+
+
+class SchemaError(RuntimeError):
+    """Raised when required indexes are missing in strict mode"""
+
+
+async def ensure_indexes(database) -> List[str]:
+    """Create the declared indexes, returns the collections that failed"""
+    failed = []
+    for collection, indexes in INDEXES.items():
+        try:
+            names = await database[collection].create_indexes(indexes)
+            logger.info("Indexes ready on %s: %s", collection, ", ".join(names))
+        except OperationFailure as e:
+            # Duplicate playerIds or an existing index with other options
+            failed.append(collection)
+            logger.error("Could not build indexes on %s: %s", collection, e)
+    return failed
+
+
+def _has_collscan(plan: Any) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_has_collscan(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(value) for value in plan)
+    return False
+
+
+async def check_query_plans(database) -> List[str]:
+    """Explain each hot query, returns the ones that fall back to a COLLSCAN"""
+    collscans = []
+    for name, (collection, query, sort) in HOT_QUERIES.items():
+        cursor = database[collection].find(query).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = await cursor.explain()
+        if _has_collscan(plan.get("queryPlanner", {}).get("winningPlan")):
+            collscans.append(name)
+            logger.warning("Query %s on %s uses a COLLSCAN", name, collection)
+    return collscans
+
+
+async def ensure_schema(database, mode: str = "warn"):
+    """Build indexes and verify query plans.
+
+    `mode` is "off" to skip, "warn" to log problems, or "strict" to raise
+    SchemaError so the server refuses to start.
+    """
+    if mode == "off":
+        return
+
+    failed = await ensure_indexes(database)
+    collscans = await check_query_plans(database)
+    if mode == "strict" and (failed or collscans):
+        raise SchemaError(
+            f"Index build failed on {failed or 'none'}, COLLSCAN in {collscans or 'none'}"
+        )
@@ -0,0 +1,154 @@
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from models import InfiniteScore, RankedScore
+
+# Sort key: highest score first, earliest run wins ties, player id keeps keys unique
+LeaderboardKey = Tuple[int, float, str]
+
+
+def _key(score: InfiniteScore) -> LeaderboardKey:
+    return (-score.score, score.timestamp.timestamp(), score.playerId)
+
+
+class Leaderboard:
+    """Best infinite mode score per player, kept in rank order.
+
+    A sorted array of keys gives O(log n) rank lookups and O(k) paged reads,
+    while the dict maps each player to their current best run.
+    """
+
+    def __init__(self):
+        self._keys: List[LeaderboardKey] = []
+        self._entries: Dict[str, Tuple[LeaderboardKey, InfiniteScore]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, player_id: str) -> bool:
+        return player_id in self._entries
+
+    def load(self, scores: Iterable[InfiniteScore]):
+        """Replace the contents with the best run of each player"""
+        entries: Dict[str, Tuple[LeaderboardKey, InfiniteScore]] = {}
+        for score in scores:
+            current = entries.get(score.playerId)
+            key = _key(score)
+            if current is None or key < current[0]:
+                entries[score.playerId] = (key, score)
+
+        self._entries = entries
+        self._keys = sorted(key for key, _ in entries.values())
+
+    def submit(self, score: InfiniteScore) -> bool:
+        """Record a run, returns True if it became the player's best"""
+        key = _key(score)
+        current = self._entries.get(score.playerId)
+        if current is not None:
+            if current[0] <= key:
+                return False
+            del self._keys[bisect_left(self._keys, current[0])]
+
+        insort(self._keys, key)
+        self._entries[score.playerId] = (key, score)
+        return True
+
+    def remove(self, player_id: str) -> bool:
+        """Drop a player from the leaderboard"""
+        current = self._entries.pop(player_id, None)
+        if current is None:
+            return False
+        del self._keys[bisect_left(self._keys, current[0])]
+        return True
+
+    def get(self, player_id: str) -> Optional[InfiniteScore]:
+        """Get a player's best run"""
+        current = self._entries.get(player_id)
+        return current[1] if current else None
+
+    def rank(self, player_id: str) -> Optional[int]:
+        """Get a player's 1-based rank"""
+        current = self._entries.get(player_id)
+        if current is None:
+            return None
+        return bisect_left(self._keys, current[0]) + 1
+
+    def top(self, limit: int = 100, offset: int = 0) -> List[InfiniteScore]:
+        """Get a page of best runs in rank order"""
+        return [self._entries[key[2]][1] for key in self._keys[offset:offset + limit]]
+
+    def ranked(self, start: int, stop: int) -> List[RankedScore]:
+        """Get ranked entries for the 0-based index range [start, stop)"""
+        start = max(start, 0)
+        return [
+            RankedScore(rank=start + i + 1, **self._entries[key[2]][1].dict())
+            for i, key in enumerate(self._keys[start:stop])
+        ]
+
+
+# Calendar windows in UTC; weeks start on Monday
+WINDOWS: Dict[str, timedelta] = {"day": timedelta(days=1), "week": timedelta(weeks=1)}
+
+
+def window_bounds(window: str, at: datetime) -> Tuple[datetime, datetime]:
+    """Get the [start, end) of the window that contains `at`"""
+    start = at.replace(hour=0, minute=0, second=0, microsecond=0)
+    if window == "week":
+        start -= timedelta(days=start.weekday())
+    return start, start + WINDOWS[window]
+
+
+def window_id(window: str, start: datetime) -> str:
+    return f"{window}:{start.date().isoformat()}"
+
+
+class WindowedLeaderboard:
+    """Leaderboard of the current day or week.
+
+    Runs from earlier windows are ignored, and the board starts over empty
+    when the clock passes the end of its window, so reads never filter by
+    date.
+    """
+
+    def __init__(self, window: str, clock: Callable[[], datetime] = datetime.utcnow):
+        self.window = window
+        self.clock = clock
+        self.start, self.end = window_bounds(window, clock())
+        self.board = Leaderboard()
+
+    @property
+    def id(self) -> str:
+        return window_id(self.window, self.start)
+
+    def current(self) -> Leaderboard:
+        """Get the board of the window that contains now, rolling over if needed"""
+        now = self.clock()
+        if now >= self.end:
+            self.start, self.end = window_bounds(self.window, now)
+            self.board = Leaderboard()
+        return self.board
+
+    def submit(self, score: InfiniteScore) -> bool:
+        """Record a run of the current window, returns True if it became the player's best"""
+        board = self.current()
+        if not self.start <= score.timestamp < self.end:
+            return False
+        return board.submit(score)
+
+    def entries(self, scores: Iterable[InfiniteScore]) -> List[Dict[str, Any]]:
+        """Stored window entries for the best run per player among `scores`.
+
+        Entries expire one window length after their window ends.
+        """
+        best: Dict[Tuple[str, str], Tuple[LeaderboardKey, InfiniteScore, datetime]] = {}
+        for score in scores:
+            start, end = window_bounds(self.window, score.timestamp)
+            bucket = (window_id(self.window, start), score.playerId)
+            key = _key(score)
+            if bucket not in best or key < best[bucket][0]:
+                best[bucket] = (key, score, end + WINDOWS[self.window])
+        return [
+            {**score.dict(), "window": bucket[0], "expiresAt": expires_at}
+            for bucket, (_, score, expires_at) in best.items()
+        ]
@@ -0,0 +1,109 @@
+"""Pre-aggregated per-level statistics.
+
+Each level has one small counters document, changed only by increments:
+
+- attempts / completions: finished runs, and the ones that cleared the level
+- stars: histogram of completions by star count, keyed "1".."3"
+- scores: histogram of completion scores in SCORE_BUCKET_SIZE wide buckets,
+  keyed by bucket index; the last bucket is open-ended
+
+Percentiles are interpolated within buckets, so they are approximate to
+within one bucket width.
+"""
+from typing import Any, Dict, Optional
+
+from models import LevelStats, PlayerProgress
+from progress_format import MAX_STARS
+
+SCORE_BUCKET_SIZE = 2500
+SCORE_BUCKETS = 64
+PERCENTILES = (25, 50, 75, 90, 99)
+
+
+def score_bucket(score: int) -> int:
+    return max(0, min(score // SCORE_BUCKET_SIZE, SCORE_BUCKETS - 1))
+
+
+def attempt_increments() -> Dict[str, int]:
+    """Counter increments for a run that did not clear the level"""
+    return {"attempts": 1}
+
+
+def completion_increments(score: int, stars: int) -> Dict[str, int]:
+    """Counter increments for a completed run"""
+    return {
+        "attempts": 1,
+        "completions": 1,
+        f"stars.{max(0, min(stars, MAX_STARS))}": 1,
+        f"scores.{score_bucket(score)}": 1
+    }
+
+
+def merge_increments(total: Dict[str, int], increments: Dict[str, int]):
+    """Add counter increments into `total` in place"""
+    for field, value in increments.items():
+        total[field] = total.get(field, 0) + value
+
+
+def apply_increments(stats_data: Dict[str, Any], increments: Dict[str, int]):
+    """Apply dotted-path counter increments to a stats document in place"""
+    for field, value in increments.items():
+        document = stats_data
+        *parents, key = field.split(".")
+        for parent in parents:
+            document = document.setdefault(parent, {})
+        document[key] = document.get(key, 0) + value
+
+
+def counter_fields(stats_data: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """Flatten a stored counters document into dotted-path counters, the inverse of apply_increments"""
+    fields = {}
+    for key, value in (stats_data or {}).items():
+        if isinstance(value, dict):
+            fields.update((f"{key}.{field}", count) for field, count in counter_fields(value).items())
+        elif key != "levelId" and isinstance(value, int):
+            fields[key] = value
+    return fields
+
+
+def count_progress(totals: Dict[int, Dict[str, int]], progress: PlayerProgress):
+    """Add one player's completed levels to per-level backfill totals.
+
+    Progress only keeps each player's best run, so every completed level
+    counts as one attempt and one completion with the player's best score.
+    """
+    for level in progress.levels:
+        if level.completed:
+            merge_increments(totals.setdefault(level.id, {}), completion_increments(level.bestScore, level.stars))
+
+
+def _percentile(buckets: list, total: int, percentile: int) -> int:
+    rank = total * percentile / 100
+    seen = 0
+    for index, count in enumerate(buckets):
+        if count and seen + count >= rank:
+            return int((index + (rank - seen) / count) * SCORE_BUCKET_SIZE)
+        seen += count
+    return len(buckets) * SCORE_BUCKET_SIZE
+
+
+def build_level_stats(level_id: int, stats_data: Optional[Dict[str, Any]]) -> LevelStats:
+    """Expand a stored counters document into LevelStats"""
+    stats_data = stats_data or {}
+    attempts = stats_data.get("attempts", 0)
+    completions = stats_data.get("completions", 0)
+    stars = stats_data.get("stars") or {}
+    scores = stats_data.get("scores") or {}
+    buckets = [scores.get(str(index), 0) for index in range(SCORE_BUCKETS)]
+    scored = sum(buckets)
+
+    return LevelStats(
+        levelId=level_id,
+        attempts=attempts,
+        completions=completions,
+        completionRate=completions / attempts if attempts else 0.0,
+        stars=[stars.get(str(count), 0) for count in range(MAX_STARS + 1)],
+        scoreBucketSize=SCORE_BUCKET_SIZE,
+        scoreBuckets=buckets,
+        scorePercentiles={f"p{p}": _percentile(buckets, scored, p) for p in PERCENTILES} if scored else {}
+    )
@@ -0,0 +1,148 @@
+"""Maintenance commands for the Nebula backend.
+
+Usage: python manage.py <command> [options]
+"""
+from dotenv import load_dotenv
+from pathlib import Path
+import argparse
+import asyncio
+import logging
+import sys
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+from achievement_backfill import Checkpoint, backfill_achievements
+from database import database
+from export import export_progress, export_scores
+from score_compaction import compact_scores
+
+logger = logging.getLogger("manage")
+
+
+async def migrate_progress(args):
+    """Convert legacy progress documents to the compact format"""
+    migrated = await database.migrate_progress_documents(args.batch_size)
+    logger.info("Migrated %d progress documents", migrated)
+
+
+async def ensure_indexes(args):
+    """Build the declared indexes and check hot query plans"""
+    await database.storage.ensure_schema("strict" if args.strict else "warn")
+
+
+async def backfill_level_stats(args):
+    """Rebuild per-level statistics from existing player progress"""
+    scanned = await database.backfill_level_stats(args.batch_size)
+    logger.info("Backfilled level stats from %d progress documents", scanned)
+
+
+async def backfill_achievements_command(args):
+    """Re-evaluate every player's achievements against the current rules"""
+    result = await backfill_achievements(
+        database.storage, Checkpoint(args.checkpoint), args.batch_size, args.concurrency, args.rate, args.restart
+    )
+    logger.info("Scanned %d players, changed achievements of %d", result["scanned"], result["changed"])
+
+
+async def prune_untouched_players(args):
+    """Delete player documents that still hold nothing but defaults"""
+    before = await database.storage.collection_stats()
+    deleted = await database.prune_untouched_players(args.batch_size)
+    after = await database.storage.collection_stats()
+    for collection, count in deleted.items():
+        logger.info("%s: deleted %d, before %s, after %s", collection, count, before[collection], after[collection])
+
+
+async def compact_scores_command(args):
+    """Roll old infinite mode runs into daily summaries, keeping personal bests"""
+    result = await compact_scores(database.storage, args.history_days, args.batch_size, args.rate)
+    logger.info("Compacted %d days of %d players, deleted %d runs", result["days"], result["players"], result["deleted"])
+
+
+async def write_export(chunks, output: str) -> int:
+    stream = sys.stdout.buffer if output == "-" else open(output, "wb")
+    written = 0
+    try:
+        async for chunk in chunks:
+            stream.write(chunk)
+            written += chunk.count(b"\n")
+    finally:
+        if stream is not sys.stdout.buffer:
+            stream.close()
+    return written
+
+
+async def export_scores_command(args):
+    """Export every infinite score run as NDJSON"""
+    written = await write_export(export_scores(database.storage, args.batch_size), args.output)
+    logger.info("Exported %d scores", written)
+
+
+async def export_progress_command(args):
+    """Export every player progress document as NDJSON"""
+    written = await write_export(export_progress(database.storage, args.batch_size), args.output)
+    logger.info("Exported %d progress documents", written)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Nebula backend maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("migrate-progress", help=migrate_progress.__doc__)
+    command.add_argument("--batch-size", type=int, default=1000)
+    command.set_defaults(handler=migrate_progress)
+
+    command = commands.add_parser("ensure-indexes", help=ensure_indexes.__doc__)
+    command.add_argument("--strict", action="store_true", help="exit with an error on missing indexes or COLLSCANs")
+    command.set_defaults(handler=ensure_indexes)
+
+    command = commands.add_parser("backfill-level-stats", help=backfill_level_stats.__doc__)
+    command.add_argument("--batch-size", type=int, default=1000)
+    command.set_defaults(handler=backfill_level_stats)
+
+    command = commands.add_parser("backfill-achievements", help=backfill_achievements_command.__doc__)
+    command.add_argument("--batch-size", type=int, default=500)
+    command.add_argument("--concurrency", type=int, default=4, help="grouped writes in flight")
+    command.add_argument("--rate", type=float, default=0, help="players per second, 0 for unlimited")
+    command.add_argument("--checkpoint", default="achievements-backfill.json", help="file to resume from")
+    command.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    command.set_defaults(handler=backfill_achievements_command)
+
+    command = commands.add_parser("prune-untouched-players", help=prune_untouched_players.__doc__)
+    command.add_argument("--batch-size", type=int, default=1000)
+    command.set_defaults(handler=prune_untouched_players)
+
+    command = commands.add_parser("compact-scores", help=compact_scores_command.__doc__)
+    command.add_argument("--history-days", type=int, default=30, help="days of runs kept in full")
+    command.add_argument("--batch-size", type=int, default=500, help="players per delete batch")
+    command.add_argument("--rate", type=float, default=0, help="players per second, 0 for unlimited")
+    command.set_defaults(handler=compact_scores_command)
+
+    for name, handler in (("export-scores", export_scores_command), ("export-progress", export_progress_command)):
+        command = commands.add_parser(name, help=handler.__doc__)
+        command.add_argument("--batch-size", type=int, default=1000)
+        command.add_argument("--output", default="-", help="file to write, - for stdout")
+        command.set_defaults(handler=handler)
+
+    return parser
+
+
+async def run(args):
+    await database.connect(serve=False)
+    try:
+        await args.handler(args)
+    finally:
+        await database.close()
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(run(build_parser().parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""Process metrics in the Prometheus text format.
+
+Counters, gauges and histograms are kept in-process and rendered on
+scrape. Request latency comes from `MetricsMiddleware`, Mongo command
+timing from `MongoCommandListener`, and point-in-time values such as
+cache and queue counters from collectors called at scrape time.
+Percentiles come from the histograms, e.g.
+histogram_quantile(0.99, rate(nebula_http_request_duration_seconds_bucket[5m])).
+"""
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import Counter as StackCounter, OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import sys
+import threading
+import time
+
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# A collected sample: (name, labels, value)
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        key + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(ABC):
+    """A metric family with optional labels; children are created on first use"""
+
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._child())
+        return child
+
+    @abstractmethod
+    def _child(self):
+        """Create the child for one set of label values"""
+
+    @abstractmethod
+    def samples(self) -> Iterable[Sample]:
+        """Current samples of every child"""
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def samples(self) -> Iterable[Sample]:
+        for values, child in list(self._children.items()):
+            yield self.name, dict(zip(self.label_names, values)), child.value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _child(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self) -> Iterable[Sample]:
+        for values, child in list(self._children.items()):
+            labels = dict(zip(self.label_names, values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, child.sum
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.collectors: List[Callable[[], Iterable[Tuple[str, str, str, Iterable[Tuple[Dict[str, str], float]]]]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def collector(self, collect: Callable):
+        """Register a scrape-time callback yielding (name, type, help, [(labels, value), ...])"""
+        self.collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for name, labels, value in metric.samples())
+        for collect in self.collectors:
+            for name, kind, help, samples in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter("nebula_http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+http_duration = registry.histogram("nebula_http_request_duration_seconds", "HTTP request latency by route", ("method", "route"))
+http_in_flight = registry.gauge("nebula_http_requests_in_flight", "HTTP requests being served")
+stage_duration = registry.histogram("nebula_stage_duration_seconds", "Time spent in named request stages", ("stage",))
+mongo_duration = registry.histogram("nebula_mongo_command_duration_seconds", "Mongo command latency", ("collection", "command"))
+mongo_failures = registry.counter("nebula_mongo_command_failures_total", "Failed Mongo commands", ("collection", "command"))
+
+
+@contextmanager
+def timed(stage: str):
+    """Record the duration of a block under `stage`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_duration.labels(stage).observe(time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests and timing them per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight = http_in_flight.labels()
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_flight.dec()
+            # FastAPI stores the matched route in the scope; unmatched paths share one label
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            http_duration.labels(method, path).observe(elapsed)
+            http_requests.labels(method, path, str(status)).inc()
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every Mongo command by collection and command name.
+
+    The collection is only in the started event, so it is held until the
+    command finishes. A command whose connection closes mid-flight never
+    finishes, so at most `max_pending` are held and the oldest are dropped.
+    """
+
+    def __init__(self, max_pending: int = 10000):
+        self.max_pending = max_pending
+        self._collections: "OrderedDict[Tuple[object, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        command = event.command
+        collection = command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = command.get("collection")
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else ""
+            while len(self._collections) > self.max_pending:
+                self._collections.popitem(last=False)
+
+    def _collection(self, event) -> str:
+        with self._lock:
+            return self._collections.pop((event.connection_id, event.request_id), "")
+
+    def succeeded(self, event):
+        mongo_duration.labels(self._collection(event), event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._collection(event)
+        mongo_duration.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+        mongo_failures.labels(collection, event.command_name).inc()
+
+
+mongo_listener = MongoCommandListener()
+
+
+class SamplingProfiler:
+    """Statistical profiler for the event loop thread.
+
+    A daemon thread samples the target thread's stack every `interval`
+    seconds and counts collapsed stacks, which flamegraph tools read
+    directly. Only one thread is sampled, so the cost while running is
+    one stack walk per interval.
+    """
+
+    def __init__(self, max_stacks: int = 10000):
+        self.max_stacks = max_stacks
+        self.interval = 0.005
+        self.samples = 0
+        self.stacks: StackCounter = StackCounter()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._target: Optional[int] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, interval: float = 0.005, thread_id: Optional[int] = None):
+        """Start sampling a thread, the calling one by default"""
+        if self.running:
+            return
+        self.interval = interval
+        self._target = thread_id or threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def reset(self):
+        self.samples = 0
+        self.stacks.clear()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            if key in self.stacks or len(self.stacks) < self.max_stacks:
+                self.stacks[key] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Sampled stacks in the collapsed format, most frequent first"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+profiler = SamplingProfiler()
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal, Union
+from typing_extensions import Annotated
 from datetime import datetime
 import uuid
 
@@ -14,6 +15,16 @@ class Level(BaseModel):
     powerUps: List[str]
     background: str
 
+class LevelStats(BaseModel):
+    levelId: int
+    attempts: int = 0
+    completions: int = 0
+    completionRate: float = 0.0
+    stars: List[int] = []
+    scoreBucketSize: int
+    scoreBuckets: List[int] = []
+    scorePercentiles: Dict[str, int] = {}
+
 class LevelProgress(BaseModel):
     id: int
     unlocked: bool = False
@@ -40,6 +51,19 @@ class InfiniteScore(BaseModel):
     wave: int
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
+LeaderboardWindow = Literal["day", "week", "all"]
+
+class RankedScore(InfiniteScore):
+    rank: int
+
+class PlayerRank(BaseModel):
+    playerId: str
+    rank: int
+    total: int
+    entry: RankedScore
+    above: List[RankedScore] = []
+    below: List[RankedScore] = []
+
 class Achievement(BaseModel):
     id: str
     name: str
@@ -53,20 +77,46 @@ class Achievement(BaseModel):
 class PlayerAchievements(BaseModel):
     playerId: str
     achievements: List[Achievement] = []
+    stats: Dict[str, int] = {}
     updatedAt: datetime = Field(default_factory=datetime.utcnow)
 
+class ScoreReplay(BaseModel):
+    seed: int = Field(..., ge=0, le=0xFFFFFFFF)
+    # Move log, see simulation.py for the encoding and MAX_REPLAY_MOVES
+    moves: List[int] = Field(..., max_length=20000)
+
 class LevelCompleteRequest(BaseModel):
     levelId: int
     score: int
     stars: int
     shots: int
+    # Only counted from a verified replay, see server.verify_level_completion
+    bubblesPopped: int = Field(0, ge=0)
+    replay: Optional[ScoreReplay] = None
 
 class InfiniteScoreRequest(BaseModel):
     score: int
     wave: int
+    # Only counted from a verified replay, see server.verify_infinite_score
+    bubblesPopped: int = Field(0, ge=0)
+    replay: Optional[ScoreReplay] = None
 
 class ProgressUpdateRequest(BaseModel):
     currentLevel: Optional[int] = None
     totalScore: Optional[int] = None
     totalStars: Optional[int] = None
-    levels: Optional[List[LevelProgress]] = None
\ No newline at end of file
+    levels: Optional[List[LevelProgress]] = None
+
+class SyncLevelComplete(LevelCompleteRequest):
+    type: Literal["level-complete"]
+
+class SyncInfiniteScore(InfiniteScoreRequest):
+    type: Literal["infinite-score"]
+
+class SyncRequest(BaseModel):
+    events: List[Annotated[Union[SyncLevelComplete, SyncInfiniteScore], Field(discriminator="type")]] = Field(..., max_length=500)
+
+class SyncResponse(BaseModel):
+    progress: PlayerProgress
+    unlocked: List[Achievement] = []
+    applied: int
@@ -0,0 +1,265 @@
+"""Compact persisted representation of PlayerProgress.
+
+Stored documents (schemaVersion 2) replace the 50 `levels` subdocuments with:
+
+- unlockedMask / completedMask: bit `n - 1` is set for level `n`
+- stars: one digit per level, "3120000..."
+- bestScores / lastPlayed: sparse maps keyed by level id, only for played levels
+
+The API keeps the PlayerProgress shape; documents are expanded into it by
+`decode_progress` and written back through `encode_progress`.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from models import PlayerProgress, LevelProgress
+
+LEVEL_COUNT = 50
+SCHEMA_VERSION = 2
+INITIAL_UNLOCKED_LEVELS = 3
+MAX_STARS = 3
+
+_LEVEL_KEYS = [(index, index + 1, str(index + 1)) for index in range(LEVEL_COUNT)]
+_PROGRESS_FIELDS = set(PlayerProgress.model_fields) - {"levels"}
+
+
+def _clamp_stars(stars: int) -> int:
+    return max(0, min(stars, MAX_STARS))
+
+
+def encode_progress(progress: PlayerProgress) -> Dict[str, Any]:
+    """Convert PlayerProgress into its stored document"""
+    unlocked_mask = 0
+    completed_mask = 0
+    stars = ["0"] * LEVEL_COUNT
+    best_scores = {}
+    last_played = {}
+    for level in progress.levels:
+        if not 1 <= level.id <= LEVEL_COUNT:
+            continue
+        bit = 1 << (level.id - 1)
+        if level.unlocked:
+            unlocked_mask |= bit
+        if level.completed:
+            completed_mask |= bit
+        stars[level.id - 1] = str(_clamp_stars(level.stars))
+        if level.bestScore:
+            best_scores[str(level.id)] = level.bestScore
+        if level.lastPlayed:
+            last_played[str(level.id)] = level.lastPlayed
+
+    return {
+        "playerId": progress.playerId,
+        "schemaVersion": SCHEMA_VERSION,
+        "currentLevel": progress.currentLevel,
+        "totalScore": progress.totalScore,
+        "totalStars": progress.totalStars,
+        "infiniteHighScore": progress.infiniteHighScore,
+        "infiniteHighWave": progress.infiniteHighWave,
+        "unlockedMask": unlocked_mask,
+        "completedMask": completed_mask,
+        "stars": "".join(stars),
+        "bestScores": best_scores,
+        "lastPlayed": last_played,
+        "createdAt": progress.createdAt,
+        "updatedAt": progress.updatedAt
+    }
+
+
+def decode_progress(progress_data: Dict[str, Any]) -> PlayerProgress:
+    """Expand a stored document, compact or legacy, into PlayerProgress"""
+    if "levels" in progress_data:
+        return PlayerProgress(**progress_data)
+
+    unlocked_mask = progress_data.get("unlockedMask") or 0
+    completed_mask = progress_data.get("completedMask") or 0
+    stars = (progress_data.get("stars") or "").ljust(LEVEL_COUNT, "0")
+    best_scores = progress_data.get("bestScores") or {}
+    last_played = progress_data.get("lastPlayed") or {}
+
+    levels = [
+        {
+            "id": level_id,
+            "unlocked": bool(unlocked_mask >> index & 1),
+            "completed": bool(completed_mask >> index & 1),
+            "stars": int(stars[index]),
+            "bestScore": best_scores.get(key, 0),
+            "lastPlayed": last_played.get(key)
+        }
+        for index, level_id, key in _LEVEL_KEYS
+    ]
+    fields = {k: v for k, v in progress_data.items() if k in _PROGRESS_FIELDS}
+    return PlayerProgress(**fields, levels=levels)
+
+
+def default_progress(player_id: str) -> PlayerProgress:
+    """Build new player progress with default values"""
+    levels = [
+        LevelProgress(id=i + 1, unlocked=i < INITIAL_UNLOCKED_LEVELS)
+        for i in range(LEVEL_COUNT)
+    ]
+    return PlayerProgress(playerId=player_id, levels=levels)
+
+
+# Fields of a stored document that still holds nothing but default progress
+UNTOUCHED_PROGRESS: Dict[str, Any] = {
+    "schemaVersion": SCHEMA_VERSION,
+    "currentLevel": 1,
+    "totalScore": 0,
+    "totalStars": 0,
+    "infiniteHighScore": 0,
+    "infiniteHighWave": 0,
+    "unlockedMask": (1 << INITIAL_UNLOCKED_LEVELS) - 1,
+    "completedMask": 0,
+    "stars": "0" * LEVEL_COUNT,
+    "bestScores": {},
+}
+
+
+def is_untouched_progress(progress_data: Dict[str, Any]) -> bool:
+    """Check whether a stored document reads the same as the defaults"""
+    return all(progress_data.get(field) == value for field, value in UNTOUCHED_PROGRESS.items())
+
+
+def _set_bit(field: str, bit: int) -> dict:
+    """Aggregation expression OR-ing a single bit into an integer field"""
+    value = 1 << bit
+    current = {"$ifNull": [field, 0]}
+    is_set = {"$eq": [{"$mod": [{"$floor": {"$divide": [current, value]}}, 2]}, 1]}
+    return {"$cond": [is_set, current, {"$toLong": {"$add": [current, value]}}]}
+
+
+_HAS_LEVELS = {"$eq": [{"$type": "$levels"}, "array"]}
+_LEVEL_IDS = {"$range": [1, LEVEL_COUNT + 1]}
+
+
+def _legacy_mask(flag: str) -> dict:
+    return {"$reduce": {
+        "input": "$levels",
+        "initialValue": 0,
+        "in": {"$add": ["$$value", {"$cond": [
+            {"$and": [f"$$this.{flag}", {"$gte": ["$$this.id", 1]}, {"$lte": ["$$this.id", LEVEL_COUNT]}]},
+            {"$toLong": {"$pow": [2, {"$subtract": ["$$this.id", 1]}]}},
+            0
+        ]}]}
+    }}
+
+
+def _legacy_sparse(field: str, keep: dict) -> dict:
+    return {"$arrayToObject": {"$map": {
+        "input": {"$filter": {"input": "$levels", "as": "level", "cond": keep}},
+        "as": "level",
+        "in": {"k": {"$toString": "$$level.id"}, "v": f"$$level.{field}"}
+    }}}
+
+
+# Update pipeline stages converting a legacy `levels` document in place.
+# Compact documents pass through unchanged, so every write can start with them.
+MIGRATION_STAGES: List[dict] = [
+    {"$set": {
+        "unlockedMask": {"$cond": [_HAS_LEVELS, _legacy_mask("unlocked"), "$unlockedMask"]},
+        "completedMask": {"$cond": [_HAS_LEVELS, _legacy_mask("completed"), "$completedMask"]},
+        "stars": {"$cond": [_HAS_LEVELS, {"$reduce": {
+            "input": _LEVEL_IDS,
+            "initialValue": "",
+            "in": {"$concat": ["$$value", {"$toString": {"$cond": [
+                {"$in": ["$$this", "$levels.id"]},
+                {"$max": [0, {"$min": [MAX_STARS, {"$arrayElemAt": ["$levels.stars", {"$indexOfArray": ["$levels.id", "$$this"]}]}]}]},
+                0
+            ]}}]}
+        }}, "$stars"]},
+        "bestScores": {"$cond": [_HAS_LEVELS, _legacy_sparse("bestScore", {"$gt": ["$$level.bestScore", 0]}), "$bestScores"]},
+        "lastPlayed": {"$cond": [_HAS_LEVELS, _legacy_sparse("lastPlayed", {"$ne": [{"$ifNull": ["$$level.lastPlayed", None]}, None]}), "$lastPlayed"]},
+        "schemaVersion": SCHEMA_VERSION
+    }},
+    {"$unset": "levels"}
+]
+
+
+def completion_stage(level_id: int, score: int, stars: int, played_at: datetime) -> Optional[dict]:
+    """Build the pipeline stage that records a level completion on a compact document.
+
+    The star gain has to be read from the stored stars before they are raised,
+    which operator updates cannot do in the same write, so this is a pipeline
+    stage. Out-of-range level ids give None.
+    """
+    if not 1 <= level_id <= LEVEL_COUNT:
+        return None
+
+    index = level_id - 1
+    key = str(level_id)
+    stars = _clamp_stars(stars)
+    previous_stars = {"$toInt": {"$substrCP": ["$stars", index, 1]}}
+
+    completion = {
+        "stars": {"$concat": [
+            {"$substrCP": ["$stars", 0, index]},
+            {"$toString": {"$max": [previous_stars, stars]}},
+            {"$substrCP": ["$stars", index + 1, LEVEL_COUNT]}
+        ]},
+        "totalStars": {"$add": ["$totalStars", {"$max": [0, {"$subtract": [stars, previous_stars]}]}]},
+        "completedMask": _set_bit("$completedMask", index),
+        f"bestScores.{key}": {"$max": [f"$bestScores.{key}", score]},
+        f"lastPlayed.{key}": played_at,
+        "totalScore": {"$add": ["$totalScore", score]},
+        "currentLevel": {"$max": ["$currentLevel", level_id + 1]},
+        "updatedAt": played_at
+    }
+    if level_id < LEVEL_COUNT:
+        completion["unlockedMask"] = _set_bit("$unlockedMask", index + 1)
+
+    return {"$set": completion}
+
+
+def complete_level_stages(level_id: int, score: int, stars: int, played_at: datetime) -> List[dict]:
+    """Build the update pipeline that records a level completion.
+
+    Out-of-range level ids only migrate the document.
+    """
+    stage = completion_stage(level_id, score, stars, played_at)
+    return MIGRATION_STAGES + ([stage] if stage else [])
+
+
+def infinite_high_stage(score: int, wave: int, played_at: datetime) -> dict:
+    """Build the pipeline stage that raises the infinite mode high score and wave"""
+    return {"$set": {
+        "infiniteHighScore": {"$max": [{"$ifNull": ["$infiniteHighScore", 0]}, score]},
+        "infiniteHighWave": {"$max": [{"$ifNull": ["$infiniteHighWave", 0]}, wave]},
+        "updatedAt": played_at
+    }}
+
+
+def apply_completion(progress_data: Dict[str, Any], level_id: int, score: int, stars: int, played_at: datetime):
+    """Record a level completion on a compact document in place.
+
+    Same semantics as `complete_level_stages`, for backends that update
+    documents in Python.
+    """
+    if not 1 <= level_id <= LEVEL_COUNT:
+        return
+
+    index = level_id - 1
+    key = str(level_id)
+    stars = _clamp_stars(stars)
+    digits = progress_data["stars"]
+    previous_stars = int(digits[index])
+    if stars > previous_stars:
+        progress_data["stars"] = digits[:index] + str(stars) + digits[index + 1:]
+        progress_data["totalStars"] += stars - previous_stars
+
+    progress_data["completedMask"] |= 1 << index
+    if level_id < LEVEL_COUNT:
+        progress_data["unlockedMask"] |= 1 << (index + 1)
+    best_scores = progress_data.setdefault("bestScores", {})
+    best_scores[key] = max(best_scores.get(key, score), score)
+    progress_data.setdefault("lastPlayed", {})[key] = played_at
+    progress_data["totalScore"] += score
+    progress_data["currentLevel"] = max(progress_data["currentLevel"], level_id + 1)
+    progress_data["updatedAt"] = played_at
+
+
+def apply_infinite_high(progress_data: Dict[str, Any], score: int, wave: int, played_at: datetime):
+    """Raise the infinite mode high score and wave of a document in place"""
+    progress_data["infiniteHighScore"] = max(progress_data.get("infiniteHighScore", 0), score)
+    progress_data["infiniteHighWave"] = max(progress_data.get("infiniteHighWave", 0), wave)
+    progress_data["updatedAt"] = played_at
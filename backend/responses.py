@@ -0,0 +1,38 @@
+"""orjson encoding of trusted response data.
+
+Models that come out of `Database` were already validated when they were
+built from stored documents. Routes return them in a `TrustedJSONResponse`,
+which dumps them by alias in JSON mode, as FastAPI would, but without
+validating them again through `response_model`. Aliases, serializers and
+excluded fields therefore apply as usual. The route keeps its
+`response_model` for the OpenAPI schema. Request bodies are validated as
+before.
+"""
+from typing import Any
+
+from fastapi import Response
+from pydantic import BaseModel
+import orjson
+
+
+def _default(value: Any):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", by_alias=True)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode models, dicts and lists of them as compact JSON"""
+    if isinstance(content, BaseModel):
+        # pydantic writes the JSON itself, without building a dict for orjson first
+        return content.model_dump_json(by_alias=True).encode()
+    return orjson.dumps(content, default=_default)
+
+
+class TrustedJSONResponse(Response):
+    """JSON response for content that needs no response_model validation"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,69 @@
+"""Retention of infinite mode runs.
+
+Every run is kept for `history_days` days. After that a day's runs are
+rolled into one summary per player and day (count, sum, best score, best
+wave) in infinite_score_days. Then every run of that day is deleted except
+those that equal the player's personal best. Ties on the best score are all
+kept, so the all-time leaderboard, which prefers the earliest best, loads
+the same entries as before. Window leaderboards and achievements never
+read old runs.
+
+Days are handled oldest first. Each day's runs are read `batch_size` at a
+time, and the players in each page have their runs of that day trimmed in
+one write, at most `rate` players per second. The job needs no checkpoint.
+A day is summarized once, from all of its runs, before any of them is
+deleted, and later passes keep the existing summaries. A rerun therefore
+finishes an interrupted day. It passes quickly over compacted days, which
+hold only personal bests.
+"""
+from datetime import datetime, time, timedelta
+from typing import Dict, Optional
+import logging
+
+from achievement_backfill import RateLimiter
+from storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+
+def retention_cutoff(now: datetime, history_days: int) -> datetime:
+    """Start of the oldest day whose runs are all kept"""
+    return datetime.combine((now - timedelta(days=history_days)).date(), time.min)
+
+
+async def compact_scores(storage: StorageBackend, history_days: int = 30, batch_size: int = 500, rate: float = 0.0,
+                         now: Optional[datetime] = None) -> Dict[str, int]:
+    """Summarize and trim runs older than the retention window; returns days, players and deleted runs"""
+    cutoff = retention_cutoff(now or datetime.utcnow(), history_days)
+    limiter = RateLimiter(rate)
+    totals = {"days": 0, "players": 0, "deleted": 0}
+
+    timestamp = await storage.next_score_time(None)
+    while timestamp is not None and timestamp < cutoff:
+        start = datetime.combine(timestamp.date(), time.min)
+        end = start + timedelta(days=1)
+        day = start.date().isoformat()
+        await storage.summarize_score_day(day, start, end)
+
+        players = deleted = 0
+        seen = set()
+        after = None
+        while True:
+            page = await storage.runs_page(start, end, after, batch_size)
+            # A player's whole day is trimmed at once, so later pages skip them
+            player_ids = sorted({run["playerId"] for run in page} - seen)
+            if player_ids:
+                await limiter.acquire(len(player_ids))
+                deleted += await storage.delete_compacted_runs(start, end, player_ids)
+                players += len(player_ids)
+                seen.update(player_ids)
+            if len(page) < batch_size:
+                break
+            after = (page[-1]["timestamp"], page[-1]["id"])
+
+        totals["days"] += 1
+        totals["players"] += players
+        totals["deleted"] += deleted
+        logger.info("Compacted %s: %d players, deleted %d runs", day, players, deleted)
+        timestamp = await storage.next_score_time(end)
+    return totals
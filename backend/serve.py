@@ -0,0 +1,212 @@
+"""Preforking server for the Nebula API.
+
+Usage: python serve.py [--workers N] [--host HOST] [--port PORT]
+
+The parent imports the app once, so the level catalog, achievement
+definitions, route tables and OpenAPI schema are built before forking and
+shared copy-on-write by the workers. It then binds the listening socket
+and forks the workers. Each worker runs the app's lifespan on that socket:
+it connects to storage, warms the connection pool, loads the leaderboards
+and passes the readiness check before it accepts a connection.
+
+Workers share a fresh BROADCAST_DIR, which carries cache invalidations and
+leaderboard submissions between them (see broadcast.py). A worker that
+exits is replaced; SIGTERM or SIGINT stops them all gracefully.
+
+The memory storage backend keeps its data per process, so it can only be
+served by one worker.
+"""
+from dotenv import load_dotenv
+from pathlib import Path
+import argparse
+import contextlib
+import gc
+import logging
+import os
+import select
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+import uvicorn
+
+logger = logging.getLogger("serve")
+
+# A worker that dies is replaced after this long, so a crashing worker does not spin
+RESPAWN_DELAY = 1.0
+
+
+class WorkerServer(uvicorn.Server):
+    """uvicorn server that tells the parent once its lifespan finished and it accepts connections"""
+
+    def __init__(self, config: uvicorn.Config, ready_fd: int):
+        super().__init__(config)
+        self.ready_fd = ready_fd
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets)
+        if self.started:
+            os.write(self.ready_fd, f"{os.getpid()}\n".encode())
+
+
+class Supervisor:
+    """Forks the workers and keeps their number up until asked to stop"""
+
+    def __init__(self, app, sock: socket.socket, workers: int, boot_timeout: float):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.boot_timeout = boot_timeout
+        self.children = {}
+        self.stopping = False
+        self.ready_read, self.ready_write = os.pipe()
+
+    def spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return
+        # Until uvicorn installs its own, signals end the worker rather than run the parent's handlers
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        code = 0
+        try:
+            os.close(self.ready_read)
+            gc.enable()
+            config = uvicorn.Config(self.app, lifespan="on", access_log=False, log_level="info")
+            server = WorkerServer(config, self.ready_write)
+            server.run(sockets=[self.sock])
+            # A failed lifespan startup returns without ever serving
+            code = 0 if server.started else 1
+        except BaseException:
+            logger.exception("Worker %d failed", os.getpid())
+            code = 1
+        # Skip the parent's atexit handlers and buffers, which belong to the parent
+        os._exit(code)
+
+    def stop(self, signum=None, frame=None):
+        self.stopping = True
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _ready_pids(self, timeout: float):
+        readable, _, _ = select.select([self.ready_read], [], [], timeout)
+        if not readable:
+            return []
+        return [int(pid) for pid in os.read(self.ready_read, 4096).split()]
+
+    def _reap(self):
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            self.children.pop(pid, None)
+            if not self.stopping:
+                logger.warning("Worker %d exited with status %d", pid, os.waitstatus_to_exitcode(status))
+            # A killed worker leaves its broadcast socket behind, which the others would keep sending to
+            if os.environ.get('BROADCAST_DIR'):
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(os.path.join(os.environ['BROADCAST_DIR'], f"{pid}.sock"))
+            yield pid
+
+    def boot(self) -> bool:
+        """Fork every worker and wait until all are ready, or one exits or the timeout passes"""
+        started = time.monotonic()
+        for _ in range(self.workers):
+            self.spawn()
+        ready = set()
+        deadline = started + self.boot_timeout
+        while len(ready) < self.workers:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self.stopping:
+                logger.error("%d of %d workers ready after %.1fs", len(ready), self.workers, time.monotonic() - started)
+                return False
+            ready.update(self._ready_pids(min(remaining, 0.5)))
+            if any(True for _ in self._reap()):
+                return False
+        logger.info("%d workers ready in %.2fs", self.workers, time.monotonic() - started)
+        return True
+
+    def supervise(self):
+        """Replace workers that exit until stopped, then wait for the rest"""
+        while self.children or not self.stopping:
+            for pid in self._ready_pids(0.5):
+                logger.info("Worker %d ready", pid)
+            for _ in self._reap():
+                if not self.stopping:
+                    time.sleep(RESPAWN_DELAY)
+                    self.spawn()
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        code = 0
+        if self.boot():
+            self.supervise()
+        else:
+            code = 1
+            self.stop()
+        while self.children:
+            pid, _ = os.wait()
+            self.children.pop(pid, None)
+        return code
+
+
+def bind(host: str, port: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Serve the Nebula API from preforked workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get('WEB_CONCURRENCY', '1')))
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--boot-timeout", type=float, default=60.0, help="seconds for every worker to become ready")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.workers > 1 and os.environ.get('STORAGE_BACKEND', 'mongo') == 'memory':
+        sys.exit("The memory storage backend cannot be shared by several workers")
+
+    broadcast_dir = None
+    if args.workers > 1 and not os.environ.get('BROADCAST_DIR'):
+        broadcast_dir = os.environ['BROADCAST_DIR'] = tempfile.mkdtemp(prefix="nebula-broadcast-")
+
+    # Objects created while importing live for the whole process; freezing them keeps the
+    # collector from writing to their pages, which would copy them into every worker
+    gc.disable()
+    from server import app
+    app.openapi()
+    gc.freeze()
+
+    sock = bind(args.host, args.port, args.backlog)
+    logger.info("Listening on %s:%d with %d workers", args.host, args.port, args.workers)
+    try:
+        code = Supervisor(app, sock, args.workers, args.boot_timeout).run()
+    finally:
+        sock.close()
+        if broadcast_dir:
+            shutil.rmtree(broadcast_dir, ignore_errors=True)
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,129 +1,139 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from pathlib import Path
+from contextlib import asynccontextmanager
+from datetime import datetime
+import asyncio
 import os
 import logging
 from typing import List, Optional
 
 from models import (
-    PlayerProgress, InfiniteScore, PlayerAchievements, Level,
-    LevelCompleteRequest, InfiniteScoreRequest, ProgressUpdateRequest
+    PlayerProgress, InfiniteScore, PlayerAchievements, Level, PlayerRank, LevelStats, LeaderboardWindow,
+    LevelCompleteRequest, InfiniteScoreRequest, ProgressUpdateRequest, SyncRequest, SyncResponse
 )
 from database import database
-from achievements import check_level_achievements, check_infinite_achievements, get_or_create_achievements
+from catalog import level_catalog, compiled_response
+from simulation import ReplayError, replay_verifier
+from waves import board_cache, daily_seed
+from export import export_progress, export_scores
+from metrics import MetricsMiddleware, profiler, registry, timed
+from coalesce import coalesce, coalescer_stats
+from responses import TrustedJSONResponse
+from admission import admission, admit
+from idempotency import IdempotencyMiddleware, store as idempotency_store
+from broadcast import broadcast
+from achievements import (
+    check_level_achievements, check_infinite_achievements, check_sync_achievements, get_achievements_or_default
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# Create the main app without a prefix
-app = FastAPI(title="Nebula Game API", version="1.0.0")
-
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Game levels data, compiled once and served as pre-serialized bytes
+level_catalog.load()
 
-# Game levels data
-GAME_LEVELS = [
-    # Beginner Levels (1-10)
-    {"id": 1, "theme": "Cosmic Dawn", "difficulty": "Easy", "maxShots": 50, "targetScore": 5000, "description": "Welcome to the cosmos! Learn the basics of elemental harmony.", "elements": ["fire", "water"], "powerUps": [], "background": "cosmic-dawn"},
-    {"id": 2, "theme": "Solar Winds", "difficulty": "Easy", "maxShots": 48, "targetScore": 6000, "description": "Harness the power of solar winds with earth and air elements.", "elements": ["earth", "air", "fire", "water"], "powerUps": [], "background": "solar-winds"},
-    {"id": 3, "theme": "Stellar Forge", "difficulty": "Easy", "maxShots": 45, "targetScore": 7500, "description": "The stellar forge creates new elements. Master light and dark.", "elements": ["fire", "water", "earth", "air", "light"], "powerUps": ["nova-bomb"], "background": "stellar-forge"},
-    {"id": 4, "theme": "Plasma Garden", "difficulty": "Easy", "maxShots": 43, "targetScore": 8500, "description": "Navigate through the beautiful plasma formations.", "elements": ["fire", "water", "earth", "air"], "powerUps": ["nova-bomb"], "background": "plasma-garden"},
-    {"id": 5, "theme": "Meteor Shower", "difficulty": "Easy", "maxShots": 40, "targetScore": 9500, "description": "Dodge cosmic debris while maintaining elemental balance.", "elements": ["fire", "water", "earth", "air", "light"], "powerUps": ["nova-bomb"], "background": "meteor-shower"},
-    {"id": 6, "theme": "Aurora Fields", "difficulty": "Easy", "maxShots": 38, "targetScore": 10500, "description": "Dance through the cosmic aurora with grace.", "elements": ["fire", "water", "earth", "air", "light"], "powerUps": ["nova-bomb", "chain-lightning"], "background": "aurora-fields"},
-    {"id": 7, "theme": "Nebula Heart", "difficulty": "Easy", "maxShots": 36, "targetScore": 11500, "description": "The heart of the nebula pulses with all elemental forces.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning"], "background": "nebula-heart"},
-    {"id": 8, "theme": "Comet Trail", "difficulty": "Easy", "maxShots": 35, "targetScore": 12500, "description": "Follow the comet's path through the void.", "elements": ["fire", "water", "earth", "air", "light"], "powerUps": ["nova-bomb", "chain-lightning"], "background": "comet-trail"},
-    {"id": 9, "theme": "Quantum Echo", "difficulty": "Easy", "maxShots": 33, "targetScore": 13500, "description": "Reality bends as quantum forces interfere.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning"], "background": "quantum-echo"},
-    {"id": 10, "theme": "Crystal Void", "difficulty": "Easy", "maxShots": 32, "targetScore": 14500, "description": "Navigate the crystalline structures of deep space.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning"], "background": "crystal-void"},
-    
-    # Intermediate Levels (11-25)
-    {"id": 11, "theme": "Solar Nexus", "difficulty": "Medium", "maxShots": 30, "targetScore": 15500, "description": "Where multiple solar systems converge.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze"], "background": "solar-nexus"},
-    {"id": 12, "theme": "Photon Storm", "difficulty": "Medium", "maxShots": 29, "targetScore": 16500, "description": "Survive the intense photon bombardment.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze"], "background": "photon-storm"},
-    {"id": 13, "theme": "Gravity Well", "difficulty": "Medium", "maxShots": 28, "targetScore": 17500, "description": "Escape the pull of a massive gravity well.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze"], "background": "gravity-well"},
-    {"id": 14, "theme": "Stardust Maze", "difficulty": "Medium", "maxShots": 27, "targetScore": 18500, "description": "Find your way through the cosmic maze.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze"], "background": "stardust-maze"},
-    {"id": 15, "theme": "Pulsar Rhythm", "difficulty": "Medium", "maxShots": 26, "targetScore": 19500, "description": "Match the rhythm of the spinning pulsar.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze"], "background": "pulsar-rhythm"},
-    {"id": 16, "theme": "Dark Matter", "difficulty": "Medium", "maxShots": 25, "targetScore": 20500, "description": "Confront the mysterious dark matter clouds.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze"], "background": "dark-matter"},
-    {"id": 17, "theme": "Wormhole Gate", "difficulty": "Medium", "maxShots": 24, "targetScore": 21500, "description": "Stabilize the wormhole for safe passage.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot"], "background": "wormhole-gate"},
-    {"id": 18, "theme": "Asteroid Belt", "difficulty": "Medium", "maxShots": 23, "targetScore": 22500, "description": "Navigate the treacherous asteroid field.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot"], "background": "asteroid-belt"},
-    {"id": 19, "theme": "Helios Flare", "difficulty": "Medium", "maxShots": 22, "targetScore": 23500, "description": "Withstand the intense solar flare.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot"], "background": "helios-flare"},
-    {"id": 20, "theme": "Void Rift", "difficulty": "Medium", "maxShots": 21, "targetScore": 24500, "description": "A dangerous rift in space-time challenges your mastery.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot"], "background": "void-rift"},
-    {"id": 21, "theme": "Gamma Burst", "difficulty": "Medium", "maxShots": 20, "targetScore": 25500, "description": "Survive the devastating gamma ray burst.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot"], "background": "gamma-burst"},
-    {"id": 22, "theme": "Quasar Echo", "difficulty": "Medium", "maxShots": 19, "targetScore": 26500, "description": "The quasar's energy reverberates through space.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot"], "background": "quasar-echo"},
-    {"id": 23, "theme": "Magnetosphere", "difficulty": "Medium", "maxShots": 18, "targetScore": 27500, "description": "Navigate the planet's magnetic field.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot"], "background": "magnetosphere"},
-    {"id": 24, "theme": "Solar Corona", "difficulty": "Medium", "maxShots": 17, "targetScore": 28500, "description": "Brave the star's blazing corona.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot"], "background": "solar-corona"},
-    {"id": 25, "theme": "Cosmic Web", "difficulty": "Medium", "maxShots": 16, "targetScore": 29500, "description": "Traverse the universe's largest structures.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot"], "background": "cosmic-web"},
-    
-    # Advanced Levels (26-40)
-    {"id": 26, "theme": "Binary Stars", "difficulty": "Hard", "maxShots": 15, "targetScore": 30500, "description": "Balance the forces of twin stars.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "binary-stars"},
-    {"id": 27, "theme": "Ion Tempest", "difficulty": "Hard", "maxShots": 14, "targetScore": 31500, "description": "Weather the chaotic ion storm.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "ion-tempest"},
-    {"id": 28, "theme": "Galactic Core", "difficulty": "Hard", "maxShots": 13, "targetScore": 32500, "description": "The galactic core tests your ultimate skills.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "galactic-core"},
-    {"id": 29, "theme": "Neutron Dance", "difficulty": "Hard", "maxShots": 12, "targetScore": 33500, "description": "Dance with the dense neutron star.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "neutron-dance"},
-    {"id": 30, "theme": "Plasma Vortex", "difficulty": "Hard", "maxShots": 11, "targetScore": 34500, "description": "Escape the swirling plasma vortex.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "plasma-vortex"},
-    {"id": 31, "theme": "Stellar Nursery", "difficulty": "Hard", "maxShots": 10, "targetScore": 35500, "description": "Witness the birth of new stars.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "stellar-nursery"},
-    {"id": 32, "theme": "Dimension Tear", "difficulty": "Hard", "maxShots": 9, "targetScore": 36500, "description": "Reality fractures at the dimension's edge.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "dimension-tear"},
-    {"id": 33, "theme": "Time Spiral", "difficulty": "Hard", "maxShots": 8, "targetScore": 37500, "description": "Navigate the twisted streams of time.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "time-spiral"},
-    {"id": 34, "theme": "Antimatter Zone", "difficulty": "Hard", "maxShots": 7, "targetScore": 38500, "description": "Survive the deadly antimatter field.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "antimatter-zone"},
-    {"id": 35, "theme": "Supernova", "difficulty": "Hard", "maxShots": 6, "targetScore": 39500, "description": "A dying star creates chaos in the elemental balance.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "supernova"},
-    {"id": 36, "theme": "Quantum Foam", "difficulty": "Hard", "maxShots": 5, "targetScore": 40500, "description": "Reality bubbles at the quantum level.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "quantum-foam"},
-    {"id": 37, "theme": "Cosmic String", "difficulty": "Hard", "maxShots": 4, "targetScore": 41500, "description": "Navigate the one-dimensional cosmic defect.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "cosmic-string"},
-    {"id": 38, "theme": "Event Horizon", "difficulty": "Hard", "maxShots": 3, "targetScore": 42500, "description": "Approach the point of no return.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "event-horizon"},
-    {"id": 39, "theme": "Vacuum Decay", "difficulty": "Hard", "maxShots": 2, "targetScore": 43500, "description": "The universe itself begins to unravel.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "vacuum-decay"},
-    {"id": 40, "theme": "Multiverse Gate", "difficulty": "Hard", "maxShots": 1, "targetScore": 44500, "description": "Gateway to infinite possibilities.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "multiverse-gate"},
-    
-    # Master Levels (41-50)
-    {"id": 41, "theme": "Alpha Genesis", "difficulty": "Expert", "maxShots": 25, "targetScore": 50000, "description": "Return to the beginning of everything.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "alpha-genesis"},
-    {"id": 42, "theme": "Omega Terminus", "difficulty": "Expert", "maxShots": 24, "targetScore": 52500, "description": "Witness the end of all things.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "omega-terminus"},
-    {"id": 43, "theme": "Eternal Cycle", "difficulty": "Expert", "maxShots": 23, "targetScore": 55000, "description": "The universe begins anew.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "eternal-cycle"},
-    {"id": 44, "theme": "Perfect Void", "difficulty": "Expert", "maxShots": 22, "targetScore": 57500, "description": "Absolute nothingness challenges everything.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "perfect-void"},
-    {"id": 45, "theme": "Infinite Loop", "difficulty": "Expert", "maxShots": 21, "targetScore": 60000, "description": "Trapped in an endless recursion.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "infinite-loop"},
-    {"id": 46, "theme": "Singularity Core", "difficulty": "Expert", "maxShots": 20, "targetScore": 62500, "description": "The heart of a black hole awaits.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "singularity-core"},
-    {"id": 47, "theme": "Reality Engine", "difficulty": "Expert", "maxShots": 19, "targetScore": 65000, "description": "The machine that creates universes.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "reality-engine"},
-    {"id": 48, "theme": "Consciousness Web", "difficulty": "Expert", "maxShots": 18, "targetScore": 67500, "description": "Where all minds connect as one.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "consciousness-web"},
-    {"id": 49, "theme": "Final Paradox", "difficulty": "Expert", "maxShots": 17, "targetScore": 70000, "description": "Logic itself becomes impossible.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "final-paradox"},
-    {"id": 50, "theme": "Transcendence", "difficulty": "Legendary", "maxShots": 15, "targetScore": 100000, "description": "Beyond mastery lies transcendence itself.", "elements": ["fire", "water", "earth", "air", "light", "dark"], "powerUps": ["nova-bomb", "chain-lightning", "time-freeze", "mirror-shot", "gravity-switch"], "background": "transcendence"}
-]
+async def verify_level_completion(level_data: LevelCompleteRequest):
+    """Check a level completion against its replay and take the popped bubble count from it, or zero it without one"""
+    if level_data.replay is None:
+        if replay_verifier.required:
+            raise HTTPException(status_code=422, detail="Score replay required")
+        # A lifetime counter would take any count the client sends, so only replays feed it
+        level_data.bubblesPopped = 0
+        return
+    level = level_catalog.level(level_data.levelId)
+    if not level:
+        raise HTTPException(status_code=404, detail="Level not found")
+    try:
+        with timed("replay"):
+            result = await replay_verifier.verify_level(
+                level.id, level.maxShots, level_data.score, level_data.stars,
+                level_data.replay.seed, level_data.replay.moves
+            )
+    except ReplayError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    level_data.bubblesPopped = result.bubblesPopped
+
+async def verify_infinite_score(score_data: InfiniteScoreRequest):
+    """Check an infinite mode score against its replay and take the popped bubble count from it, or zero it without one"""
+    if score_data.replay is None:
+        if replay_verifier.required:
+            raise HTTPException(status_code=422, detail="Score replay required")
+        # A lifetime counter would take any count the client sends, so only replays feed it
+        score_data.bubblesPopped = 0
+        return
+    try:
+        with timed("replay"):
+            result = await replay_verifier.verify_infinite(
+                score_data.score, score_data.wave, score_data.replay.seed, score_data.replay.moves
+            )
+    except ReplayError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    score_data.bubblesPopped = result.bubblesPopped
 
 @api_router.get("/")
 async def root():
     """Health check endpoint"""
     return {"message": "Nebula Game API is running", "version": "1.0.0"}
 
+@api_router.get("/ready")
+async def readiness_check():
+    """Readiness check: storage answers and in-process state is loaded.
+
+    Also reports the buffered score writer, whose dropped runs are still on
+    this worker's in-memory leaderboard but missing from storage.
+    """
+    if not database.ready or not await database.storage.ping():
+        raise HTTPException(status_code=503, detail="Not ready")
+    return {"ready": True, "pid": os.getpid(), "scoreWrites": database.score_writer.stats()}
+
 @api_router.get("/levels", response_model=List[Level])
-async def get_levels():
+async def get_levels(request: Request):
     """Get all game levels"""
-    return [Level(**level) for level in GAME_LEVELS]
+    return compiled_response(level_catalog.catalog(), request)
 
 @api_router.get("/levels/{level_id}", response_model=Level)
-async def get_level(level_id: int):
+async def get_level(level_id: int, request: Request):
     """Get specific level by ID"""
-    level_data = next((level for level in GAME_LEVELS if level["id"] == level_id), None)
-    if not level_data:
+    level = level_catalog.get(level_id)
+    if not level:
         raise HTTPException(status_code=404, detail="Level not found")
-    return Level(**level_data)
+    return compiled_response(level, request)
+
+@api_router.get("/levels/{level_id}/stats", response_model=LevelStats)
+@admit("level-stats")
+async def get_level_stats(level_id: int):
+    """Get completion rate, star distribution and score percentiles of a level"""
+    if not level_catalog.level(level_id):
+        raise HTTPException(status_code=404, detail="Level not found")
+    return TrustedJSONResponse(await database.get_level_stats(level_id))
+
+@api_router.post("/levels/{level_id}/attempts", status_code=204)
+@admit("level-attempt")
+async def record_level_attempt(level_id: int):
+    """Count a level run that ended without clearing it"""
+    if not level_catalog.level(level_id):
+        raise HTTPException(status_code=404, detail="Level not found")
+    await database.record_level_attempt(level_id)
 
 @api_router.get("/progress/{player_id}", response_model=PlayerProgress)
+@admit("progress")
 async def get_player_progress(player_id: str):
     """Get player progress"""
-    progress = await database.get_player_progress(player_id)
-    if not progress:
-        progress = await database.create_player_progress(player_id)
-    return progress
+    return TrustedJSONResponse(await database.get_progress_or_default(player_id))
 
 @api_router.post("/progress/{player_id}", response_model=PlayerProgress)
+@admit("update-progress")
 async def update_progress(player_id: str, update_data: ProgressUpdateRequest):
     """Update player progress"""
-    progress = await database.get_player_progress(player_id)
-    if not progress:
-        progress = await database.create_player_progress(player_id)
+    progress = await database.get_progress_or_default(player_id)
+    # Cached progress is shared, so update a copy
+    progress = progress.copy()
     
     # Update provided fields
     if update_data.currentLevel is not None:
@@ -135,11 +145,13 @@ async def update_progress(player_id: str, update_data: ProgressUpdateRequest):
     if update_data.levels is not None:
         progress.levels = update_data.levels
     
-    return await database.update_player_progress(player_id, progress)
+    return TrustedJSONResponse(await database.update_player_progress(player_id, progress))
 
 @api_router.post("/progress/{player_id}/complete-level", response_model=PlayerProgress)
+@admit("complete-level")
 async def complete_level(player_id: str, level_data: LevelCompleteRequest):
     """Complete a level and update progress"""
+    await verify_level_completion(level_data)
     progress = await database.complete_level(
         player_id, 
         level_data.levelId, 
@@ -153,48 +165,235 @@ async def complete_level(player_id: str, level_data: LevelCompleteRequest):
         "levelId": level_data.levelId,
         "score": level_data.score,
         "stars": level_data.stars,
-        "shots": level_data.shots
+        "shots": level_data.shots,
+        "bubblesPopped": level_data.bubblesPopped
     }
-    await check_level_achievements(player_id, progress, level_dict)
+    with timed("achievements"):
+        await check_level_achievements(player_id, progress, level_dict)
+    get_player_achievements.invalidate(player_id=player_id)
     
-    return progress
+    return TrustedJSONResponse(progress)
 
 @api_router.get("/infinite/highscores", response_model=List[InfiniteScore])
-async def get_infinite_highscores(limit: int = 100):
-    """Get infinite mode leaderboard"""
-    return await database.get_infinite_leaderboard(limit)
+@coalesce()
+async def get_infinite_highscores(
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    window: LeaderboardWindow = "all"
+):
+    """Get infinite mode leaderboard of the current day, week or all time"""
+    return await database.get_infinite_leaderboard(limit, offset, window)
+
+@api_router.get("/infinite/rank/{player_id}", response_model=PlayerRank)
+async def get_infinite_rank(player_id: str, radius: int = Query(2, ge=0, le=50), window: LeaderboardWindow = "all"):
+    """Get a player's infinite mode rank and neighbouring entries"""
+    rank = await database.get_infinite_rank(player_id, radius, window)
+    if not rank:
+        raise HTTPException(status_code=404, detail="Player has no infinite mode score")
+    return TrustedJSONResponse(rank)
+
+@api_router.get("/infinite/daily")
+async def get_daily_challenge():
+    """Get today's shared infinite mode seed"""
+    today = datetime.utcnow().date()
+    return {"date": today.isoformat(), "seed": daily_seed(today)}
+
+@api_router.get("/infinite/board/{seed}/{wave}")
+async def get_infinite_board(seed: int, wave: int):
+    """Get a wave's board as row-major colour codes, one digit per cell and 0 for empty"""
+    if not 0 <= seed <= 0xFFFFFFFF or not 1 <= wave <= 100000:
+        raise HTTPException(status_code=404, detail="Board not found")
+    return Response(
+        board_cache.get(seed, wave),
+        media_type="text/plain",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
 
 @api_router.post("/infinite/highscores/{player_id}", response_model=InfiniteScore)
+@admit("infinite-score")
 async def save_infinite_score(player_id: str, score_data: InfiniteScoreRequest):
     """Save infinite mode score"""
+    await verify_infinite_score(score_data)
     score = await database.save_infinite_score(player_id, score_data.score, score_data.wave)
     
     # Check achievements
-    await check_infinite_achievements(player_id, score_data.score, score_data.wave)
+    with timed("achievements"):
+        await check_infinite_achievements(player_id, score_data.score, score_data.wave, score_data.bubblesPopped)
+    get_player_achievements.invalidate(player_id=player_id)
     
-    return score
+    return TrustedJSONResponse(score)
 
 @api_router.get("/achievements/{player_id}", response_model=PlayerAchievements)
+@coalesce()
+@admit("achievements")
 async def get_player_achievements(player_id: str):
     """Get player achievements"""
-    achievements = await get_or_create_achievements(player_id)
+    achievements = await get_achievements_or_default(player_id)
     return achievements
 
-# Event handlers
-@app.on_event("startup")
-async def startup_db_client():
-    """Initialize database connection"""
-    await database.connect_to_mongo()
-    logging.info("Connected to MongoDB")
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    """Close database connection"""
-    await database.close_mongo_connection()
-    logging.info("Disconnected from MongoDB")
-
-# Include the router in the main app
-app.include_router(api_router)
+# Other workers changing a player's achievements drop this worker's micro-cached response too
+broadcast.subscribe("achievements", lambda player_id: get_player_achievements.invalidate(player_id=player_id))
+
+@api_router.post("/sync/{player_id}", response_model=SyncResponse)
+@admit("sync")
+async def sync_player(player_id: str, sync_data: SyncRequest):
+    """Apply a batch of queued offline results in order"""
+    completions = [event for event in sync_data.events if event.type == "level-complete"]
+    scores = [event for event in sync_data.events if event.type == "infinite-score"]
+    await asyncio.gather(
+        *(verify_level_completion(event) for event in completions),
+        *(verify_infinite_score(event) for event in scores)
+    )
+
+    progress, _ = await database.sync_events(player_id, completions, scores)
+    with timed("achievements"):
+        unlocked = await check_sync_achievements(player_id, progress, completions, scores)
+    get_player_achievements.invalidate(player_id=player_id)
+
+    return TrustedJSONResponse(SyncResponse(progress=progress, unlocked=unlocked, applied=len(sync_data.events)))
+
+def check_token(setting: str, token: Optional[str]):
+    """Operator endpoints are only served when their token setting is set and matches"""
+    expected = os.environ.get(setting)
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not enabled")
+    if token != expected:
+        raise HTTPException(status_code=403, detail="Invalid token")
+
+@api_router.get("/export/scores")
+async def export_all_scores(
+    batch_size: int = Query(1000, ge=1, le=10000),
+    after_score: Optional[int] = None,
+    after_id: Optional[str] = None,
+    x_export_token: Optional[str] = Header(None)
+):
+    """Stream every infinite score run as NDJSON, resuming after (after_score, after_id)"""
+    check_token('EXPORT_TOKEN', x_export_token)
+    after = (after_score, after_id) if after_score is not None and after_id is not None else None
+    return StreamingResponse(export_scores(database.storage, batch_size, after), media_type="application/x-ndjson")
+
+@api_router.get("/export/progress")
+async def export_all_progress(
+    batch_size: int = Query(1000, ge=1, le=10000),
+    after: Optional[str] = None,
+    x_export_token: Optional[str] = Header(None)
+):
+    """Stream every stored progress document as NDJSON, resuming after a playerId"""
+    check_token('EXPORT_TOKEN', x_export_token)
+    return StreamingResponse(export_progress(database.storage, batch_size, after), media_type="application/x-ndjson")
+
+@registry.collector
+def collect_service_metrics():
+    """Cache, write queue and leaderboard values read at scrape time"""
+    caches = {**database.cache_stats(), "boards": board_cache.stats()}
+    for counter in ("hits", "misses", "evictions", "expirations", "coalesced"):
+        yield (
+            f"nebula_cache_{counter}_total", "counter", f"Cache {counter} by cache",
+            [({"cache": name}, stats[counter]) for name, stats in caches.items()]
+        )
+    yield "nebula_cache_entries", "gauge", "Entries held by cache", [({"cache": name}, stats["size"]) for name, stats in caches.items()]
+    routes = coalescer_stats()
+    for counter, metric, help in (
+        ("hits", "hits", "fresh micro-cache hits"),
+        ("staleHits", "stale_hits", "stale responses served while refreshing"),
+        ("coalesced", "coalesced", "requests that joined an in-flight call"),
+        ("calls", "calls", "handler calls")
+    ):
+        yield (
+            f"nebula_coalesce_{metric}_total", "counter", f"Coalesced route {help}",
+            [({"endpoint": name}, stats[counter]) for name, stats in routes.items()]
+        )
+    writer = database.score_writer
+    yield "nebula_score_queue_pending", "gauge", "Infinite scores waiting to be written", [({}, writer.pending)]
+    yield "nebula_score_writes_total", "counter", "Buffered infinite score writes by outcome", [
+        ({"outcome": "flushed"}, writer.flushed),
+        ({"outcome": "retried"}, writer.retried),
+        ({"outcome": "failed"}, writer.failed)
+    ]
+    yield "nebula_leaderboard_players", "gauge", "Players on each leaderboard", [
+        ({"window": window}, len(database.leaderboard_for(window))) for window in ("all", *database.window_leaderboards)
+    ]
+    yield "nebula_profiler_samples_total", "counter", "Stacks sampled by the profiler", [({}, profiler.samples)]
+    admitted = admission.stats()
+    yield "nebula_admission_in_flight", "gauge", "Admitted requests holding an in-flight slot", [({}, admitted["inFlight"])]
+    yield "nebula_admission_waiting", "gauge", "Requests queued for an in-flight slot", [({}, admitted["waiting"])]
+    yield "nebula_admission_players", "gauge", "Player token buckets held per route", [
+        ({"route": name}, count) for name, count in admitted["players"].items()
+    ]
+    yield "nebula_idempotency_cached_responses", "gauge", "Idempotent responses kept in process", [({}, len(idempotency_store))]
+    messages = broadcast.stats()
+    yield "nebula_broadcast_peers", "gauge", "Other workers receiving this worker's broadcasts", [({}, messages["peers"])]
+    yield "nebula_broadcast_messages_total", "counter", "Messages between workers by outcome", [
+        ({"outcome": outcome}, messages[outcome]) for outcome in ("sent", "received", "dropped")
+    ]
+
+@api_router.get("/metrics")
+async def get_metrics():
+    """Get process metrics in the Prometheus text format"""
+    return Response(registry.render(), media_type="text/plain; version=0.0.4")
+
+@api_router.post("/metrics/profiler")
+async def toggle_profiler(
+    enabled: bool,
+    interval_ms: float = Query(5, ge=1, le=1000),
+    reset: bool = False,
+    x_profiler_token: Optional[str] = Header(None)
+):
+    """Start or stop sampling the event loop thread"""
+    check_token('PROFILER_TOKEN', x_profiler_token)
+    if reset:
+        profiler.reset()
+    if enabled:
+        profiler.start(interval_ms / 1000)
+    else:
+        profiler.stop()
+    return {"running": profiler.running, "samples": profiler.samples}
+
+@api_router.get("/metrics/profile")
+async def get_profile(x_profiler_token: Optional[str] = Header(None)):
+    """Get sampled stacks in the collapsed format flamegraph tools read"""
+    check_token('PROFILER_TOKEN', x_profiler_token)
+    return Response(profiler.collapsed(), media_type="text/plain")
+
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    """Get player, board and coalesced route cache counters"""
+    return {**database.cache_stats(), "boards": board_cache.stats(), "routes": coalescer_stats()}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connect, warm and check storage before serving, and close it after"""
+    await database.connect()
+    replay_verifier.start()
+    logging.info("Connected to %s storage", database.storage.name)
+    yield
+    await database.close()
+    replay_verifier.close()
+    profiler.stop()
+    logging.info("Disconnected from storage")
+
+def create_app() -> FastAPI:
+    """Build the app; its lifespan makes it ready before the server accepts requests"""
+    app = FastAPI(title="Nebula Game API", version="1.0.0", lifespan=lifespan)
+
+    # Added first so it sits inside the metrics middleware, which then also counts replays
+    app.add_middleware(IdempotencyMiddleware)
+    app.add_middleware(MetricsMiddleware)
+
+    # Configure CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    app.include_router(api_router)
+    return app
+
+# Served by `uvicorn server:app`, or by serve.py, which forks its workers after importing it
+app = create_app()
 
 # Configure logging
 logging.basicConfig(
@@ -0,0 +1,17 @@
+from storage.base import StorageBackend
+
+BACKENDS = ("mongo", "memory", "sqlite")
+
+
+def create_storage(kind: str) -> StorageBackend:
+    """Create a storage backend by name; only the chosen backend's dependencies are imported"""
+    if kind == "mongo":
+        from storage.mongo import MongoStorage
+        return MongoStorage()
+    if kind == "memory":
+        from storage.memory import MemoryStorage
+        return MemoryStorage()
+    if kind == "sqlite":
+        from storage.sqlite import SQLiteStorage
+        return SQLiteStorage()
+    raise ValueError(f"Unknown storage backend {kind!r}, expected one of {', '.join(BACKENDS)}")
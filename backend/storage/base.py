@@ -0,0 +1,255 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+# A level completion as stored: (levelId, score, stars)
+Completion = Tuple[int, int, int]
+
+# Keyset position in score export order (score descending, then id): (score, id)
+ScoreKey = Tuple[int, str]
+
+# Keyset position in run time order: (timestamp, id)
+RunKey = Tuple[datetime, str]
+
+
+class StorageBackend(ABC):
+    """Persistence contract behind `Database`.
+
+    Progress documents use the compact layout from progress_format, while
+    achievements and infinite score documents keep their model shape.
+    Every method that changes a player's document must be atomic for
+    that player.
+    """
+
+    name = ""
+
+    async def connect(self):
+        """Open the backend"""
+
+    async def close(self):
+        """Release the backend"""
+
+    async def ping(self, connections: int = 1) -> bool:
+        """Check the backend answers, opening up to `connections` pooled connections on the way"""
+        return True
+
+    async def ensure_schema(self, mode: str = "warn"):
+        """Create indexes or tables the backend needs"""
+
+    async def migrate_progress(self, batch_size: int = 1000) -> int:
+        """Convert legacy progress documents, returns how many changed"""
+        return 0
+
+    @abstractmethod
+    async def get_progress(self, player_id: str) -> Optional[Dict[str, Any]]:
+        """Get a stored progress document"""
+
+    @abstractmethod
+    async def insert_progress(self, progress_data: Dict[str, Any]) -> bool:
+        """Insert a progress document, returns False if the player already has one"""
+
+    @abstractmethod
+    async def save_progress(self, player_id: str, progress_data: Dict[str, Any]):
+        """Replace or create a progress document"""
+
+    @abstractmethod
+    async def progress_page(self, after: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        """Get up to `limit` progress documents in playerId order, starting after the given playerId"""
+
+    async def iter_progress(self, batch_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        """Iterate over every stored progress document, fetching `batch_size` at a time"""
+        after = None
+        while True:
+            page = await self.progress_page(after, batch_size)
+            for progress_data in page:
+                yield progress_data
+            if len(page) < batch_size:
+                return
+            after = page[-1]["playerId"]
+
+    @abstractmethod
+    async def complete_level(self, player_id: str, completion: Completion, defaults: Dict[str, Any], played_at: datetime) -> Dict[str, Any]:
+        """Record a completion, creating the document from `defaults` if needed, and return it"""
+
+    @abstractmethod
+    async def apply_batch(self, player_id: str, completions: List[Completion], infinite_high: Optional[Tuple[int, int]], defaults: Dict[str, Any], played_at: datetime) -> Dict[str, Any]:
+        """Record completions in order plus an infinite high score in one atomic update, and return the document it wrote"""
+
+    @abstractmethod
+    async def raise_infinite_high(self, player_id: str, score: int, wave: int, defaults: Dict[str, Any], played_at: datetime):
+        """Raise a player's infinite high score and wave, creating the document from `defaults` if needed"""
+
+    @abstractmethod
+    async def insert_scores(self, scores: List[Dict[str, Any]]):
+        """Append infinite score runs, skipping ids already stored so a failed batch can be retried"""
+
+    @abstractmethod
+    async def scores_page(self, after: Optional[ScoreKey], limit: int) -> List[Dict[str, Any]]:
+        """Get up to `limit` infinite score runs by score descending then id, starting after the given key"""
+
+    @abstractmethod
+    def best_scores(self) -> AsyncIterator[Dict[str, Any]]:
+        """Iterate over the best infinite score run of each player"""
+
+    @abstractmethod
+    async def next_score_time(self, after: Optional[datetime]) -> Optional[datetime]:
+        """Get the timestamp of the earliest stored run at or after `after`"""
+
+    @abstractmethod
+    async def summarize_score_day(self, day: str, start: datetime, end: datetime):
+        """Summarize each player's runs in [start, end) into {"playerId", "day", "count", "sum", "best", "bestWave"}.
+
+        A player who already has a summary for `day` keeps it, so a day is
+        summarized once, from its complete runs, however often this is called.
+        """
+
+    @abstractmethod
+    async def day_summaries(self, day: str) -> List[Dict[str, Any]]:
+        """Get the run summaries of one day by playerId"""
+
+    @abstractmethod
+    async def runs_page(self, start: datetime, end: datetime, after: Optional[RunKey], limit: int) -> List[Dict[str, Any]]:
+        """Get up to `limit` runs in [start, end) as {"id", "playerId", "timestamp"} in (timestamp, id) order, starting after the given key"""
+
+    @abstractmethod
+    async def delete_compacted_runs(self, start: datetime, end: datetime, player_ids: List[str]) -> int:
+        """Delete the players' runs in [start, end) that score below their personal best, returns how many"""
+
+    @abstractmethod
+    async def raise_window_bests(self, entries: List[Dict[str, Any]]):
+        """Store windowed leaderboard entries, keeping the higher score per window and player.
+
+        Each entry is an infinite score document plus `window` and `expiresAt`;
+        entries past `expiresAt` may be dropped at any time.
+        """
+
+    @abstractmethod
+    def window_bests(self, window: str) -> AsyncIterator[Dict[str, Any]]:
+        """Iterate over the stored entries of one leaderboard window"""
+
+    @abstractmethod
+    async def get_level_stats(self, level_id: int) -> Optional[Dict[str, Any]]:
+        """Get a level's counters document"""
+
+    @abstractmethod
+    async def increment_level_stats(self, level_id: int, increments: Dict[str, int]):
+        """Add dotted-path increments to a level's counters, creating the document if needed"""
+
+    @abstractmethod
+    async def save_level_stats(self, level_id: int, stats_data: Dict[str, Any]):
+        """Replace or create a level's counters document"""
+
+    @abstractmethod
+    async def get_achievements(self, player_id: str) -> Optional[Dict[str, Any]]:
+        """Get a stored achievements document"""
+
+    @abstractmethod
+    async def save_achievements(self, player_id: str, achievements_data: Dict[str, Any]):
+        """Replace or create an achievements document"""
+
+    @abstractmethod
+    async def record_achievement_stats(self, player_id: str, increments: Dict[str, int], maximums: Dict[str, int], defaults: List[Dict[str, Any]], updated_at: datetime) -> Dict[str, Any]:
+        """Advance stats, creating the document with `defaults` if needed.
+
+        Returns `{"stats": {...}, "achievements": [{"id", "unlocked"}, ...]}`.
+        """
+
+    @abstractmethod
+    async def unlock_achievements(self, player_id: str, unlocks: List[Dict[str, Any]]):
+        """Unlock still-locked achievements, each given as {"id", "progress", "unlockedAt"}"""
+
+    @abstractmethod
+    async def achievements_page(self, after: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        """Get up to `limit` achievements documents in playerId order, starting after the given playerId"""
+
+    @abstractmethod
+    async def apply_achievement_changes(self, changes: List[Dict[str, Any]]):
+        """Apply re-evaluated achievement changes in one grouped write.
+
+        Each change comes from `achievements.reevaluate_achievements`: stats
+        `maximums`, `defaults` to create the document with (or None), locked
+        entries to `add` or `refresh`, and `unlocks`. Each part is conditional
+        on the stored document, so changes are safe to apply beside live events.
+        """
+
+    @abstractmethod
+    async def prune_untouched(self, batch_size: int = 1000) -> Dict[str, int]:
+        """Delete progress and achievements documents that still read as defaults, returns deletions per collection"""
+
+    @abstractmethod
+    async def collection_stats(self) -> Dict[str, Dict[str, int]]:
+        """Get the document count, and the data size where known, of the player collections"""
+
+    @abstractmethod
+    async def claim_idempotency_key(self, key: str, fingerprint: str, now: datetime, locked_until: datetime, expires_at: datetime) -> Optional[Dict[str, Any]]:
+        """Record a pending request under `key`, returns None if claimed, else the stored record.
+
+        A record is {"key", "fingerprint", "status", "headers", "body",
+        "lockedUntil", "expiresAt"}, with a null status while pending. A
+        pending record past `lockedUntil`, whose worker went away, or any
+        record past `expiresAt` is claimed over.
+        """
+
+    @abstractmethod
+    async def complete_idempotency_key(self, key: str, status: int, headers: List[List[str]], body: bytes, expires_at: datetime):
+        """Store the response of a claimed request"""
+
+    @abstractmethod
+    async def release_idempotency_key(self, key: str):
+        """Drop a pending claim so the request can run again"""
+
+
+def apply_achievement_stats(achievements_data: Dict[str, Any], increments: Dict[str, int], maximums: Dict[str, int], updated_at: datetime) -> Dict[str, Any]:
+    """Advance stats on an achievements document in place and return its state"""
+    stats = achievements_data.setdefault("stats", {})
+    for metric, value in increments.items():
+        stats[metric] = stats.get(metric, 0) + value
+    for metric, value in maximums.items():
+        stats[metric] = max(stats.get(metric, value), value)
+    achievements_data["updatedAt"] = updated_at
+    return {
+        "stats": dict(stats),
+        "achievements": [
+            {"id": a["id"], "unlocked": a.get("unlocked", False)}
+            for a in achievements_data.get("achievements", [])
+        ]
+    }
+
+
+def is_untouched_achievements(achievements_data: Dict[str, Any]) -> bool:
+    """Check whether an achievements document has no stats and nothing unlocked"""
+    return not achievements_data.get("stats") and not any(
+        a.get("unlocked") for a in achievements_data.get("achievements", [])
+    )
+
+
+def apply_achievement_change(achievements_data: Dict[str, Any], change: Dict[str, Any]):
+    """Apply a re-evaluated achievement change on a document in place"""
+    apply_achievement_stats(achievements_data, {}, change["maximums"], change["updatedAt"])
+    entries = achievements_data.setdefault("achievements", [])
+    by_id = {a["id"]: a for a in entries}
+    for entry in change["add"]:
+        if entry["id"] not in by_id:
+            entries.append(dict(entry))
+            by_id[entry["id"]] = entries[-1]
+    for definition in change["refresh"]:
+        achievement = by_id.get(definition["id"])
+        if achievement is not None and not achievement.get("unlocked"):
+            achievement.update(definition)
+    apply_unlocks(achievements_data, change["unlocks"])
+
+
+def is_claimable(record: Dict[str, Any], now: datetime) -> bool:
+    """Check whether an idempotency record expired or is pending past its lock"""
+    return record["expiresAt"] <= now or (record["status"] is None and record["lockedUntil"] <= now)
+
+
+def apply_unlocks(achievements_data: Dict[str, Any], unlocks: List[Dict[str, Any]]):
+    """Unlock still-locked achievements on a document in place"""
+    by_id = {a["id"]: a for a in achievements_data.get("achievements", [])}
+    for unlock in unlocks:
+        achievement = by_id.get(unlock["id"])
+        if achievement is not None and not achievement.get("unlocked"):
+            achievement["unlocked"] = True
+            achievement["progress"] = unlock["progress"]
+            achievement["unlockedAt"] = unlock["unlockedAt"]
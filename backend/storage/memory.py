@@ -0,0 +1,250 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from copy import deepcopy
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from models import InfiniteScore
+from leaderboard import Leaderboard
+from level_stats import apply_increments
+from progress_format import apply_completion, apply_infinite_high, is_untouched_progress
+from storage.base import (
+    Completion, RunKey, ScoreKey, StorageBackend, apply_achievement_change, apply_achievement_stats, apply_unlocks,
+    is_claimable, is_untouched_achievements
+)
+
+
+def _copy_progress(progress_data: Dict[str, Any]) -> Dict[str, Any]:
+    copied = dict(progress_data)
+    copied["bestScores"] = dict(progress_data.get("bestScores", {}))
+    copied["lastPlayed"] = dict(progress_data.get("lastPlayed", {}))
+    return copied
+
+
+class MemoryStorage(StorageBackend):
+    """Process-local backend with per-player dicts and a sorted leaderboard.
+
+    Every operation runs to completion without awaiting, so updates are
+    atomic on the event loop without locks. Data is lost on restart; this
+    backend is meant for load tests, benchmarks and throwaway instances.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self.progress: Dict[str, Dict[str, Any]] = {}
+        self.achievements: Dict[str, Dict[str, Any]] = {}
+        self.scores: Dict[str, Dict[str, Any]] = {}
+        # Sorted keys into self.scores, for the score and time ordered pages
+        self.score_keys: List[Tuple[int, str]] = []
+        self.run_keys: List[RunKey] = []
+        self.level_stats: Dict[int, Dict[str, Any]] = {}
+        self.windows: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.best = Leaderboard()
+        # (day, playerId) -> daily summary of compacted runs
+        self.score_days: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # Idempotency records in claim order, which is expiry order as they share one TTL
+        self.idempotency: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    async def get_progress(self, player_id: str) -> Optional[Dict[str, Any]]:
+        progress_data = self.progress.get(player_id)
+        return _copy_progress(progress_data) if progress_data else None
+
+    async def insert_progress(self, progress_data: Dict[str, Any]) -> bool:
+        if progress_data["playerId"] in self.progress:
+            return False
+        self.progress[progress_data["playerId"]] = _copy_progress(progress_data)
+        return True
+
+    async def save_progress(self, player_id: str, progress_data: Dict[str, Any]):
+        self.progress[player_id] = _copy_progress(progress_data)
+
+    async def progress_page(self, after: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        player_ids = sorted(player_id for player_id in self.progress if after is None or player_id > after)
+        return [_copy_progress(self.progress[player_id]) for player_id in player_ids[:limit]]
+
+    def _progress_for_update(self, player_id: str, defaults: Dict[str, Any]) -> Dict[str, Any]:
+        progress_data = self.progress.get(player_id)
+        if progress_data is None:
+            progress_data = self.progress[player_id] = _copy_progress(defaults)
+        return progress_data
+
+    async def complete_level(self, player_id: str, completion: Completion, defaults: Dict[str, Any], played_at: datetime) -> Dict[str, Any]:
+        progress_data = self._progress_for_update(player_id, defaults)
+        apply_completion(progress_data, *completion, played_at)
+        return _copy_progress(progress_data)
+
+    async def apply_batch(self, player_id: str, completions: List[Completion], infinite_high: Optional[Tuple[int, int]], defaults: Dict[str, Any], played_at: datetime) -> Dict[str, Any]:
+        progress_data = self._progress_for_update(player_id, defaults)
+        for completion in completions:
+            apply_completion(progress_data, *completion, played_at)
+        if infinite_high:
+            apply_infinite_high(progress_data, *infinite_high, played_at)
+        return _copy_progress(progress_data)
+
+    async def raise_infinite_high(self, player_id: str, score: int, wave: int, defaults: Dict[str, Any], played_at: datetime):
+        apply_infinite_high(self._progress_for_update(player_id, defaults), score, wave, played_at)
+
+    async def insert_scores(self, scores: List[Dict[str, Any]]):
+        for score_data in scores:
+            if score_data["id"] in self.scores:
+                continue
+            self.scores[score_data["id"]] = dict(score_data)
+            insort(self.score_keys, (-score_data["score"], score_data["id"]))
+            insort(self.run_keys, (score_data["timestamp"], score_data["id"]))
+            self.best.submit(InfiniteScore(**score_data))
+
+    def _runs_between(self, start: datetime, end: datetime) -> Tuple[int, int]:
+        return bisect_left(self.run_keys, (start, "")), bisect_left(self.run_keys, (end, ""))
+
+    async def scores_page(self, after: Optional[ScoreKey], limit: int) -> List[Dict[str, Any]]:
+        first = bisect_right(self.score_keys, (-after[0], after[1])) if after else 0
+        return [dict(self.scores[score_id]) for _, score_id in self.score_keys[first:first + limit]]
+
+    async def best_scores(self) -> AsyncIterator[Dict[str, Any]]:
+        for score in self.best.top(len(self.best)):
+            yield score.dict()
+
+    async def next_score_time(self, after: Optional[datetime]) -> Optional[datetime]:
+        first = bisect_left(self.run_keys, (after, "")) if after else 0
+        return self.run_keys[first][0] if first < len(self.run_keys) else None
+
+    async def summarize_score_day(self, day: str, start: datetime, end: datetime):
+        summaries = {}
+        first, last = self._runs_between(start, end)
+        for _, score_id in self.run_keys[first:last]:
+            score_data = self.scores[score_id]
+            if (day, score_data["playerId"]) not in self.score_days:
+                summary = summaries.setdefault(score_data["playerId"], {
+                    "playerId": score_data["playerId"], "day": day, "count": 0, "sum": 0, "best": 0, "bestWave": 0
+                })
+                summary["count"] += 1
+                summary["sum"] += score_data["score"]
+                summary["best"] = max(summary["best"], score_data["score"])
+                summary["bestWave"] = max(summary["bestWave"], score_data["wave"])
+        for player_id, summary in summaries.items():
+            self.score_days[(day, player_id)] = summary
+
+    async def day_summaries(self, day: str) -> List[Dict[str, Any]]:
+        return [dict(summary) for (summary_day, _), summary in sorted(self.score_days.items()) if summary_day == day]
+
+    async def runs_page(self, start: datetime, end: datetime, after: Optional[RunKey], limit: int) -> List[Dict[str, Any]]:
+        first, last = self._runs_between(start, end)
+        if after:
+            first = max(first, bisect_right(self.run_keys, after))
+        page = [self.scores[score_id] for _, score_id in self.run_keys[first:min(last, first + limit)]]
+        return [{"id": s["id"], "playerId": s["playerId"], "timestamp": s["timestamp"]} for s in page]
+
+    async def delete_compacted_runs(self, start: datetime, end: datetime, player_ids: List[str]) -> int:
+        bests = {player_id: self.best.get(player_id) for player_id in player_ids}
+        first, last = self._runs_between(start, end)
+        kept = []
+        deleted = 0
+        for key in self.run_keys[first:last]:
+            score_data = self.scores[key[1]]
+            if score_data["playerId"] in bests and score_data["score"] < bests[score_data["playerId"]].score:
+                del self.scores[key[1]]
+                del self.score_keys[bisect_left(self.score_keys, (-score_data["score"], key[1]))]
+                deleted += 1
+            else:
+                kept.append(key)
+        self.run_keys[first:last] = kept
+        return deleted
+
+    async def raise_window_bests(self, entries: List[Dict[str, Any]]):
+        now = datetime.utcnow()
+        for window in [w for w, bests in self.windows.items() if next(iter(bests.values()))["expiresAt"] <= now]:
+            del self.windows[window]
+        for entry in entries:
+            bests = self.windows.setdefault(entry["window"], {})
+            current = bests.get(entry["playerId"])
+            if current is None or entry["score"] > current["score"]:
+                bests[entry["playerId"]] = dict(entry)
+
+    async def window_bests(self, window: str) -> AsyncIterator[Dict[str, Any]]:
+        for entry in list(self.windows.get(window, {}).values()):
+            yield dict(entry)
+
+    async def get_level_stats(self, level_id: int) -> Optional[Dict[str, Any]]:
+        stats_data = self.level_stats.get(level_id)
+        return deepcopy(stats_data) if stats_data else None
+
+    async def increment_level_stats(self, level_id: int, increments: Dict[str, int]):
+        apply_increments(self.level_stats.setdefault(level_id, {"levelId": level_id}), increments)
+
+    async def save_level_stats(self, level_id: int, stats_data: Dict[str, Any]):
+        self.level_stats[level_id] = deepcopy(stats_data)
+
+    async def get_achievements(self, player_id: str) -> Optional[Dict[str, Any]]:
+        achievements_data = self.achievements.get(player_id)
+        return deepcopy(achievements_data) if achievements_data else None
+
+    async def save_achievements(self, player_id: str, achievements_data: Dict[str, Any]):
+        self.achievements[player_id] = deepcopy(achievements_data)
+
+    async def record_achievement_stats(self, player_id: str, increments: Dict[str, int], maximums: Dict[str, int], defaults: List[Dict[str, Any]], updated_at: datetime) -> Dict[str, Any]:
+        achievements_data = self.achievements.get(player_id)
+        if achievements_data is None:
+            achievements_data = self.achievements[player_id] = {
+                "playerId": player_id,
+                "achievements": deepcopy(defaults)
+            }
+        return apply_achievement_stats(achievements_data, increments, maximums, updated_at)
+
+    async def unlock_achievements(self, player_id: str, unlocks: List[Dict[str, Any]]):
+        achievements_data = self.achievements.get(player_id)
+        if achievements_data is not None:
+            apply_unlocks(achievements_data, unlocks)
+
+    async def achievements_page(self, after: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        player_ids = sorted(player_id for player_id in self.achievements if after is None or player_id > after)
+        return [deepcopy(self.achievements[player_id]) for player_id in player_ids[:limit]]
+
+    async def apply_achievement_changes(self, changes: List[Dict[str, Any]]):
+        for change in changes:
+            player_id = change["playerId"]
+            achievements_data = self.achievements.get(player_id)
+            if achievements_data is None:
+                achievements_data = self.achievements[player_id] = {
+                    "playerId": player_id,
+                    "achievements": deepcopy(change["defaults"] or [])
+                }
+            apply_achievement_change(achievements_data, change)
+
+    async def prune_untouched(self, batch_size: int = 1000) -> Dict[str, int]:
+        progress_ids = [p for p, progress_data in self.progress.items() if is_untouched_progress(progress_data)]
+        achievement_ids = [p for p, achievements_data in self.achievements.items() if is_untouched_achievements(achievements_data)]
+        for player_id in progress_ids:
+            del self.progress[player_id]
+        for player_id in achievement_ids:
+            del self.achievements[player_id]
+        return {"player_progress": len(progress_ids), "player_achievements": len(achievement_ids)}
+
+    async def collection_stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            "player_progress": {"count": len(self.progress)},
+            "player_achievements": {"count": len(self.achievements)}
+        }
+
+    async def claim_idempotency_key(self, key: str, fingerprint: str, now: datetime, locked_until: datetime, expires_at: datetime) -> Optional[Dict[str, Any]]:
+        while self.idempotency and next(iter(self.idempotency.values()))["expiresAt"] <= now:
+            self.idempotency.popitem(last=False)
+        record = self.idempotency.get(key)
+        if record is not None and not is_claimable(record, now):
+            return dict(record)
+        self.idempotency.pop(key, None)
+        self.idempotency[key] = {
+            "key": key, "fingerprint": fingerprint, "status": None, "headers": None, "body": None,
+            "lockedUntil": locked_until, "expiresAt": expires_at
+        }
+        return None
+
+    async def complete_idempotency_key(self, key: str, status: int, headers: List[List[str]], body: bytes, expires_at: datetime):
+        record = self.idempotency.get(key)
+        if record is not None:
+            record.update(status=status, headers=headers, body=body, expiresAt=expires_at)
+
+    async def release_idempotency_key(self, key: str):
+        record = self.idempotency.get(key)
+        if record is not None and record["status"] is None:
+            del self.idempotency[key]
@@ -0,0 +1,388 @@
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DeleteMany, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import os
+
+from indexes import ensure_schema
+from metrics import mongo_listener
+from progress_format import (
+    complete_level_stages, completion_stage, infinite_high_stage, MIGRATION_STAGES, UNTOUCHED_PROGRESS
+)
+from storage.base import Completion, RunKey, ScoreKey, StorageBackend, is_claimable
+
+UNTOUCHED_ACHIEVEMENTS = {
+    "achievements.unlocked": {"$ne": True},
+    "$or": [{"stats": {"$exists": False}}, {"stats": {}}]
+}
+
+
+def _defaults_stage(defaults: Dict[str, Any]) -> dict:
+    """Pipeline stage filling in every default field a document lacks.
+
+    An upsert starts from just the playerId, so this turns it into the
+    default document; an existing document keeps its own values.
+    """
+    fill = {k: v for k, v in defaults.items() if k != "playerId"}
+    return {"$replaceWith": {"$mergeObjects": [{"$literal": fill}, "$$ROOT"]}}
+
+
+class MongoStorage(StorageBackend):
+    """MongoDB backend through Motor"""
+
+    name = "mongo"
+
+    def __init__(self, url: Optional[str] = None, db_name: Optional[str] = None):
+        self.url = url or os.environ['MONGO_URL']
+        self.db_name = db_name or os.environ['DB_NAME']
+        self.client: AsyncIOMotorClient = None
+        self.database = None
+
+    async def connect(self):
+        self.client = AsyncIOMotorClient(self.url, event_listeners=[mongo_listener])
+        self.database = self.client[self.db_name]
+
+    async def close(self):
+        if self.client:
+            self.client.close()
+
+    async def ping(self, connections: int = 1) -> bool:
+        # Concurrent commands each check out a pooled connection, opening it if needed
+        try:
+            await asyncio.gather(*(self.database.command("ping") for _ in range(connections)))
+        except PyMongoError:
+            return False
+        return True
+
+    async def ensure_schema(self, mode: str = "warn"):
+        await ensure_schema(self.database, mode)
+
+    async def migrate_progress(self, batch_size: int = 1000) -> int:
+        migrated = 0
+        while True:
+            cursor = self.database.player_progress.find({"levels": {"$exists": True}}, {"_id": 1}).limit(batch_size)
+            ids = [progress_data["_id"] async for progress_data in cursor]
+            if not ids:
+                return migrated
+
+            result = await self.database.player_progress.update_many({"_id": {"$in": ids}}, MIGRATION_STAGES)
+            migrated += result.modified_count
+
+    async def get_progress(self, player_id: str) -> Optional[Dict[str, Any]]:
+        return await self.database.player_progress.find_one({"playerId": player_id}, {"_id": 0})
+
+    async def insert_progress(self, progress_data: Dict[str, Any]) -> bool:
+        try:
+            await self.database.player_progress.insert_one(dict(progress_data))
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def save_progress(self, player_id: str, progress_data: Dict[str, Any]):
+        await self.database.player_progress.update_one(
+            {"playerId": player_id},
+            {"$set": progress_data, "$unset": {"levels": ""}},
+            upsert=True
+        )
+
+    async def progress_page(self, after: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        query = {"playerId": {"$gt": after}} if after is not None else {}
+        cursor = self.database.player_progress.find(query, {"_id": 0}).sort("playerId", 1).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def complete_level(self, player_id: str, completion: Completion, defaults: Dict[str, Any], played_at: datetime) -> Dict[str, Any]:
+        stages = [_defaults_stage(defaults), *complete_level_stages(*completion, played_at)]
+        try:
+            return await self._update_progress(player_id, stages)
+        except DuplicateKeyError:
+            # Another request created the document between our read and upsert
+            return await self._update_progress(player_id, stages)
+
+    async def apply_batch(self, player_id: str, completions: List[Completion], infinite_high: Optional[Tuple[int, int]], defaults: Dict[str, Any], played_at: datetime) -> Dict[str, Any]:
+        # One pipeline update, so the batch applies whole or not at all and the
+        # returned document is the one it wrote. A sync of at most 500 events
+        # stays under the server's 1000 stage limit.
+        stages = [_defaults_stage(defaults), *MIGRATION_STAGES]
+        stages.extend(filter(None, (completion_stage(*completion, played_at) for completion in completions)))
+        if infinite_high:
+            stages.append(infinite_high_stage(*infinite_high, played_at))
+        try:
+            return await self._update_progress(player_id, stages)
+        except DuplicateKeyError:
+            # Another request created the document between our read and upsert
+            return await self._update_progress(player_id, stages)
+
+    async def _update_progress(self, player_id: str, update: List[dict]) -> Dict[str, Any]:
+        return await self.database.player_progress.find_one_and_update(
+            {"playerId": player_id},
+            update,
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def raise_infinite_high(self, player_id: str, score: int, wave: int, defaults: Dict[str, Any], played_at: datetime):
+        updated = {"playerId", "infiniteHighScore", "infiniteHighWave", "updatedAt"}
+        await self.database.player_progress.update_one(
+            {"playerId": player_id},
+            {
+                "$max": {"infiniteHighScore": score, "infiniteHighWave": wave},
+                "$set": {"updatedAt": played_at},
+                "$setOnInsert": {k: v for k, v in defaults.items() if k not in updated}
+            },
+            upsert=True
+        )
+
+    async def insert_scores(self, scores: List[Dict[str, Any]]):
+        # Keyed on the run id, so a retried batch skips the runs that made it the first time
+        try:
+            await self.database.infinite_scores.insert_many(
+                [{"_id": score_data["id"], **score_data} for score_data in scores], ordered=False
+            )
+        except BulkWriteError as e:
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+
+    async def scores_page(self, after: Optional[ScoreKey], limit: int) -> List[Dict[str, Any]]:
+        query = {}
+        if after:
+            query = {"score": {"$lte": after[0]}, "$or": [{"score": {"$lt": after[0]}}, {"id": {"$gt": after[1]}}]}
+        cursor = self.database.infinite_scores.find(query, {"_id": 0}).sort([("score", -1), ("id", 1)]).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def best_scores(self) -> AsyncIterator[Dict[str, Any]]:
+        pipeline = [
+            {"$sort": {"score": -1, "timestamp": 1}},
+            {"$group": {"_id": "$playerId", "best": {"$first": "$$ROOT"}}},
+            {"$replaceRoot": {"newRoot": "$best"}},
+        ]
+        async for score_data in self.database.infinite_scores.aggregate(pipeline, allowDiskUse=True):
+            yield score_data
+
+    async def next_score_time(self, after: Optional[datetime]) -> Optional[datetime]:
+        score_data = await self.database.infinite_scores.find_one(
+            {"timestamp": {"$gte": after}} if after else {}, {"_id": 0, "timestamp": 1}, sort=[("timestamp", 1)]
+        )
+        return score_data["timestamp"] if score_data else None
+
+    async def summarize_score_day(self, day: str, start: datetime, end: datetime):
+        pipeline = [
+            {"$match": {"timestamp": {"$gte": start, "$lt": end}}},
+            {"$group": {
+                "_id": "$playerId",
+                "count": {"$sum": 1},
+                "sum": {"$sum": "$score"},
+                "best": {"$max": "$score"},
+                "bestWave": {"$max": "$wave"}
+            }},
+            {"$project": {"_id": 0, "playerId": "$_id", "day": {"$literal": day}, "count": 1, "sum": 1, "best": 1, "bestWave": 1}},
+            {"$merge": {
+                "into": "infinite_score_days", "on": ["day", "playerId"],
+                "whenMatched": "keepExisting", "whenNotMatched": "insert"
+            }},
+        ]
+        # Runs on the server; $merge needs the unique day_playerId index
+        async for _ in self.database.infinite_scores.aggregate(pipeline, allowDiskUse=True):
+            pass
+
+    async def day_summaries(self, day: str) -> List[Dict[str, Any]]:
+        cursor = self.database.infinite_score_days.find({"day": day}, {"_id": 0}).sort("playerId", 1)
+        return await cursor.to_list(length=None)
+
+    async def runs_page(self, start: datetime, end: datetime, after: Optional[RunKey], limit: int) -> List[Dict[str, Any]]:
+        query = {"timestamp": {"$gte": start, "$lt": end}}
+        if after:
+            query = {
+                "timestamp": {"$gte": after[0], "$lt": end},
+                "$or": [{"timestamp": {"$gt": after[0]}}, {"id": {"$gt": after[1]}}]
+            }
+        cursor = self.database.infinite_scores.find(query, {"_id": 0, "id": 1, "playerId": 1, "timestamp": 1})
+        return await cursor.sort([("timestamp", 1), ("id", 1)]).limit(limit).to_list(length=limit)
+
+    async def delete_compacted_runs(self, start: datetime, end: datetime, player_ids: List[str]) -> int:
+        # Sorted like the playerId_score_desc index, so each player's best is one index seek
+        pipeline = [
+            {"$match": {"playerId": {"$in": player_ids}}},
+            {"$sort": {"playerId": 1, "score": -1}},
+            {"$group": {"_id": "$playerId", "best": {"$first": "$score"}}},
+        ]
+        operations = [
+            DeleteMany({"playerId": best["_id"], "timestamp": {"$gte": start, "$lt": end}, "score": {"$lt": best["best"]}})
+            async for best in self.database.infinite_scores.aggregate(pipeline)
+        ]
+        if not operations:
+            return 0
+        result = await self.database.infinite_scores.bulk_write(operations, ordered=False)
+        return result.deleted_count
+
+    async def raise_window_bests(self, entries: List[Dict[str, Any]]):
+        operations = [
+            UpdateOne(
+                {"window": entry["window"], "playerId": entry["playerId"], "score": {"$lt": entry["score"]}},
+                {"$set": entry},
+                upsert=True
+            )
+            for entry in entries
+        ]
+        try:
+            await self.database.leaderboard_windows.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # An equal or better run is already stored, so its upsert hit the unique index
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+
+    async def window_bests(self, window: str) -> AsyncIterator[Dict[str, Any]]:
+        async for entry in self.database.leaderboard_windows.find({"window": window}):
+            yield entry
+
+    async def get_level_stats(self, level_id: int) -> Optional[Dict[str, Any]]:
+        return await self.database.level_stats.find_one({"levelId": level_id}, {"_id": 0})
+
+    async def increment_level_stats(self, level_id: int, increments: Dict[str, int]):
+        await self.database.level_stats.update_one({"levelId": level_id}, {"$inc": increments}, upsert=True)
+
+    async def save_level_stats(self, level_id: int, stats_data: Dict[str, Any]):
+        await self.database.level_stats.replace_one({"levelId": level_id}, stats_data, upsert=True)
+
+    async def get_achievements(self, player_id: str) -> Optional[Dict[str, Any]]:
+        return await self.database.player_achievements.find_one({"playerId": player_id}, {"_id": 0})
+
+    async def save_achievements(self, player_id: str, achievements_data: Dict[str, Any]):
+        await self.database.player_achievements.update_one(
+            {"playerId": player_id},
+            {"$set": achievements_data},
+            upsert=True
+        )
+
+    async def record_achievement_stats(self, player_id: str, increments: Dict[str, int], maximums: Dict[str, int], defaults: List[Dict[str, Any]], updated_at: datetime) -> Dict[str, Any]:
+        update = {
+            "$set": {"updatedAt": updated_at},
+            "$setOnInsert": {"achievements": defaults}
+        }
+        if increments:
+            update["$inc"] = {f"stats.{metric}": value for metric, value in increments.items()}
+        if maximums:
+            update["$max"] = {f"stats.{metric}": value for metric, value in maximums.items()}
+
+        return await self.database.player_achievements.find_one_and_update(
+            {"playerId": player_id},
+            update,
+            projection={"_id": 0, "stats": 1, "achievements.id": 1, "achievements.unlocked": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def unlock_achievements(self, player_id: str, unlocks: List[Dict[str, Any]]):
+        await self.database.player_achievements.bulk_write([
+            UpdateOne(
+                {"playerId": player_id, "achievements": {"$elemMatch": {"id": unlock["id"], "unlocked": False}}},
+                {"$set": {
+                    "achievements.$.unlocked": True,
+                    "achievements.$.progress": unlock["progress"],
+                    "achievements.$.unlockedAt": unlock["unlockedAt"]
+                }}
+            )
+            for unlock in unlocks
+        ], ordered=False)
+
+    async def achievements_page(self, after: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        query = {"playerId": {"$gt": after}} if after is not None else {}
+        cursor = self.database.player_achievements.find(query, {"_id": 0}).sort("playerId", 1).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def apply_achievement_changes(self, changes: List[Dict[str, Any]]):
+        operations = []
+        for change in changes:
+            player_id = change["playerId"]
+            if change["maximums"] or change["defaults"] is not None:
+                update = {"$set": {"updatedAt": change["updatedAt"]}}
+                if change["maximums"]:
+                    update["$max"] = {f"stats.{metric}": value for metric, value in change["maximums"].items()}
+                if change["defaults"] is not None:
+                    update["$setOnInsert"] = {"achievements": change["defaults"]}
+                operations.append(UpdateOne({"playerId": player_id}, update, upsert=True))
+            operations.extend(
+                UpdateOne({"playerId": player_id, "achievements.id": {"$ne": entry["id"]}}, {"$push": {"achievements": entry}})
+                for entry in change["add"]
+            )
+            operations.extend(
+                UpdateOne(
+                    {"playerId": player_id, "achievements": {"$elemMatch": {"id": definition["id"], "unlocked": False}}},
+                    {"$set": {f"achievements.$.{field}": value for field, value in definition.items() if field != "id"}}
+                )
+                for definition in change["refresh"]
+            )
+            operations.extend(
+                UpdateOne(
+                    {"playerId": player_id, "achievements": {"$elemMatch": {"id": unlock["id"], "unlocked": False}}},
+                    {"$set": {
+                        "achievements.$.unlocked": True,
+                        "achievements.$.progress": unlock["progress"],
+                        "achievements.$.unlockedAt": unlock["unlockedAt"]
+                    }}
+                )
+                for unlock in change["unlocks"]
+            )
+        if operations:
+            # Ordered, so a player's entries exist before they are refreshed or unlocked
+            await self.database.player_achievements.bulk_write(operations, ordered=True)
+
+    async def _prune(self, collection, query: Dict[str, Any], batch_size: int) -> int:
+        deleted = 0
+        ids = []
+        async for document in collection.find(query, {"_id": 1}).batch_size(batch_size):
+            ids.append(document["_id"])
+            if len(ids) >= batch_size:
+                # The query is checked again on delete, so documents written since the scan are kept
+                deleted += (await collection.delete_many({"_id": {"$in": ids}, **query})).deleted_count
+                ids = []
+        if ids:
+            deleted += (await collection.delete_many({"_id": {"$in": ids}, **query})).deleted_count
+        return deleted
+
+    async def prune_untouched(self, batch_size: int = 1000) -> Dict[str, int]:
+        return {
+            "player_progress": await self._prune(self.database.player_progress, UNTOUCHED_PROGRESS, batch_size),
+            "player_achievements": await self._prune(self.database.player_achievements, UNTOUCHED_ACHIEVEMENTS, batch_size)
+        }
+
+    async def collection_stats(self) -> Dict[str, Dict[str, int]]:
+        stats = {}
+        for name in ("player_progress", "player_achievements"):
+            collection_stats = await self.database.command({"collStats": name})
+            stats[name] = {
+                "count": collection_stats.get("count", 0),
+                "size": collection_stats.get("size", 0),
+                "storageSize": collection_stats.get("storageSize", 0)
+            }
+        return stats
+
+    async def claim_idempotency_key(self, key: str, fingerprint: str, now: datetime, locked_until: datetime, expires_at: datetime) -> Optional[Dict[str, Any]]:
+        pending = {"fingerprint": fingerprint, "status": None, "headers": None, "body": None, "lockedUntil": locked_until, "expiresAt": expires_at}
+        try:
+            # One round trip: inserts the claim, or returns the stored record untouched
+            record = await self.database.idempotency_keys.find_one_and_update(
+                {"_id": key}, {"$setOnInsert": pending}, upsert=True, return_document=ReturnDocument.BEFORE
+            )
+        except DuplicateKeyError:
+            record = await self.database.idempotency_keys.find_one({"_id": key})
+        if record is None:
+            return None
+        record["key"] = record.pop("_id")
+        if not is_claimable(record, now):
+            return record
+        # The lock it was read with guards the takeover against another worker doing the same
+        taken = await self.database.idempotency_keys.update_one(
+            {"_id": key, "lockedUntil": record["lockedUntil"], "status": record["status"]}, {"$set": pending}
+        )
+        return None if taken.modified_count else record
+
+    async def complete_idempotency_key(self, key: str, status: int, headers: List[List[str]], body: bytes, expires_at: datetime):
+        await self.database.idempotency_keys.update_one(
+            {"_id": key}, {"$set": {"status": status, "headers": headers, "body": body, "expiresAt": expires_at}}
+        )
+
+    async def release_idempotency_key(self, key: str):
+        await self.database.idempotency_keys.delete_one({"_id": key, "status": None})
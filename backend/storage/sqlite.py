@@ -0,0 +1,403 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+import asyncio
+import json
+import os
+import sqlite3
+
+from level_stats import apply_increments
+from progress_format import apply_completion, apply_infinite_high, is_untouched_progress
+from storage.base import (
+    Completion, RunKey, ScoreKey, StorageBackend, apply_achievement_change, apply_achievement_stats, apply_unlocks,
+    is_claimable, is_untouched_achievements
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS player_progress (
+    player_id TEXT PRIMARY KEY,
+    doc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS player_achievements (
+    player_id TEXT PRIMARY KEY,
+    doc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS infinite_scores (
+    id TEXT PRIMARY KEY,
+    player_id TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    wave INTEGER NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS infinite_score_days (
+    day TEXT NOT NULL,
+    player_id TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    sum INTEGER NOT NULL,
+    best INTEGER NOT NULL,
+    best_wave INTEGER NOT NULL,
+    PRIMARY KEY (day, player_id)
+);
+CREATE TABLE IF NOT EXISTS level_stats (
+    level_id INTEGER PRIMARY KEY,
+    doc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leaderboard_windows (
+    window TEXT NOT NULL,
+    player_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    wave INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    expires_at TEXT NOT NULL,
+    PRIMARY KEY (window, player_id)
+);
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    status INTEGER,
+    headers TEXT,
+    body BLOB,
+    locked_until TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idempotency_keys_expires_at ON idempotency_keys (expires_at);
+CREATE INDEX IF NOT EXISTS leaderboard_windows_expires_at ON leaderboard_windows (expires_at);
+CREATE INDEX IF NOT EXISTS infinite_scores_score ON infinite_scores (score DESC, timestamp);
+CREATE INDEX IF NOT EXISTS infinite_scores_score_id ON infinite_scores (score DESC, id);
+CREATE INDEX IF NOT EXISTS infinite_scores_player ON infinite_scores (player_id, score DESC);
+CREATE INDEX IF NOT EXISTS infinite_scores_timestamp_id ON infinite_scores (timestamp, id);
+"""
+
+GET_PROGRESS = "SELECT doc FROM player_progress WHERE player_id = ?"
+INSERT_PROGRESS = "INSERT OR IGNORE INTO player_progress (player_id, doc) VALUES (?, ?)"
+SAVE_PROGRESS = "INSERT OR REPLACE INTO player_progress (player_id, doc) VALUES (?, ?)"
+PROGRESS_PAGE = "SELECT doc FROM player_progress WHERE player_id > ? ORDER BY player_id LIMIT ?"
+GET_ACHIEVEMENTS = "SELECT doc FROM player_achievements WHERE player_id = ?"
+SAVE_ACHIEVEMENTS = "INSERT OR REPLACE INTO player_achievements (player_id, doc) VALUES (?, ?)"
+ACHIEVEMENTS_PAGE = "SELECT doc FROM player_achievements WHERE player_id > ? ORDER BY player_id LIMIT ?"
+RAISE_WINDOW_BEST = """
+INSERT INTO leaderboard_windows (window, player_id, id, score, wave, timestamp, expires_at) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (window, player_id) DO UPDATE SET
+    id = excluded.id, score = excluded.score, wave = excluded.wave, timestamp = excluded.timestamp
+WHERE excluded.score > leaderboard_windows.score
+"""
+EXPIRE_WINDOWS = "DELETE FROM leaderboard_windows WHERE expires_at <= ?"
+WINDOW_BESTS = "SELECT id, player_id, score, wave, timestamp FROM leaderboard_windows WHERE window = ?"
+GET_LEVEL_STATS = "SELECT doc FROM level_stats WHERE level_id = ?"
+SAVE_LEVEL_STATS = "INSERT OR REPLACE INTO level_stats (level_id, doc) VALUES (?, ?)"
+SCORES_PAGE = "SELECT id, player_id, score, wave, timestamp FROM infinite_scores ORDER BY score DESC, id LIMIT ?"
+SCORES_PAGE_AFTER = """
+SELECT id, player_id, score, wave, timestamp FROM infinite_scores
+WHERE score <= ? AND (score < ? OR id > ?)
+ORDER BY score DESC, id LIMIT ?
+"""
+INSERT_SCORE = "INSERT OR IGNORE INTO infinite_scores (id, player_id, score, wave, timestamp) VALUES (?, ?, ?, ?, ?)"
+BEST_SCORES = """
+SELECT id, player_id, score, wave, timestamp FROM (
+    SELECT *, ROW_NUMBER() OVER (PARTITION BY player_id ORDER BY score DESC, timestamp) AS position
+    FROM infinite_scores
+) WHERE position = 1
+"""
+NEXT_SCORE_TIME = "SELECT MIN(timestamp) FROM infinite_scores WHERE timestamp >= ?"
+SUMMARIZE_SCORE_DAY = """
+INSERT OR IGNORE INTO infinite_score_days (day, player_id, count, sum, best, best_wave)
+SELECT ?, player_id, COUNT(*), SUM(score), MAX(score), MAX(wave) FROM infinite_scores
+WHERE timestamp >= ? AND timestamp < ? GROUP BY player_id
+"""
+SCORE_DAYS = "SELECT player_id, count, sum, best, best_wave FROM infinite_score_days WHERE day = ? ORDER BY player_id"
+RUNS_PAGE = """
+SELECT id, player_id, timestamp FROM infinite_scores
+WHERE timestamp < ? AND (timestamp, id) > (?, ?)
+ORDER BY timestamp, id LIMIT ?
+"""
+DELETE_COMPACTED_RUNS = """
+DELETE FROM infinite_scores WHERE player_id = ? AND timestamp >= ? AND timestamp < ?
+AND score < (SELECT MAX(score) FROM infinite_scores WHERE player_id = ?)
+"""
+EXPIRE_IDEMPOTENCY_KEYS = "DELETE FROM idempotency_keys WHERE expires_at <= ?"
+GET_IDEMPOTENCY_KEY = "SELECT fingerprint, status, headers, body, locked_until, expires_at FROM idempotency_keys WHERE key = ?"
+CLAIM_IDEMPOTENCY_KEY = """
+INSERT OR REPLACE INTO idempotency_keys (key, fingerprint, status, headers, body, locked_until, expires_at)
+VALUES (?, ?, NULL, NULL, NULL, ?, ?)
+"""
+COMPLETE_IDEMPOTENCY_KEY = "UPDATE idempotency_keys SET status = ?, headers = ?, body = ?, expires_at = ? WHERE key = ?"
+RELEASE_IDEMPOTENCY_KEY = "DELETE FROM idempotency_keys WHERE key = ? AND status IS NULL"
+
+
+def _dumps(document: Dict[str, Any]) -> str:
+    return json.dumps(document, separators=(",", ":"), default=lambda value: value.isoformat())
+
+
+class SQLiteStorage(StorageBackend):
+    """Embedded SQLite backend for single-node deployments.
+
+    All statements run on one dedicated thread, so each operation is a
+    serialized transaction and the event loop never blocks on disk. The
+    database uses WAL mode; documents are stored as JSON text with ISO
+    timestamps, which the models parse back on read.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.environ.get('SQLITE_PATH', 'nebula.db')
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._connection: Optional[sqlite3.Connection] = None
+
+    async def _run(self, function: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def _open(self):
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, cached_statements=64)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+        self._connection = connection
+
+    async def connect(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        await self._run(self._open)
+
+    async def close(self):
+        if self._executor:
+            await self._run(self._connection.close)
+            self._executor.shutdown()
+            self._executor = None
+
+    async def ping(self, connections: int = 1) -> bool:
+        # One connection serves every query, so there is nothing to warm
+        try:
+            await self._run(self._connection.execute, "SELECT 1")
+        except sqlite3.Error:
+            return False
+        return True
+
+    def _transaction(self, function: Callable, *args):
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            result = function(*args)
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+        return result
+
+    def _load(self, query: str, key: Any) -> Optional[Dict[str, Any]]:
+        row = self._connection.execute(query, (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def get_progress(self, player_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._load, GET_PROGRESS, player_id)
+
+    async def insert_progress(self, progress_data: Dict[str, Any]) -> bool:
+        def insert():
+            cursor = self._connection.execute(INSERT_PROGRESS, (progress_data["playerId"], _dumps(progress_data)))
+            return cursor.rowcount == 1
+        return await self._run(insert)
+
+    async def save_progress(self, player_id: str, progress_data: Dict[str, Any]):
+        await self._run(self._connection.execute, SAVE_PROGRESS, (player_id, _dumps(progress_data)))
+
+    async def progress_page(self, after: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        rows = await self._run(lambda: self._connection.execute(PROGRESS_PAGE, (after or "", limit)).fetchall())
+        return [json.loads(doc) for doc, in rows]
+
+    def _update_progress(self, player_id: str, defaults: Dict[str, Any], update: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        progress_data = self._load(GET_PROGRESS, player_id) or json.loads(_dumps(defaults))
+        update(progress_data)
+        self._connection.execute(SAVE_PROGRESS, (player_id, _dumps(progress_data)))
+        return progress_data
+
+    async def complete_level(self, player_id: str, completion: Completion, defaults: Dict[str, Any], played_at: datetime) -> Dict[str, Any]:
+        def update(progress_data):
+            apply_completion(progress_data, *completion, played_at)
+        return await self._run(self._transaction, self._update_progress, player_id, defaults, update)
+
+    async def apply_batch(self, player_id: str, completions: List[Completion], infinite_high: Optional[Tuple[int, int]], defaults: Dict[str, Any], played_at: datetime) -> Dict[str, Any]:
+        def update(progress_data):
+            for completion in completions:
+                apply_completion(progress_data, *completion, played_at)
+            if infinite_high:
+                apply_infinite_high(progress_data, *infinite_high, played_at)
+        return await self._run(self._transaction, self._update_progress, player_id, defaults, update)
+
+    async def raise_infinite_high(self, player_id: str, score: int, wave: int, defaults: Dict[str, Any], played_at: datetime):
+        def update(progress_data):
+            apply_infinite_high(progress_data, score, wave, played_at)
+        await self._run(self._transaction, self._update_progress, player_id, defaults, update)
+
+    async def insert_scores(self, scores: List[Dict[str, Any]]):
+        rows = [
+            (s["id"], s["playerId"], s["score"], s["wave"], s["timestamp"].isoformat())
+            for s in scores
+        ]
+        await self._run(self._transaction, self._connection.executemany, INSERT_SCORE, rows)
+
+    async def scores_page(self, after: Optional[ScoreKey], limit: int) -> List[Dict[str, Any]]:
+        def page():
+            if after:
+                return self._connection.execute(SCORES_PAGE_AFTER, (after[0], after[0], after[1], limit)).fetchall()
+            return self._connection.execute(SCORES_PAGE, (limit,)).fetchall()
+        return [
+            {"id": score_id, "playerId": player_id, "score": score, "wave": wave, "timestamp": timestamp}
+            for score_id, player_id, score, wave, timestamp in await self._run(page)
+        ]
+
+    async def best_scores(self) -> AsyncIterator[Dict[str, Any]]:
+        rows = await self._run(lambda: self._connection.execute(BEST_SCORES).fetchall())
+        for score_id, player_id, score, wave, timestamp in rows:
+            yield {"id": score_id, "playerId": player_id, "score": score, "wave": wave, "timestamp": timestamp}
+
+    async def next_score_time(self, after: Optional[datetime]) -> Optional[datetime]:
+        timestamp = (await self._run(lambda: self._connection.execute(NEXT_SCORE_TIME, ((after or datetime.min).isoformat(),)).fetchone()))[0]
+        return datetime.fromisoformat(timestamp) if timestamp else None
+
+    async def summarize_score_day(self, day: str, start: datetime, end: datetime):
+        await self._run(self._connection.execute, SUMMARIZE_SCORE_DAY, (day, start.isoformat(), end.isoformat()))
+
+    async def day_summaries(self, day: str) -> List[Dict[str, Any]]:
+        rows = await self._run(lambda: self._connection.execute(SCORE_DAYS, (day,)).fetchall())
+        return [
+            {"playerId": player_id, "day": day, "count": count, "sum": total, "best": best, "bestWave": best_wave}
+            for player_id, count, total, best, best_wave in rows
+        ]
+
+    async def runs_page(self, start: datetime, end: datetime, after: Optional[RunKey], limit: int) -> List[Dict[str, Any]]:
+        # The empty id sorts before every id, so the first page starts at `start` itself
+        position = (after[0].isoformat(), after[1]) if after else (start.isoformat(), "")
+        rows = await self._run(lambda: self._connection.execute(RUNS_PAGE, (end.isoformat(), *position, limit)).fetchall())
+        return [
+            {"id": score_id, "playerId": player_id, "timestamp": datetime.fromisoformat(timestamp)}
+            for score_id, player_id, timestamp in rows
+        ]
+
+    async def delete_compacted_runs(self, start: datetime, end: datetime, player_ids: List[str]) -> int:
+        rows = [(player_id, start.isoformat(), end.isoformat(), player_id) for player_id in player_ids]
+        return await self._run(self._transaction, lambda: self._connection.executemany(DELETE_COMPACTED_RUNS, rows).rowcount)
+
+    async def raise_window_bests(self, entries: List[Dict[str, Any]]):
+        rows = [
+            (e["window"], e["playerId"], e["id"], e["score"], e["wave"], e["timestamp"].isoformat(), e["expiresAt"].isoformat())
+            for e in entries
+        ]
+
+        def update():
+            self._connection.execute(EXPIRE_WINDOWS, (datetime.utcnow().isoformat(),))
+            self._connection.executemany(RAISE_WINDOW_BEST, rows)
+        await self._run(self._transaction, update)
+
+    async def window_bests(self, window: str) -> AsyncIterator[Dict[str, Any]]:
+        rows = await self._run(lambda: self._connection.execute(WINDOW_BESTS, (window,)).fetchall())
+        for score_id, player_id, score, wave, timestamp in rows:
+            yield {"id": score_id, "playerId": player_id, "score": score, "wave": wave, "timestamp": timestamp}
+
+    async def get_level_stats(self, level_id: int) -> Optional[Dict[str, Any]]:
+        return await self._run(self._load, GET_LEVEL_STATS, level_id)
+
+    async def increment_level_stats(self, level_id: int, increments: Dict[str, int]):
+        def update():
+            stats_data = self._load(GET_LEVEL_STATS, level_id) or {"levelId": level_id}
+            apply_increments(stats_data, increments)
+            self._connection.execute(SAVE_LEVEL_STATS, (level_id, _dumps(stats_data)))
+        await self._run(self._transaction, update)
+
+    async def save_level_stats(self, level_id: int, stats_data: Dict[str, Any]):
+        await self._run(self._connection.execute, SAVE_LEVEL_STATS, (level_id, _dumps(stats_data)))
+
+    async def get_achievements(self, player_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._load, GET_ACHIEVEMENTS, player_id)
+
+    async def save_achievements(self, player_id: str, achievements_data: Dict[str, Any]):
+        await self._run(self._connection.execute, SAVE_ACHIEVEMENTS, (player_id, _dumps(achievements_data)))
+
+    async def record_achievement_stats(self, player_id: str, increments: Dict[str, int], maximums: Dict[str, int], defaults: List[Dict[str, Any]], updated_at: datetime) -> Dict[str, Any]:
+        def update():
+            achievements_data = self._load(GET_ACHIEVEMENTS, player_id) or {
+                "playerId": player_id,
+                "achievements": json.loads(_dumps(defaults))
+            }
+            state = apply_achievement_stats(achievements_data, increments, maximums, updated_at)
+            self._connection.execute(SAVE_ACHIEVEMENTS, (player_id, _dumps(achievements_data)))
+            return state
+        return await self._run(self._transaction, update)
+
+    async def unlock_achievements(self, player_id: str, unlocks: List[Dict[str, Any]]):
+        def update():
+            achievements_data = self._load(GET_ACHIEVEMENTS, player_id)
+            if achievements_data is not None:
+                apply_unlocks(achievements_data, unlocks)
+                self._connection.execute(SAVE_ACHIEVEMENTS, (player_id, _dumps(achievements_data)))
+        await self._run(self._transaction, update)
+
+    async def achievements_page(self, after: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        rows = await self._run(lambda: self._connection.execute(ACHIEVEMENTS_PAGE, (after or "", limit)).fetchall())
+        return [json.loads(doc) for doc, in rows]
+
+    async def apply_achievement_changes(self, changes: List[Dict[str, Any]]):
+        def update():
+            for change in changes:
+                player_id = change["playerId"]
+                achievements_data = self._load(GET_ACHIEVEMENTS, player_id) or {
+                    "playerId": player_id,
+                    "achievements": json.loads(_dumps(change["defaults"] or []))
+                }
+                apply_achievement_change(achievements_data, change)
+                self._connection.execute(SAVE_ACHIEVEMENTS, (player_id, _dumps(achievements_data)))
+        await self._run(self._transaction, update)
+
+    def _prune(self, table: str, untouched: Callable[[Dict[str, Any]], bool], batch_size: int) -> int:
+        deleted = 0
+        after = ""
+        while True:
+            def prune_page():
+                rows = self._connection.execute(
+                    f"SELECT player_id, doc FROM {table} WHERE player_id > ? ORDER BY player_id LIMIT ?", (after, batch_size)
+                ).fetchall()
+                ids = [(player_id,) for player_id, doc in rows if untouched(json.loads(doc))]
+                self._connection.executemany(f"DELETE FROM {table} WHERE player_id = ?", ids)
+                return rows, len(ids)
+            rows, count = self._transaction(prune_page)
+            deleted += count
+            if len(rows) < batch_size:
+                return deleted
+            after = rows[-1][0]
+
+    async def prune_untouched(self, batch_size: int = 1000) -> Dict[str, int]:
+        return {
+            "player_progress": await self._run(self._prune, "player_progress", is_untouched_progress, batch_size),
+            "player_achievements": await self._run(self._prune, "player_achievements", is_untouched_achievements, batch_size)
+        }
+
+    async def collection_stats(self) -> Dict[str, Dict[str, int]]:
+        def stats():
+            return {
+                table: dict(zip(("count", "size"), self._connection.execute(
+                    f"SELECT COUNT(*), COALESCE(SUM(LENGTH(doc)), 0) FROM {table}"
+                ).fetchone()))
+                for table in ("player_progress", "player_achievements")
+            }
+        return await self._run(stats)
+
+    async def claim_idempotency_key(self, key: str, fingerprint: str, now: datetime, locked_until: datetime, expires_at: datetime) -> Optional[Dict[str, Any]]:
+        def claim():
+            self._connection.execute(EXPIRE_IDEMPOTENCY_KEYS, (now.isoformat(),))
+            row = self._connection.execute(GET_IDEMPOTENCY_KEY, (key,)).fetchone()
+            if row is not None:
+                stored_fingerprint, status, headers, body, stored_lock, stored_expiry = row
+                record = {
+                    "key": key, "fingerprint": stored_fingerprint, "status": status,
+                    "headers": json.loads(headers) if headers else None, "body": body,
+                    "lockedUntil": datetime.fromisoformat(stored_lock), "expiresAt": datetime.fromisoformat(stored_expiry)
+                }
+                if not is_claimable(record, now):
+                    return record
+            self._connection.execute(CLAIM_IDEMPOTENCY_KEY, (key, fingerprint, locked_until.isoformat(), expires_at.isoformat()))
+            return None
+        return await self._run(self._transaction, claim)
+
+    async def complete_idempotency_key(self, key: str, status: int, headers: List[List[str]], body: bytes, expires_at: datetime):
+        await self._run(self._connection.execute, COMPLETE_IDEMPOTENCY_KEY, (status, json.dumps(headers), body, expires_at.isoformat(), key))
+
+    async def release_idempotency_key(self, key: str):
+        await self._run(self._connection.execute, RELEASE_IDEMPOTENCY_KEY, (key,))
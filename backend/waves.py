@@ -0,0 +1,101 @@
+"""Deterministic infinite mode boards.
+
+Every cell of a wave's board comes from a stateless hash of (seed, wave,
+cell), so any board can be generated on its own, and many at once with
+NumPy. The frontend uses the same hash (generateWaveBoard in
+src/game/replay.js), so a shared seed gives every player the same
+waves, which is what daily challenges need. The rules match the old
+InfiniteScene.generateProceduralBubbles:
+- min(4 + wave // 3, 8) rows
+- four colours, plus light after wave 5 and dark after wave 10
+- a 70% fill chance, minus 10% per row
+"""
+from datetime import date, datetime
+from typing import Optional
+import hashlib
+import os
+
+import numpy as np
+
+from cache import MISSING, TTLCache
+from simulation import CELLS, COLS, ROWS
+
+_GOLDEN = np.uint32(0x9E3779B9)
+_CELL_ROWS = np.arange(CELLS) // COLS
+_FILL_CHANCE = 0.7 - _CELL_ROWS * 0.1
+_DRAWS = np.arange(CELLS, dtype=np.uint32) * np.uint32(2)
+
+
+def hash32(x: np.ndarray) -> np.ndarray:
+    """32-bit integer finaliser (lowbias32), elementwise on uint32 arrays"""
+    x = np.asarray(x, dtype=np.uint32)
+    with np.errstate(over="ignore"):
+        x = x ^ (x >> np.uint32(16))
+        x = x * np.uint32(0x7FEB352D)
+        x = x ^ (x >> np.uint32(15))
+        x = x * np.uint32(0x846CA68B)
+        return x ^ (x >> np.uint32(16))
+
+
+def generate_boards(seed: int, waves: np.ndarray) -> np.ndarray:
+    """Boards for many waves of one seed, as an int8 array of shape (len(waves), ROWS, COLS)"""
+    waves = np.asarray(waves, dtype=np.int64)
+    keys = hash32(np.uint32(seed) ^ hash32(waves.astype(np.uint32)))[:, None]
+    with np.errstate(over="ignore"):
+        fill = hash32(keys + _DRAWS * _GOLDEN) / 4294967296
+        color = hash32(keys + (_DRAWS + np.uint32(1)) * _GOLDEN) / 4294967296
+
+    rows = np.minimum(4 + waves // 3, 8)[:, None]
+    colors = (4 + (waves > 5) + (waves > 10))[:, None]
+    filled = (_CELL_ROWS < rows) & (fill < _FILL_CHANCE)
+    boards = np.where(filled, np.floor(color * colors) + 1, 0).astype(np.int8)
+    return boards.reshape(-1, ROWS, COLS)
+
+
+def generate_board(seed: int, wave: int) -> np.ndarray:
+    """Board of one wave as an int8 (ROWS, COLS) array"""
+    return generate_boards(seed, np.array([wave]))[0]
+
+
+def pack_board(board: np.ndarray) -> bytes:
+    """Row-major colour codes as ASCII digits, one per cell"""
+    return (board.ravel() + ord("0")).astype(np.uint8).tobytes()
+
+
+def daily_seed(day: Optional[date] = None) -> int:
+    """Seed everyone shares for a day's challenge"""
+    day = day or datetime.utcnow().date()
+    return int.from_bytes(hashlib.sha256(f"nebula-daily-{day.isoformat()}".encode()).digest()[:4], "little")
+
+
+class BoardCache:
+    """Bounded memo of packed boards keyed on (seed, wave).
+
+    Players go through waves in order, so a miss generates the next
+    `prefetch` waves of the seed in one vectorized call. Boards never
+    change; the TTL only keeps rarely played seeds from lingering.
+    """
+
+    def __init__(self, max_size: int = 4096, ttl: float = 86400.0, prefetch: int = 16):
+        self.cache = TTLCache(max_size=max_size, ttl=ttl)
+        self.prefetch = prefetch
+
+    def get(self, seed: int, wave: int) -> bytes:
+        """Get a wave's packed board"""
+        packed = self.cache.get((seed, wave))
+        if packed is not MISSING:
+            return packed
+
+        waves = np.arange(wave, wave + max(self.prefetch, 1))
+        boards = generate_boards(seed, waves)
+        for next_wave, board in zip(waves.tolist(), boards):
+            if self.cache.peek((seed, next_wave)) is MISSING:
+                self.cache.set((seed, next_wave), pack_board(board))
+        return pack_board(boards[0])
+
+    def stats(self):
+        """Get the cache counters"""
+        return self.cache.stats()
+
+
+board_cache = BoardCache(max_size=int(os.environ.get('BOARD_CACHE_SIZE', '4096')))
@@ -14,7 +14,7 @@ function App() {
   const [currentLevel, setCurrentLevel] = useState(1);
   const [gameMode, setGameMode] = useState("levels");
   const { toast } = useToast();
-  const { completeLevel, saveInfiniteScore, checkNewAchievements } = useGameData();
+  const { completeLevel, recordLevelAttempt, saveInfiniteScore, checkNewAchievements } = useGameData();
 
   const handleStartGame = (level = 1) => {
     setCurrentLevel(level);
@@ -33,7 +33,8 @@ function App() {
         levelData.level,
         levelData.score,
         levelData.stars,
-        50 - (levelData.shots || 0)
+        50 - (levelData.shots || 0),
+        levelData.replay
       );
 
       toast({
@@ -70,6 +71,8 @@ function App() {
   };
 
   const handleGameOver = (gameData) => {
+    recordLevelAttempt(gameData.level);
+
     toast({
       title: "Game Over 💫",
       description: `Better luck next time! Final score: ${gameData.score.toLocaleString()}`,
@@ -84,7 +87,7 @@ function App() {
 
   const handleInfiniteGameOver = async (gameData) => {
     try {
-      await saveInfiniteScore(gameData.score, gameData.wave);
+      await saveInfiniteScore(gameData.score, gameData.wave, gameData.replay);
 
       const messages = [];
 
@@ -275,8 +275,8 @@ export class BubbleGrid {
     // Generate new top row
     const colors = ['fire', 'water', 'earth', 'air', 'light', 'dark'];
     for (let col = 0; col < this.cols; col++) {
-      if (Math.random() < 0.8) { // 80% chance of bubble in new row
-        const color = colors[Math.floor(Math.random() * colors.length)];
+      if (this.scene.rng() < 0.8) { // 80% chance of bubble in new row
+        const color = colors[Math.floor(this.scene.rng() * colors.length)];
         this.createBubble(0, col, color);
       } else {
         this.grid[0][col] = null;
@@ -1,6 +1,7 @@
 import Phaser from 'phaser';
 import { BubbleGrid } from './BubbleGrid';
 import { Shooter } from './Shooter';
+import { ReplayRecorder } from './replay';
 import { mockLevels } from '../data/mockData';
 
 export class GameScene extends Phaser.Scene {
@@ -21,6 +22,8 @@ export class GameScene extends Phaser.Scene {
     this.score = 0;
     this.shots = 0;
     this.maxShots = mockLevels[this.currentLevel - 1]?.maxShots || 50;
+    this.replay = new ReplayRecorder(data.seed);
+    this.rng = this.replay.rng;
   }
 
   preload() {
@@ -208,6 +211,7 @@ export class GameScene extends Phaser.Scene {
     
     // Find position to place new bubble
     const gridPos = this.bubbleGrid.getGridPosition(bubble.x, bubble.y);
+    this.replay.land(gridPos.row, gridPos.col, this.bubbleGrid.cols);
     
     // Place bubble in grid
     this.bubbleGrid.placeBubble(gridPos.row, gridPos.col, projectile.bubbleType);
@@ -325,7 +329,8 @@ export class GameScene extends Phaser.Scene {
     this.game.events.emit('level-complete', {
       level: this.currentLevel,
       score: this.score,
-      stars: stars
+      stars: stars,
+      replay: this.replay.snapshot()
     });
   }
 
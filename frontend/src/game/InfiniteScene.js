@@ -1,6 +1,7 @@
 import Phaser from 'phaser';
 import { BubbleGrid } from './BubbleGrid';
 import { Shooter } from './Shooter';
+import { ReplayRecorder, generateWaveBoard } from './replay';
 import { gameAPI } from '../services/api';
 
 export class InfiniteScene extends Phaser.Scene {
@@ -19,13 +20,15 @@ export class InfiniteScene extends Phaser.Scene {
     this.isGameOver = false;
   }
 
-  init() {
+  init(data) {
     this.score = 0;
     this.wave = 1;
     this.bubblesCleared = 0;
     this.dropInterval = 30000;
     this.speedMultiplier = 1;
     this.isGameOver = false;
+    this.replay = new ReplayRecorder(data?.seed);
+    this.rng = this.replay.rng;
   }
 
   preload() {
@@ -174,23 +177,15 @@ export class InfiniteScene extends Phaser.Scene {
     // Clear existing bubbles
     this.bubbleGrid.clearGrid();
     
-    // Generate based on wave difficulty
-    const rows = Math.min(4 + Math.floor(this.wave / 3), 8);
-    const colors = ['fire', 'water', 'earth', 'air'];
-    
-    // Add more colors as waves progress
-    if (this.wave > 5) colors.push('light');
-    if (this.wave > 10) colors.push('dark');
-    
-    for (let row = 0; row < rows; row++) {
-      for (let col = 0; col < 10; col++) {
-        // Procedural generation with some randomness
-        if (Math.random() < 0.7 - (row * 0.1)) {
-          const color = colors[Math.floor(Math.random() * colors.length)];
+    // Boards depend only on seed and wave, so a shared seed makes a daily challenge
+    const board = generateWaveBoard(this.replay.seed, this.wave, this.bubbleGrid.rows, this.bubbleGrid.cols);
+    board.forEach((cells, row) => {
+      cells.forEach((color, col) => {
+        if (color) {
           this.bubbleGrid.createBubble(row, col, color);
         }
-      }
-    }
+      });
+    });
   }
 
   createUI() {
@@ -276,6 +271,7 @@ export class InfiniteScene extends Phaser.Scene {
     
     // Find position to place new bubble
     const gridPos = this.bubbleGrid.getGridPosition(bubble.x, bubble.y);
+    this.replay.land(gridPos.row, gridPos.col, this.bubbleGrid.cols);
     
     // Place bubble in grid
     this.bubbleGrid.placeBubble(gridPos.row, gridPos.col, projectile.bubbleType);
@@ -432,7 +428,9 @@ export class InfiniteScene extends Phaser.Scene {
     
     // Drop new row after warning
     this.time.delayedCall(3000, () => {
+      if (this.isGameOver) return;
       this.bubbleGrid.dropNewRow();
+      this.replay.drop();
       this.hideDropWarning();
       
       if (this.bubbleGrid.reachedBottom()) {
@@ -492,8 +490,10 @@ export class InfiniteScene extends Phaser.Scene {
     }
     
     this.game.events.emit('infinite-game-over', {
-      score: this.score,
+      // Speed multipliers make the running score fractional
+      score: Math.floor(this.score),
       wave: this.wave,
+      replay: this.replay.snapshot(),
       isNewHighScore,
       isNewHighWave
     });
@@ -37,7 +37,7 @@ export class Shooter {
 
   createBubble() {
     const types = ['fire', 'water', 'earth', 'air', 'light', 'dark'];
-    const randomType = types[Math.floor(Math.random() * types.length)];
+    const randomType = types[Math.floor(this.scene.rng() * types.length)];
     
     const bubble = this.scene.add.image(0, 0, `bubble-${randomType}`);
     bubble.bubbleType = randomType;
@@ -51,14 +51,14 @@ export class Shooter {
     const existingTypes = this.getExistingBubbleTypes();
     
     if (existingTypes.length > 0) {
-      const randomType = existingTypes[Math.floor(Math.random() * existingTypes.length)];
+      const randomType = existingTypes[Math.floor(this.scene.rng() * existingTypes.length)];
       
       if (this.currentBubble) {
         this.currentBubble.setTexture(`bubble-${randomType}`);
         this.currentBubble.bubbleType = randomType;
       }
       
-      const nextRandomType = existingTypes[Math.floor(Math.random() * existingTypes.length)];
+      const nextRandomType = existingTypes[Math.floor(this.scene.rng() * existingTypes.length)];
       if (this.nextBubble) {
         this.nextBubble.setTexture(`bubble-${nextRandomType}`);
         this.nextBubble.bubbleType = nextRandomType;
@@ -156,6 +156,9 @@ export class Shooter {
 
   shoot(pointer) {
     if (!this.currentBubble) return;
+    // One bubble in flight at a time keeps the move log replayable
+    if (this.projectile && this.projectile.active) return;
+    this.scene.replay.fire();
     
     const angle = Phaser.Math.Angle.Between(this.x, this.y - 35, pointer.x, pointer.y);
     const clampedAngle = Phaser.Math.Clamp(angle, -2.8, -0.3);
@@ -174,6 +177,12 @@ export class Shooter {
     
     projectile.body.setBounce(1, 0);
     projectile.body.setCollideWorldBounds(true, 0, 0, true, false);
+    this.projectile = projectile;
+    
+    // A bubble that never hits anything is lost rather than blocking the shooter
+    this.scene.time.delayedCall(6000, () => {
+      if (projectile.active) projectile.destroy();
+    });
     
     // Add to projectiles group if it exists
     if (this.scene.projectiles) {
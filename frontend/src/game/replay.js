@@ -0,0 +1,76 @@
+// Seeded randomness and move logging for server-side score verification.
+// Must stay in step with backend/simulation.py.
+
+export const FIRE = -2;
+export const DROP = -1;
+
+// mulberry32: small, fast and easy to reproduce bit-for-bit in Python
+export function createRng(seed) {
+  let state = seed >>> 0;
+  return () => {
+    let t = state += 0x6D2B79F5;
+    t = Math.imul(t ^ t >>> 15, t | 1);
+    t ^= t + Math.imul(t ^ t >>> 7, t | 61);
+    return ((t ^ t >>> 14) >>> 0) / 4294967296;
+  };
+}
+
+// Stateless 32-bit hash (lowbias32) behind the infinite mode boards
+function hash32(x) {
+  x ^= x >>> 16;
+  x = Math.imul(x, 0x7feb352d);
+  x ^= x >>> 15;
+  x = Math.imul(x, 0x846ca68b);
+  x ^= x >>> 16;
+  return x >>> 0;
+}
+
+// Board of an infinite mode wave, the same for every player on a seed.
+// Must stay in step with backend/waves.py.
+export function generateWaveBoard(seed, wave, rows = 12, cols = 10) {
+  const key = hash32((seed ^ hash32(wave)) >>> 0);
+  const filledRows = Math.min(4 + Math.floor(wave / 3), 8);
+  const colors = ['fire', 'water', 'earth', 'air'];
+  if (wave > 5) colors.push('light');
+  if (wave > 10) colors.push('dark');
+
+  const board = [];
+  for (let row = 0; row < rows; row++) {
+    board.push([]);
+    for (let col = 0; col < cols; col++) {
+      const cell = row * cols + col;
+      const fill = hash32((key + Math.imul(2 * cell, 0x9E3779B9)) >>> 0) / 4294967296;
+      const color = hash32((key + Math.imul(2 * cell + 1, 0x9E3779B9)) >>> 0) / 4294967296;
+      board[row].push(row < filledRows && fill < 0.7 - (row * 0.1) ? colors[Math.floor(color * colors.length)] : null);
+    }
+  }
+  return board;
+}
+
+export function randomSeed() {
+  return Math.floor(Math.random() * 4294967296);
+}
+
+export class ReplayRecorder {
+  constructor(seed = randomSeed()) {
+    this.seed = seed;
+    this.rng = createRng(seed);
+    this.moves = [];
+  }
+
+  fire() {
+    this.moves.push(FIRE);
+  }
+
+  drop() {
+    this.moves.push(DROP);
+  }
+
+  land(row, col, cols) {
+    this.moves.push(row * cols + col);
+  }
+
+  snapshot() {
+    return { seed: this.seed, moves: [...this.moves] };
+  }
+}
@@ -51,9 +51,9 @@ export const useGameData = () => {
   }, [toast]);
 
   // Complete a level
-  const completeLevel = useCallback(async (levelId, score, stars, shots) => {
+  const completeLevel = useCallback(async (levelId, score, stars, shots, replay) => {
     try {
-      const updatedProgress = await gameAPI.completeLevel(levelId, score, stars, shots);
+      const updatedProgress = await gameAPI.completeLevel(levelId, score, stars, shots, replay);
       setPlayerProgress(updatedProgress);
       
       // Update achievements
@@ -72,10 +72,19 @@ export const useGameData = () => {
     }
   }, [toast]);
 
+  // Report a failed level run for level statistics
+  const recordLevelAttempt = useCallback(async (levelId) => {
+    try {
+      await gameAPI.recordLevelAttempt(levelId);
+    } catch (err) {
+      console.error('Failed to record level attempt:', err);
+    }
+  }, []);
+
   // Save infinite score
-  const saveInfiniteScore = useCallback(async (score, wave) => {
+  const saveInfiniteScore = useCallback(async (score, wave, replay) => {
     try {
-      await gameAPI.saveInfiniteScore(score, wave);
+      await gameAPI.saveInfiniteScore(score, wave, replay);
       
       // Update local stats
       setInfiniteStats(prev => ({
@@ -153,6 +162,7 @@ export const useGameData = () => {
     
     // Actions
     completeLevel,
+    recordLevelAttempt,
     saveInfiniteScore,
     refreshData,
     
@@ -13,6 +13,18 @@ const getUserId = () => {
   return userId;
 };
 
+// One key per logical write, reused by its retries so the server applies it once
+const newIdempotencyKey = () => {
+  if (window.crypto?.randomUUID) {
+    return window.crypto.randomUUID();
+  }
+  return Math.random().toString(36).substr(2, 9) + '-' + Date.now();
+};
+
+// Retries of a POST that timed out, never got a response, or is still running elsewhere
+const MAX_POST_RETRIES = 2;
+const RETRY_DELAY_MS = 1000;
+
 // API client setup
 const apiClient = axios.create({
   baseURL: API,
@@ -22,16 +34,26 @@ const apiClient = axios.create({
   },
 });
 
-// Request interceptor to add user ID
+// Request interceptor to add user ID, and an idempotency key to POSTs
 apiClient.interceptors.request.use((config) => {
   config.headers['X-Player-ID'] = getUserId();
+  if (config.method === 'post' && !config.headers['Idempotency-Key']) {
+    config.headers['Idempotency-Key'] = newIdempotencyKey();
+  }
   return config;
 });
 
-// Response interceptor for error handling
+// Response interceptor for error handling; lost POSTs are retried with their key
 apiClient.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
+    const config = error.config;
+    const lost = !error.response || error.response.status === 409;
+    if (config?.method === 'post' && lost && (config.retryCount || 0) < MAX_POST_RETRIES) {
+      config.retryCount = (config.retryCount || 0) + 1;
+      await new Promise((resolve) => setTimeout(resolve, RETRY_DELAY_MS * config.retryCount));
+      return apiClient(config);
+    }
     console.error('API Error:', error.response?.data || error.message);
     return Promise.reject(error);
   }
@@ -55,6 +77,15 @@ export const gameAPI = {
     return response.data;
   },
 
+  async getLevelStats(levelId) {
+    const response = await apiClient.get(`/levels/${levelId}/stats`);
+    return response.data;
+  },
+
+  async recordLevelAttempt(levelId) {
+    await apiClient.post(`/levels/${levelId}/attempts`);
+  },
+
   // Player Progress
   async getPlayerProgress() {
     const userId = getUserId();
@@ -68,32 +99,53 @@ export const gameAPI = {
     return response.data;
   },
 
-  async completeLevel(levelId, score, stars, shots) {
+  async completeLevel(levelId, score, stars, shots, replay) {
     const userId = getUserId();
     const response = await apiClient.post(`/progress/${userId}/complete-level`, {
       levelId,
       score,
       stars,
-      shots
+      shots,
+      replay
     });
     return response.data;
   },
 
   // Infinite Mode
-  async getInfiniteHighscores(limit = 100) {
-    const response = await apiClient.get(`/infinite/highscores?limit=${limit}`);
+  // window is 'day', 'week' or 'all'
+  async getInfiniteHighscores(limit = 100, offset = 0, window = 'all') {
+    const response = await apiClient.get(`/infinite/highscores?limit=${limit}&offset=${offset}&window=${window}`);
     return response.data;
   },
 
-  async saveInfiniteScore(score, wave) {
+  async getInfiniteRank(radius = 2, window = 'all') {
+    const userId = getUserId();
+    const response = await apiClient.get(`/infinite/rank/${userId}?radius=${radius}&window=${window}`);
+    return response.data;
+  },
+
+  async getDailyChallenge() {
+    const response = await apiClient.get('/infinite/daily');
+    return response.data;
+  },
+
+  async saveInfiniteScore(score, wave, replay) {
     const userId = getUserId();
     const response = await apiClient.post(`/infinite/highscores/${userId}`, {
       score,
-      wave
+      wave,
+      replay
     });
     return response.data;
   },
 
+  // Offline sync - events are { type: 'level-complete' | 'infinite-score', ...payload }
+  async syncEvents(events) {
+    const userId = getUserId();
+    const response = await apiClient.post(`/sync/${userId}`, { events });
+    return response.data;
+  },
+
   // Achievements
   async getPlayerAchievements() {
     const userId = getUserId();
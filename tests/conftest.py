@@ -0,0 +1,103 @@
+"""Shared fixtures.
+
+Backend modules import each other by top-level name, as they do when
+uvicorn runs from the backend directory, so that directory goes on the path.
+"""
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+import asyncio
+import os
+import sys
+import uuid
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+STORAGE_KINDS = ("memory", "sqlite", "mongo")
+
+
+@lru_cache(maxsize=None)
+def mongo_url() -> Optional[str]:
+    """MONGO_URL, or localhost, if a mongod answers there; None otherwise"""
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+    client = MongoClient(url, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        return None
+    finally:
+        client.close()
+    return url
+
+
+def create_test_storage(kind: str, directory: Path):
+    """An unconnected backend of `kind` on throwaway data"""
+    if kind == "memory":
+        from storage.memory import MemoryStorage
+        return MemoryStorage()
+    if kind == "sqlite":
+        from storage.sqlite import SQLiteStorage
+        return SQLiteStorage(str(directory / "nebula.db"))
+    from storage.mongo import MongoStorage
+    return MongoStorage(mongo_url(), f"nebula_test_{uuid.uuid4().hex[:12]}")
+
+
+@asynccontextmanager
+async def opened(storage):
+    """Connect a test backend with its schema in place, and drop its data after"""
+    await storage.connect()
+    try:
+        await storage.ensure_schema("strict")
+        yield storage
+    finally:
+        if storage.name == "mongo":
+            await storage.client.drop_database(storage.db_name)
+        await storage.close()
+
+
+@pytest.fixture(params=STORAGE_KINDS)
+def with_storage(request, tmp_path):
+    """Run `scenario(storage)` on a fresh event loop against each backend.
+
+    The Mongo case is skipped when no mongod is reachable at MONGO_URL.
+    """
+    if request.param == "mongo" and not mongo_url():
+        pytest.skip("no mongod reachable at MONGO_URL")
+
+    def run(scenario):
+        async def main():
+            async with opened(create_test_storage(request.param, tmp_path)) as storage:
+                return await scenario(storage)
+        return asyncio.run(main())
+
+    return run
+
+
+@pytest.fixture
+def with_app():
+    """Run `scenario(client)` against the app on the memory backend, through its lifespan.
+
+    The app and its in-process state are module globals, so tests use
+    player ids of their own rather than expecting a fresh app.
+    """
+    os.environ.setdefault('STORAGE_BACKEND', 'memory')
+    os.environ.setdefault('REPLAY_WORKERS', '0')
+    import httpx
+    from server import app
+
+    def run(scenario):
+        async def main():
+            async with app.router.lifespan_context(app):
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    return await scenario(client)
+        return asyncio.run(main())
+
+    return run
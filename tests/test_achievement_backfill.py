@@ -0,0 +1,140 @@
+"""Achievement backfill, run against every backend through the `with_storage` fixture"""
+from datetime import datetime
+import asyncio
+
+import pytest
+
+from achievement_backfill import Checkpoint, RateLimiter, backfill_achievements, iter_players
+from achievements import DEFAULT_ACHIEVEMENT_DOCUMENTS
+from progress_format import default_progress, encode_progress
+
+PLAYED_AT = datetime(2026, 1, 5, 12, 0, 0)
+
+
+def defaults(player_id: str) -> dict:
+    return encode_progress(default_progress(player_id))
+
+
+def achievements_document(player_id: str, stats: dict) -> dict:
+    return {"playerId": player_id, "achievements": DEFAULT_ACHIEVEMENT_DOCUMENTS, "stats": stats}
+
+
+async def store_players(storage):
+    """p1 to p6: progress only, achievements only, both, or progress that needs no change"""
+    for player_id in ("p1", "p3", "p4", "p6"):
+        await storage.insert_progress(defaults(player_id))
+    for player_id in ("p1", "p3"):
+        await storage.complete_level(player_id, (1, 900, 3), defaults(player_id), PLAYED_AT)
+    await storage.complete_level("p4", (1, 500, 1), defaults("p4"), PLAYED_AT)
+    # p3 already has the stats its progress implies, p2 and p5 have no progress at all
+    await storage.save_achievements("p2", achievements_document("p2", {"levelsCompleted": 2}))
+    await storage.save_achievements("p3", achievements_document("p3", {"completedLevels": 1}))
+    await storage.save_achievements("p5", achievements_document("p5", {}))
+
+
+def unlocked(achievements_data: dict) -> set:
+    return {a["id"] for a in achievements_data["achievements"] if a.get("unlocked")}
+
+
+def test_iter_players_merges_both_streams(with_storage):
+    async def scenario(storage):
+        await store_players(storage)
+        players = [
+            (player_id, progress_data is not None, achievements_data is not None)
+            async for player_id, progress_data, achievements_data in iter_players(storage, batch_size=2)
+        ]
+        assert players == [
+            ("p1", True, False), ("p2", False, True), ("p3", True, True),
+            ("p4", True, False), ("p5", False, True), ("p6", True, False),
+        ]
+        assert [player async for player, *_ in iter_players(storage, after="p3", batch_size=2)] == ["p4", "p5", "p6"]
+
+    with_storage(scenario)
+
+
+def test_backfill_updates_every_player_once(with_storage, tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "backfill.json"))
+
+    async def scenario(storage):
+        await store_players(storage)
+        totals = await backfill_achievements(storage, checkpoint, batch_size=2)
+        assert totals["scanned"] == 6
+        assert checkpoint.load() is None
+
+        p1 = await storage.get_achievements("p1")
+        assert p1["stats"]["completedLevels"] == 1
+        assert p1["stats"]["perfectLevels"] == 1
+        assert {"first-steps"} <= unlocked(p1)
+        # p3's stored counter was already up to date, but first-steps was still locked
+        assert "first-steps" in unlocked(await storage.get_achievements("p3"))
+        # A default progress document implies nothing, so p6 keeps reading defaults
+        assert await storage.get_achievements("p6") is None
+
+        documents = {player_id: await storage.get_achievements(player_id) for player_id in ("p1", "p2", "p3", "p4", "p5")}
+        again = await backfill_achievements(storage, checkpoint, batch_size=2)
+        assert again == {"scanned": 6, "changed": 0}
+        assert {player_id: await storage.get_achievements(player_id) for player_id in documents} == documents
+        return totals
+
+    assert with_storage(scenario)["changed"] == 3
+
+
+def test_backfill_resumes_after_a_failed_write(with_storage, tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "backfill.json"))
+
+    async def scenario(storage):
+        await store_players(storage)
+        apply_changes = storage.apply_achievement_changes
+        written = []
+
+        async def failing(changes):
+            if len(written) == 1:
+                raise RuntimeError("write failed")
+            written.append([change["playerId"] for change in changes])
+            await apply_changes(changes)
+
+        storage.apply_achievement_changes = failing
+        with pytest.raises(RuntimeError):
+            await backfill_achievements(storage, checkpoint, batch_size=2, concurrency=1)
+        # Only the first batch, p1 and p2, was written
+        assert checkpoint.load() == {"after": "p2", "scanned": 2, "changed": 1}
+        assert (await storage.get_achievements("p4")) is None
+
+        storage.apply_achievement_changes = apply_changes
+        totals = await backfill_achievements(storage, checkpoint, batch_size=2, concurrency=1)
+        assert totals == {"scanned": 6, "changed": 3}
+        assert checkpoint.load() is None
+        assert (await storage.get_achievements("p4"))["stats"]["completedLevels"] == 1
+
+        restarted = await backfill_achievements(storage, checkpoint, batch_size=2, restart=True)
+        assert restarted == {"scanned": 6, "changed": 0}
+
+    with_storage(scenario)
+
+
+def test_rate_limiter_paces_units(monkeypatch):
+    now = [0.0]
+    waits = []
+
+    async def sleep(seconds):
+        waits.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+
+    async def scenario():
+        limiter = RateLimiter(10, clock=lambda: now[0])
+        await limiter.acquire(1)
+        await limiter.acquire(5)
+        await limiter.acquire(1)
+        # Idle time is not saved up for a later burst
+        now[0] += 5
+        await limiter.acquire(2)
+        await limiter.acquire(1)
+
+        unlimited = RateLimiter(0, clock=lambda: now[0])
+        for _ in range(100):
+            await unlimited.acquire(10)
+
+    asyncio.run(scenario())
+    assert waits == pytest.approx([0.1, 0.5, 0.2])
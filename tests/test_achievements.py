@@ -0,0 +1,24 @@
+"""Achievement counters fed through the API"""
+
+
+def test_unverified_bubble_counts_are_not_counted(with_app):
+    async def scenario(client):
+        completion = {"levelId": 1, "score": 900, "stars": 2, "shots": 10, "bubblesPopped": 10 ** 9}
+        response = await client.post("/api/progress/bubbles-unverified/complete-level", json=completion)
+        assert response.status_code == 200
+
+        achievements = (await client.get("/api/achievements/bubbles-unverified")).json()
+        destroyer = next(a for a in achievements["achievements"] if a["id"] == "bubble-destroyer")
+        assert not destroyer["unlocked"]
+        assert achievements["stats"].get("bubblesPopped", 0) == 0
+        assert achievements["stats"]["completedLevels"] == 1
+
+    with_app(scenario)
+
+
+def test_negative_bubble_counts_are_rejected(with_app):
+    async def scenario(client):
+        response = await client.post("/api/infinite/highscores/bubbles-negative", json={"score": 100, "wave": 1, "bubblesPopped": -5})
+        assert response.status_code == 422
+
+    with_app(scenario)
@@ -0,0 +1,98 @@
+"""Admission control through the app: shed requests are told when to retry, others go through on time"""
+import asyncio
+import time
+
+import pytest
+
+from admission import InFlightLimit, admission
+from benchmarks.baseline import percentile
+
+
+@pytest.fixture
+def fresh_in_flight(monkeypatch):
+    """Swap in an in-flight limit, whose semaphore binds to the test's event loop"""
+    def install(limit: int, budget: float) -> InFlightLimit:
+        in_flight = InFlightLimit(limit, budget)
+        monkeypatch.setattr(admission, "in_flight", in_flight)
+        return in_flight
+    return install
+
+
+def completion(index: int) -> dict:
+    return {"levelId": 1, "score": 500 + index, "stars": 1, "shots": 10}
+
+
+def test_flooding_player_is_throttled_while_others_succeed(with_app, fresh_in_flight):
+    fresh_in_flight(64, 1.0)
+    burst = int(admission.limits["complete-level"][1])
+
+    async def scenario(client):
+        flood = [client.post("/api/progress/admission-abuser/complete-level", json=completion(i)) for i in range(burst * 3)]
+        others = [client.post(f"/api/progress/admission-player-{i}/complete-level", json=completion(i)) for i in range(20)]
+        responses = await asyncio.gather(*flood, *others)
+        flooded, regular = responses[:len(flood)], responses[len(flood):]
+
+        throttled = [r for r in flooded if r.status_code == 429]
+        assert len(throttled) >= len(flood) - burst - 1
+        assert all(int(r.headers["Retry-After"]) >= 1 for r in throttled)
+        assert {r.status_code for r in flooded} <= {200, 429}
+        assert [r.status_code for r in regular] == [200] * len(regular)
+
+    with_app(scenario)
+
+
+def test_flooding_player_does_not_hold_up_others(with_app, fresh_in_flight, monkeypatch):
+    # Slow writes through a few slots, so every admitted request holds up the ones behind it
+    limit, delay, flood_size = 4, 0.01, 200
+    fresh_in_flight(limit, 5.0)
+
+    async def scenario(client):
+        from database import database
+        storage = database.storage
+        complete = storage.complete_level
+
+        async def slow_complete_level(*args):
+            await asyncio.sleep(delay)
+            return await complete(*args)
+        monkeypatch.setattr(storage, "complete_level", slow_complete_level)
+
+        async def timed(request):
+            start = time.perf_counter()
+            response = await request
+            return response, time.perf_counter() - start
+
+        flood = [timed(client.post("/api/progress/admission-flooder/complete-level", json=completion(i))) for i in range(flood_size)]
+        others = [timed(client.post(f"/api/progress/admission-waiter-{i}/complete-level", json=completion(i))) for i in range(20)]
+        regular = (await asyncio.gather(*flood, *others))[flood_size:]
+        assert [r.status_code for r, _ in regular] == [200] * len(regular)
+        return percentile(sorted(latency for _, latency in regular), 99)
+
+    # Only the flooder's burst gets ahead of the others, not the whole flood,
+    # which would take flood_size * delay / limit to get through the slots
+    assert with_app(scenario) < flood_size * delay / limit / 2
+
+
+def test_overload_is_shed_with_retry_after(with_app, fresh_in_flight, monkeypatch):
+    fresh_in_flight(4, 0.02)
+
+    async def scenario(client):
+        from database import database
+        storage = database.storage
+        load = storage.get_progress
+
+        async def slow_get_progress(player_id):
+            await asyncio.sleep(0.05)
+            return await load(player_id)
+        monkeypatch.setattr(storage, "get_progress", slow_get_progress)
+
+        responses = await asyncio.gather(*(client.get(f"/api/progress/admission-reader-{i}") for i in range(40)))
+        shed = [r for r in responses if r.status_code == 503]
+        assert shed
+        assert all(int(r.headers["Retry-After"]) >= 1 for r in shed)
+        assert {r.status_code for r in responses} == {200, 503}
+        assert sum(r.status_code == 200 for r in responses) >= 4
+
+        # Once the burst has drained, requests are admitted again
+        assert (await client.get("/api/progress/admission-reader-after")).status_code == 200
+
+    with_app(scenario)
@@ -0,0 +1,14 @@
+"""Every component benchmark runs end to end at a small size"""
+import asyncio
+
+import pytest
+
+from benchmarks.scenarios import SCENARIOS, format_results, run_scenario
+
+
+@pytest.mark.parametrize("name", list(SCENARIOS))
+def test_scenario_runs_small(name):
+    result = asyncio.run(run_scenario(name, size=200))
+    assert result["results"]
+    assert all(isinstance(value, (int, float)) for value in result["results"].values())
+    assert format_results(result).startswith(f"{name} at size 200")
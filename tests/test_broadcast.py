@@ -0,0 +1,175 @@
+"""Messages between workers, with two Broadcast instances standing in for two workers"""
+from datetime import datetime
+import asyncio
+import socket
+
+import pytest
+
+import database
+from broadcast import PEER_REFRESH, Broadcast
+from models import InfiniteScore
+from storage.memory import MemoryStorage
+
+
+async def delivered(condition, timeout: float = 2.0):
+    """Let the loop run the socket readers until `condition()` holds"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "message not delivered"
+        await asyncio.sleep(0.005)
+
+
+def recorder(worker: Broadcast, topic: str) -> list:
+    received = []
+    worker.subscribe(topic, received.append)
+    return received
+
+
+def test_publish_reaches_other_workers_only(tmp_path):
+    async def scenario():
+        first, second, third = Broadcast(), Broadcast(), Broadcast()
+        for name, worker in (("first", first), ("second", second), ("third", third)):
+            worker.start(str(tmp_path), name)
+        try:
+            own = recorder(first, "progress")
+            seconds = recorder(second, "progress")
+            thirds = recorder(third, "progress")
+            others = recorder(second, "achievements")
+
+            first.publish("progress", "p1")
+            await delivered(lambda: seconds and thirds)
+            assert seconds == thirds == ["p1"]
+            assert own == [] and others == []
+            assert first.stats() == {"peers": 2, "sent": 2, "received": 0, "dropped": 0}
+            assert second.stats()["received"] == 1
+        finally:
+            for worker in (first, second, third):
+                worker.stop()
+        assert list(tmp_path.iterdir()) == []
+
+    asyncio.run(scenario())
+
+
+def test_dead_peers_are_dropped_and_forgotten(tmp_path):
+    now = [0.0]
+
+    async def scenario():
+        worker, peer = Broadcast(clock=lambda: now[0]), Broadcast()
+        worker.start(str(tmp_path), "worker")
+        peer.start(str(tmp_path), "peer")
+        # A worker that was killed leaves its socket file behind
+        dead = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        dead.bind(str(tmp_path / "dead.sock"))
+        dead.close()
+        try:
+            received = recorder(peer, "progress")
+            worker.publish("progress", "p1")
+            await delivered(lambda: received)
+            assert (worker.sent, worker.dropped) == (1, 1)
+
+            # The failure forces a fresh listing, which no longer finds the removed socket
+            (tmp_path / "dead.sock").unlink()
+            worker.publish("progress", "p2")
+            await delivered(lambda: len(received) == 2)
+            assert (worker.sent, worker.dropped) == (2, 1)
+            assert worker.stats()["peers"] == 1
+
+            # Otherwise the listing is reused until PEER_REFRESH has passed
+            late = Broadcast()
+            late.start(str(tmp_path), "late")
+            assert worker.stats()["peers"] == 1
+            now[0] += PEER_REFRESH
+            assert worker.stats()["peers"] == 2
+            late.stop()
+        finally:
+            worker.stop()
+            peer.stop()
+
+    asyncio.run(scenario())
+
+
+def test_full_peer_buffers_drop_and_count(tmp_path):
+    async def scenario():
+        worker, peer = Broadcast(), Broadcast()
+        worker.start(str(tmp_path), "worker")
+        peer.start(str(tmp_path), "peer")
+        try:
+            received = recorder(peer, "bulk")
+            # The peer cannot read until this loop yields, so its queue fills up
+            for _ in range(2000):
+                worker.publish("bulk", "x" * 1000)
+            assert worker.dropped > 0
+            assert worker.sent + worker.dropped == 2000
+            await delivered(lambda: len(received) == worker.sent)
+        finally:
+            worker.stop()
+            peer.stop()
+
+    asyncio.run(scenario())
+
+
+def test_bad_messages_do_not_stop_delivery(tmp_path):
+    async def scenario():
+        worker, peer = Broadcast(), Broadcast()
+        worker.start(str(tmp_path), "worker")
+        peer.start(str(tmp_path), "peer")
+        try:
+            received = recorder(peer, "progress")
+            peer.subscribe("score", lambda payload: payload["missing"])
+            sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sender.sendto(b"not json", str(tmp_path / "peer.sock"))
+            sender.close()
+            worker.publish("score", {})
+            worker.publish("progress", "p1")
+            await delivered(lambda: received)
+            assert peer.received == 3
+        finally:
+            worker.stop()
+            peer.stop()
+
+    asyncio.run(scenario())
+
+
+def test_unstarted_broadcast_sends_nothing():
+    worker = Broadcast()
+    worker.start(None)
+    worker.publish("progress", "p1")
+    assert not worker.open
+    assert worker.stats() == {"peers": 0, "sent": 0, "received": 0, "dropped": 0}
+
+
+@pytest.fixture
+def worker_broadcast(monkeypatch):
+    """A Broadcast of its own for the Database under test, in place of the app's"""
+    worker = Broadcast()
+    monkeypatch.setattr(database, "broadcast", worker)
+    return worker
+
+
+def test_database_applies_peer_scores_without_publishing_them(worker_broadcast, tmp_path):
+    score = InfiniteScore(playerId="p1", score=4200, wave=7, timestamp=datetime.utcnow())
+
+    async def scenario():
+        db = database.Database(MemoryStorage())
+        peer = Broadcast()
+        worker_broadcast.start(str(tmp_path), "worker")
+        peer.start(str(tmp_path), "peer")
+        try:
+            echoed = recorder(peer, "score")
+            peer.publish("score", score)
+            await delivered(lambda: db.leaderboard.get("p1") is not None)
+            assert db.leaderboard.get("p1") == score
+            assert all(windowed.current().get("p1") == score for windowed in db.window_leaderboards.values())
+            # Applied locally only, so it is not sent back around
+            assert worker_broadcast.sent == 0
+
+            # A run submitted on this worker does reach the peer
+            db.submit_score(InfiniteScore(playerId="p2", score=100, wave=1, timestamp=score.timestamp))
+            await delivered(lambda: echoed)
+            assert [s["playerId"] for s in echoed] == ["p2"]
+        finally:
+            worker_broadcast.stop()
+            peer.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,55 @@
+"""Level catalog reloads and compiled responses"""
+from pathlib import Path
+import json
+
+import pytest
+
+import catalog as catalog_module
+from catalog import LevelCatalog, accepts_gzip
+
+LEVEL = json.loads((Path(catalog_module.__file__).parent / "data" / "levels.json").read_text(encoding="utf-8"))["levels"][0]
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", True),
+    ("gzip, deflate, br", True),
+    ("br;q=1.0, gzip;q=0.5", True),
+    ("GZIP", True),
+    ("*", True),
+    ("gzip;q=0", False),
+    ("gzip; q=0.000", False),
+    ("*;q=0.5, gzip;q=0", False),
+    ("x-gzip", False),
+    ("deflate, br", False),
+    ("", False),
+    (None, False),
+])
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(header) is expected
+
+
+def test_malformed_reload_keeps_previous_version(tmp_path):
+    path = tmp_path / "levels.json"
+    path.write_text(json.dumps({"version": 1, "levels": [LEVEL]}))
+    catalog = LevelCatalog(path, reload_interval=0)
+    catalog.load()
+
+    for levels in ([1], [{**LEVEL, "maxShots": "many"}], None):
+        path.write_text(json.dumps({"version": 2, "levels": levels}))
+        catalog._mtime = 0.0
+        assert catalog.catalog() is not None
+        assert catalog.version == 1
+        assert [level.id for level in catalog.levels] == [1]
+
+
+def test_levels_refuse_gzip_at_zero_quality(with_app):
+    async def scenario(client):
+        refused = await client.get("/api/levels/1", headers={"Accept-Encoding": "gzip;q=0, identity"})
+        gzipped = await client.get("/api/levels/1", headers={"Accept-Encoding": "gzip"})
+        return refused, gzipped
+
+    refused, gzipped = with_app(scenario)
+    assert "content-encoding" not in refused.headers
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert refused.headers["vary"] == gzipped.headers["vary"] == "Accept-Encoding"
+    assert refused.json() == gzipped.json()
@@ -0,0 +1,168 @@
+"""Single-flight coalescing and micro-caching, with a counting endpoint and a fake clock"""
+import asyncio
+import json
+
+import pytest
+
+from coalesce import Coalescer
+
+TTL = 0.25
+STALE = 2.0
+
+
+class Endpoint:
+    """Counts its calls and, when `held`, keeps each one waiting until `release()`"""
+
+    def __init__(self, held: bool = True):
+        self.calls = 0
+        self.held = held
+        self.gate = asyncio.Event()
+        self.failing = False
+
+    async def __call__(self, limit: int):
+        self.calls += 1
+        call = self.calls
+        if self.held:
+            await self.gate.wait()
+        if self.failing:
+            raise RuntimeError("storage down")
+        return {"limit": limit, "call": call}
+
+    def release(self):
+        self.gate.set()
+        self.gate = asyncio.Event()
+
+
+def body(raw: bytes) -> dict:
+    return json.loads(raw)
+
+
+@pytest.fixture
+def clock():
+    now = [0.0]
+    clock = lambda: now[0]  # noqa: E731
+    clock.now = now
+    return clock
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_concurrent_requests_share_one_call(clock):
+    async def scenario():
+        endpoint = Endpoint()
+        coalescer = Coalescer("top", endpoint, TTL, STALE, 100, clock=clock)
+        waiting = [asyncio.ensure_future(coalescer.get({"limit": 10})) for _ in range(5)]
+        other = asyncio.ensure_future(coalescer.get({"limit": 20}))
+        await settle()
+        assert endpoint.calls == 2
+
+        endpoint.release()
+        results = await asyncio.gather(*waiting, other)
+        assert {body(r)["call"] for r in results[:5]} == {1}
+        assert body(results[5]) == {"limit": 20, "call": 2}
+        # A caller going away does not cancel the shared call
+        cancelled = asyncio.ensure_future(coalescer.get({"limit": 30}))
+        kept = asyncio.ensure_future(coalescer.get({"limit": 30}))
+        await settle()
+        cancelled.cancel()
+        endpoint.release()
+        assert body(await kept)["call"] == 3
+        return coalescer.stats()
+
+    assert asyncio.run(scenario()) == {"size": 3, "hits": 0, "staleHits": 0, "coalesced": 5, "calls": 3}
+
+
+def test_results_expire_after_ttl_and_stale(clock):
+    async def scenario():
+        endpoint = Endpoint(held=False)
+        coalescer = Coalescer("top", endpoint, TTL, STALE, 100, clock=clock)
+
+        assert body(await coalescer.get({"limit": 10}))["call"] == 1
+        clock.now[0] = TTL - 0.01
+        assert body(await coalescer.get({"limit": 10}))["call"] == 1
+        assert endpoint.calls == 1
+
+        # Past both windows the next request waits for a new call
+        clock.now[0] = TTL + STALE
+        assert body(await coalescer.get({"limit": 10}))["call"] == 2
+        assert coalescer.stats()["hits"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_stale_results_are_served_while_one_refresh_runs(clock):
+    async def scenario():
+        endpoint = Endpoint()
+        coalescer = Coalescer("top", endpoint, TTL, STALE, 100, clock=clock)
+        first = asyncio.ensure_future(coalescer.get({"limit": 10}))
+        await settle()
+        endpoint.release()
+        assert body(await first)["call"] == 1
+
+        clock.now[0] = TTL + 0.1
+        stale = [await coalescer.get({"limit": 10}) for _ in range(3)]
+        assert {body(r)["call"] for r in stale} == {1}
+        await settle()
+        assert endpoint.calls == 2
+
+        endpoint.release()
+        await settle()
+        assert body(await coalescer.get({"limit": 10}))["call"] == 2
+        assert coalescer.stats()["staleHits"] == 3
+
+        # A failed refresh keeps serving the stale body until it runs out, and errors are never cached
+        clock.now[0] += TTL + 0.1
+        endpoint.failing = True
+        assert body(await coalescer.get({"limit": 10}))["call"] == 2
+        await settle()
+        endpoint.release()
+        await settle()
+        clock.now[0] += STALE
+        endpoint.held = False
+        with pytest.raises(RuntimeError):
+            await coalescer.get({"limit": 10})
+        with pytest.raises(RuntimeError):
+            await coalescer.get({"limit": 10})
+        assert endpoint.calls == 5
+
+    asyncio.run(scenario())
+
+
+def test_invalidate_drops_a_pending_call(clock):
+    async def scenario():
+        endpoint = Endpoint()
+        coalescer = Coalescer("top", endpoint, TTL, STALE, 100, clock=clock)
+        before = asyncio.ensure_future(coalescer.get({"limit": 10}))
+        await settle()
+
+        # A write lands while the read is in flight
+        coalescer.invalidate(limit=10)
+        after = asyncio.ensure_future(coalescer.get({"limit": 10}))
+        await settle()
+        assert endpoint.calls == 2
+
+        endpoint.release()
+        assert body(await before)["call"] == 1
+        assert body(await after)["call"] == 2
+        # Only the call that started after the write was cached
+        assert body(await coalescer.get({"limit": 10}))["call"] == 2
+        assert endpoint.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_least_recently_used_results_are_evicted(clock):
+    async def scenario():
+        endpoint = Endpoint(held=False)
+        coalescer = Coalescer("top", endpoint, TTL, STALE, 2, clock=clock)
+        for limit in (1, 2, 1, 3):
+            await coalescer.get({"limit": limit})
+        assert endpoint.calls == 3
+        await coalescer.get({"limit": 1})
+        await coalescer.get({"limit": 2})
+        assert endpoint.calls == 4
+
+    asyncio.run(scenario())
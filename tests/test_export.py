@@ -0,0 +1,42 @@
+"""NDJSON export, on a scaled-down table, through the `with_storage` fixture"""
+from datetime import datetime, timedelta
+import json
+import tracemalloc
+
+from export import export_scores
+
+RUNS = 20000
+BATCH_SIZE = 200
+
+
+def test_export_scores_streams_in_order(with_storage):
+    start = datetime(2026, 1, 5)
+    scores = [
+        {"id": f"s{index:05d}", "playerId": f"p{index % 97}", "score": index * 7919 % 1000, "wave": index % 40,
+         "timestamp": start + timedelta(seconds=index)}
+        for index in range(RUNS)
+    ]
+    expected = [s["id"] for s in sorted(scores, key=lambda s: (-s["score"], s["id"]))]
+
+    async def scenario(storage):
+        await storage.insert_scores(scores)
+        # Rows are checked as they arrive, so the test itself holds no more than a chunk
+        count = size = 0
+        tracemalloc.start()
+        try:
+            async for chunk in export_scores(storage, BATCH_SIZE):
+                lines = chunk.decode().splitlines()
+                assert len(lines) <= BATCH_SIZE
+                for line in lines:
+                    assert json.loads(line)["id"] == expected[count]
+                    count += 1
+                size += len(chunk)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return count, size, peak
+
+    count, size, peak = with_storage(scenario)
+    assert count == RUNS
+    # Only a batch is held at a time, never the whole export
+    assert peak < size / 4
@@ -0,0 +1,99 @@
+"""All-time and windowed infinite mode leaderboards"""
+from datetime import datetime, timedelta
+
+from leaderboard import Leaderboard, WindowedLeaderboard
+from models import InfiniteScore
+
+# A Wednesday, so the day and week windows end at different times
+NOW = datetime(2026, 1, 7, 12, 0, 0)
+
+
+def run(player_id: str, score: int, timestamp: datetime = NOW) -> InfiniteScore:
+    return InfiniteScore(playerId=player_id, score=score, wave=score // 100, timestamp=timestamp)
+
+
+def players(board: Leaderboard) -> list:
+    return [score.playerId for score in board.top()]
+
+
+def test_ties_go_to_the_earliest_run():
+    board = Leaderboard()
+    board.submit(run("late", 500, NOW + timedelta(minutes=5)))
+    board.submit(run("early", 500, NOW))
+    board.submit(run("best", 900, NOW + timedelta(hours=1)))
+    assert players(board) == ["best", "early", "late"]
+    assert [board.rank(player) for player in ("best", "early", "late")] == [1, 2, 3]
+
+    # Matching their own best later does not move a player
+    assert not board.submit(run("early", 500, NOW + timedelta(hours=2)))
+    assert board.get("early").timestamp == NOW
+    assert [(r.rank, r.playerId) for r in board.ranked(1, 10)] == [(2, "early"), (3, "late")]
+
+
+def test_a_better_run_replaces_the_lower_one():
+    board = Leaderboard()
+    first = run("p1", 300)
+    board.submit(first)
+    board.submit(run("p2", 400))
+    assert board.rank("p1") == 2
+
+    better = run("p1", 800, NOW + timedelta(minutes=1))
+    assert board.submit(better)
+    assert not board.submit(run("p1", 600, NOW + timedelta(minutes=2)))
+    assert len(board) == 2
+    assert board.get("p1") == better
+    assert players(board) == ["p1", "p2"]
+
+    # load keeps the same best per player as submitting one by one
+    loaded = Leaderboard()
+    loaded.load([first, run("p2", 400), better, run("p1", 600, NOW + timedelta(minutes=2))])
+    assert [(s.playerId, s.score) for s in loaded.top()] == [("p1", 800), ("p2", 400)]
+
+    assert board.remove("p1") and not board.remove("p1")
+    assert board.rank("p1") is None and board.rank("p2") == 1
+
+
+def test_window_rolls_over_to_an_empty_board():
+    now = [NOW]
+    day = WindowedLeaderboard("day", clock=lambda: now[0])
+    week = WindowedLeaderboard("week", clock=lambda: now[0])
+    for windowed in (day, week):
+        assert windowed.submit(run("p1", 500))
+        # Runs from before the window started are ignored
+        assert not windowed.submit(run("p2", 900, NOW - timedelta(days=3)))
+    assert (day.id, week.id) == ("day:2026-01-07", "week:2026-01-05")
+
+    now[0] = NOW + timedelta(days=1)
+    assert len(day.current()) == 0 and day.id == "day:2026-01-08"
+    assert players(week.current()) == ["p1"]
+    # A run of the old day that arrives late does not land on the new board
+    assert not day.submit(run("p3", 700, NOW))
+
+    now[0] = datetime(2026, 1, 12)
+    assert len(week.current()) == 0 and week.id == "week:2026-01-12"
+    assert week.submit(run("p2", 100, now[0]))
+    assert players(week.current()) == ["p2"]
+
+
+def test_entries_keep_the_best_run_per_window_until_it_expires():
+    day = WindowedLeaderboard("day", clock=lambda: NOW)
+    week = WindowedLeaderboard("week", clock=lambda: NOW)
+    scores = [
+        run("p1", 300, NOW),
+        run("p1", 700, NOW + timedelta(hours=1)),
+        run("p1", 700, NOW + timedelta(hours=2)),
+        run("p1", 200, NOW + timedelta(days=1)),
+        run("p2", 400, NOW),
+    ]
+
+    entries = {(e["window"], e["playerId"]): e for e in day.entries(scores)}
+    assert sorted(entries) == [("day:2026-01-07", "p1"), ("day:2026-01-07", "p2"), ("day:2026-01-08", "p1")]
+    assert entries["day:2026-01-07", "p1"]["id"] == scores[1].id
+    # One window length after the window ends
+    assert entries["day:2026-01-07", "p1"]["expiresAt"] == datetime(2026, 1, 9)
+    assert entries["day:2026-01-08", "p1"]["expiresAt"] == datetime(2026, 1, 10)
+
+    weekly = {(e["window"], e["playerId"]): e for e in week.entries(scores)}
+    assert sorted(weekly) == [("week:2026-01-05", "p1"), ("week:2026-01-05", "p2")]
+    assert weekly["week:2026-01-05", "p1"]["score"] == 700
+    assert weekly["week:2026-01-05", "p1"]["expiresAt"] == datetime(2026, 1, 19)
@@ -0,0 +1,55 @@
+"""Level stats backfill, run against every backend through the `with_storage` fixture"""
+from datetime import datetime
+
+import pytest
+
+import database
+from broadcast import Broadcast
+from level_stats import completion_increments, counter_fields
+from progress_format import default_progress, encode_progress
+
+PLAYED_AT = datetime(2026, 1, 5, 12, 0, 0)
+
+
+@pytest.fixture(autouse=True)
+def worker_broadcast(monkeypatch):
+    """Keep the Database under test off the app's Broadcast"""
+    monkeypatch.setattr(database, "broadcast", Broadcast())
+
+
+def test_counter_fields_inverts_increments():
+    stats_data = {"levelId": 1, "attempts": 3, "completions": 2, "stars": {"1": 1, "3": 1}, "scores": {"0": 2}}
+    assert counter_fields(stats_data) == {"attempts": 3, "completions": 2, "stars.1": 1, "stars.3": 1, "scores.0": 2}
+    assert counter_fields(None) == {}
+
+
+def test_backfill_keeps_completions_recorded_during_the_scan(with_storage):
+    async def scenario(storage):
+        for player_id, completions in (("p1", [(1, 900, 3), (2, 500, 1)]), ("p2", [(1, 3000, 2)])):
+            defaults = encode_progress(default_progress(player_id))
+            await storage.insert_progress(defaults)
+            for completion in completions:
+                await storage.complete_level(player_id, completion, defaults, PLAYED_AT)
+        # Counters that drifted from the stored progress
+        await storage.save_level_stats(1, {"levelId": 1, "attempts": 50, "completions": 5, "stars": {"3": 5}, "scores": {"0": 5}})
+
+        scan = storage.iter_progress
+
+        async def live_completion_during_scan(batch_size):
+            async for progress_data in scan(batch_size):
+                yield progress_data
+                # Players the scan does not read complete level 1 meanwhile
+                await storage.increment_level_stats(1, completion_increments(7600, 1))
+
+        storage.iter_progress = live_completion_during_scan
+        db = database.Database(storage)
+        assert await db.backfill_level_stats(batch_size=1) == 2
+
+        level_1 = await db.get_level_stats(1)
+        assert (level_1.attempts, level_1.completions) == (4, 4)
+        assert level_1.stars == [0, 2, 1, 1]
+        assert level_1.scoreBuckets[:4] == [1, 1, 0, 2]
+        level_2 = await db.get_level_stats(2)
+        assert (level_2.attempts, level_2.stars) == (1, [0, 1, 0, 0])
+
+    with_storage(scenario)
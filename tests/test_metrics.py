@@ -0,0 +1,30 @@
+"""Metric families and the Mongo command listener"""
+from types import SimpleNamespace
+
+import pytest
+
+from metrics import Metric, MongoCommandListener
+
+
+def command_event(request_id: int, command_name: str = "find", collection: str = "player_progress"):
+    return SimpleNamespace(
+        connection_id=("localhost", 27017), request_id=request_id, command_name=command_name,
+        command={command_name: collection}, duration_micros=1500
+    )
+
+
+def test_metric_needs_child_and_samples():
+    with pytest.raises(TypeError):
+        Metric("nebula_test", "Incomplete family")
+
+
+def test_listener_drops_unfinished_commands():
+    listener = MongoCommandListener(max_pending=3)
+    # Commands on a closed connection are started but never succeed or fail
+    for request_id in range(10):
+        listener.started(command_event(request_id))
+    assert len(listener._collections) == 3
+
+    listener.succeeded(command_event(9))
+    listener.failed(command_event(8))
+    assert list(listener._collections) == [(("localhost", 27017), 7)]
@@ -0,0 +1,107 @@
+"""Score retention, run against every backend through the `with_storage` fixture"""
+from datetime import datetime, timedelta
+
+from score_compaction import compact_scores
+
+NOW = datetime(2026, 3, 1, 12, 0, 0)
+FIRST_DAY = datetime(2026, 1, 5)
+SECOND_DAY = datetime(2026, 1, 6)
+RECENT = datetime(2026, 2, 20)
+
+
+def run(score_id: str, player_id: str, value: int, timestamp: datetime) -> dict:
+    return {"id": score_id, "playerId": player_id, "score": value, "wave": value // 100, "timestamp": timestamp}
+
+
+RUNS = [
+    # p1's best is tied on the first day, and beaten nowhere else
+    run("a1", "p1", 500, FIRST_DAY + timedelta(hours=1)),
+    run("a2", "p1", 900, FIRST_DAY + timedelta(hours=2)),
+    run("a3", "p1", 900, FIRST_DAY + timedelta(hours=3)),
+    run("a4", "p1", 300, FIRST_DAY + timedelta(hours=4)),
+    run("a5", "p1", 200, SECOND_DAY + timedelta(hours=1)),
+    run("a6", "p1", 100, RECENT),
+    run("b1", "p2", 400, FIRST_DAY + timedelta(hours=5)),
+    run("b2", "p2", 700, SECOND_DAY + timedelta(hours=2)),
+    run("b3", "p2", 650, SECOND_DAY + timedelta(hours=3)),
+    run("c1", "p3", 50, RECENT),
+    run("c2", "p3", 60, RECENT + timedelta(hours=1)),
+    run("d1", "p4", 1000, SECOND_DAY + timedelta(hours=4)),
+]
+KEPT = {"a2", "a3", "a6", "b2", "c1", "c2", "d1"}
+SUMMARIES = {
+    "2026-01-05": [
+        {"playerId": "p1", "day": "2026-01-05", "count": 4, "sum": 2600, "best": 900, "bestWave": 9},
+        {"playerId": "p2", "day": "2026-01-05", "count": 1, "sum": 400, "best": 400, "bestWave": 4},
+    ],
+    "2026-01-06": [
+        {"playerId": "p1", "day": "2026-01-06", "count": 1, "sum": 200, "best": 200, "bestWave": 2},
+        {"playerId": "p2", "day": "2026-01-06", "count": 2, "sum": 1350, "best": 700, "bestWave": 7},
+        {"playerId": "p4", "day": "2026-01-06", "count": 1, "sum": 1000, "best": 1000, "bestWave": 10},
+    ],
+}
+
+
+async def leaderboard(storage) -> list:
+    return sorted([(s["playerId"], s["id"], s["score"]) async for s in storage.best_scores()])
+
+
+async def stored_ids(storage) -> set:
+    return {s["id"] for s in await storage.scores_page(None, len(RUNS) + 1)}
+
+
+async def summaries(storage) -> dict:
+    return {day: await storage.day_summaries(day) for day in SUMMARIES}
+
+
+def test_compaction_keeps_bests_and_summarizes_days(with_storage):
+    async def scenario(storage):
+        await storage.insert_scores(RUNS)
+        before = await leaderboard(storage)
+
+        totals = await compact_scores(storage, history_days=30, batch_size=2, now=NOW)
+        assert totals == {"days": 2, "players": 5, "deleted": 5}
+        assert await stored_ids(storage) == KEPT
+        assert await summaries(storage) == SUMMARIES
+        assert await leaderboard(storage) == before
+        # The earliest of p1's tied bests still leads the board
+        assert ("p1", "a2", 900) in before
+
+        # A second pass finds only personal bests and keeps the summaries
+        again = await compact_scores(storage, history_days=30, batch_size=2, now=NOW)
+        assert again["deleted"] == 0
+        assert await stored_ids(storage) == KEPT
+        assert await summaries(storage) == SUMMARIES
+        assert await leaderboard(storage) == before
+
+    with_storage(scenario)
+
+
+def test_rerun_finishes_an_interrupted_day(with_storage):
+    async def scenario(storage):
+        await storage.insert_scores(RUNS)
+        before = await leaderboard(storage)
+
+        # Stopped after summarizing the first day and trimming only p1's runs of it
+        await storage.summarize_score_day("2026-01-05", FIRST_DAY, SECOND_DAY)
+        assert await storage.delete_compacted_runs(FIRST_DAY, SECOND_DAY, ["p1"]) == 2
+
+        totals = await compact_scores(storage, history_days=30, batch_size=2, now=NOW)
+        assert totals["deleted"] == 3
+        assert await stored_ids(storage) == KEPT
+        # The first day's summaries still count the runs deleted before the rerun
+        assert await summaries(storage) == SUMMARIES
+        assert await leaderboard(storage) == before
+
+    with_storage(scenario)
+
+
+def test_runs_inside_the_retention_window_are_kept(with_storage):
+    async def scenario(storage):
+        await storage.insert_scores(RUNS)
+        totals = await compact_scores(storage, history_days=90, batch_size=2, now=NOW)
+        assert totals == {"days": 0, "players": 0, "deleted": 0}
+        assert await stored_ids(storage) == {r["id"] for r in RUNS}
+        assert await summaries(storage) == {day: [] for day in SUMMARIES}
+
+    with_storage(scenario)
@@ -0,0 +1,49 @@
+"""Write-behind score buffer"""
+import asyncio
+
+from database import ScoreWriteBuffer
+
+
+def run_buffer(failures: int, documents: int = 5, max_retries: int = 3):
+    written = []
+    attempts = 0
+
+    async def flush(batch):
+        nonlocal attempts
+        attempts += 1
+        if attempts <= failures:
+            raise ConnectionError("transient")
+        written.extend(batch)
+
+    async def main():
+        writer = ScoreWriteBuffer(batch_size=documents, max_delay=0.01, max_retries=max_retries, retry_delay=0.001)
+        writer.start(flush)
+        for index in range(documents):
+            await writer.put({"id": index})
+        await writer.close()
+        return writer
+
+    return asyncio.run(main()), written, attempts
+
+
+def test_transient_failures_are_retried():
+    writer, written, attempts = run_buffer(failures=2)
+    assert [document["id"] for document in written] == list(range(5))
+    assert attempts == 3
+    assert writer.stats() == {"pending": 0, "flushed": 5, "retried": 10, "dropped": 0, "retrying": False}
+
+
+def test_batch_is_dropped_after_bounded_retries():
+    writer, written, attempts = run_buffer(failures=100, max_retries=2)
+    assert written == []
+    assert attempts == 3
+    assert (writer.flushed, writer.failed) == (0, 5)
+
+
+def test_ready_reports_score_writes(with_app):
+    async def scenario(client):
+        response = await client.get("/api/ready")
+        assert response.status_code == 200
+        assert set(response.json()["scoreWrites"]) == {"pending", "flushed", "retried", "dropped", "retrying"}
+
+    with_app(scenario)
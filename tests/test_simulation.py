@@ -0,0 +1,156 @@
+"""Replay engine, checked against the frontend's game code.
+
+The generator values come from createRng in frontend src/game/replay.js.
+fixtures/client_games.json holds games played by the frontend's
+GameScene, InfiniteScene, BubbleGrid and Shooter classes, with the seed
+and moves their ReplayRecorder logged and the score they reported.
+"""
+from pathlib import Path
+import asyncio
+import json
+
+import pydantic
+import pytest
+
+from models import ScoreReplay
+from simulation import (
+    COLS, DROP, FIRE, MAX_REPLAY_MOVES, MAX_SHOTS_PER_DROP, GameSimulation, ReplayError, ReplayVerifier, flood,
+    grid_to_masks, level_masks, mulberry32, replay_infinite, replay_level, _search_order
+)
+import numpy as np
+
+CLIENT_GAMES = json.loads((Path(__file__).parent / "fixtures" / "client_games.json").read_text())
+LEVEL_GAMES = [game for game in CLIENT_GAMES if game["mode"] == "level"]
+INFINITE_GAME = next(game for game in CLIENT_GAMES if game["mode"] == "infinite")
+
+JS_RANDOM = {
+    0: [0.26642920868471265, 0.0003297457005828619, 0.2232720274478197, 0.1462021479383111, 0.46732782293111086],
+    1: [0.6270739405881613, 0.002735721180215478, 0.5274470399599522, 0.9810509674716741, 0.9683778982143849],
+    42: [0.6011037519201636, 0.44829055899754167, 0.8524657934904099, 0.6697340414393693, 0.17481389874592423],
+    123456789: [0.2577907438389957, 0.9707721115555614, 0.7853280142880976, 0.20616457983851433, 0.30307188746519387],
+    0xFFFFFFFF: [0.8964226141106337, 0.189478256739676, 0.7156526781618595, 0.9440599093213677, 0.8452364315744489],
+}
+
+
+def board(*rows: str) -> np.ndarray:
+    """A grid from rows of colour digits, '.' for empty cells, padded with empty rows"""
+    grid = np.zeros((12, COLS), dtype=np.int8)
+    for row, cells in enumerate(rows):
+        grid[row] = [0 if cell == "." else int(cell) for cell in cells]
+    return grid
+
+
+def cells(*positions) -> int:
+    return sum(1 << (row * COLS + col) for row, col in positions)
+
+
+@pytest.mark.parametrize("seed", sorted(JS_RANDOM))
+def test_mulberry32_matches_js(seed):
+    random = mulberry32(seed)
+    assert [random() for _ in JS_RANDOM[seed]] == JS_RANDOM[seed]
+
+
+def test_flood_follows_hex_neighbours():
+    masks = grid_to_masks(board(
+        "1.......11",
+        "1..1.....1",
+        "1...1.....",
+        "...1......",
+    ))
+    # Even rows lean left: (2, 4) touches (1, 3) above it, and (3, 3) below touches (2, 4)
+    assert flood(cells((1, 3)), masks[1]) == cells((1, 3), (2, 4), (3, 3))
+    # Odd rows lean right: (1, 0) touches (0, 0) above it and (2, 0) below it
+    assert flood(cells((0, 0)), masks[1]) == cells((0, 0), (1, 0), (2, 0))
+    # The last column does not wrap onto the first column of the next row
+    assert flood(cells((0, 9)), masks[1]) == cells((0, 8), (0, 9), (1, 9))
+    assert flood(cells((5, 5)), masks[1]) == 0
+
+
+def test_search_order_matches_find_nearest_empty():
+    # Boxes of growing radius, row by row, clipped to the grid
+    assert _search_order(0)[:9] == (0, 1, 10, 11, 2, 12, 20, 21, 22)
+    assert _search_order(119)[:4] == (119, 108, 109, 118)
+    assert len(_search_order(0)) == 25
+    assert len(_search_order(5 * COLS + 5)) == 81
+    assert len(set(_search_order(57))) == len(_search_order(57))
+
+
+def test_landing_pops_matches_and_drops_floating_bubbles():
+    game = GameSimulation(grid_to_masks(board(
+        "2.........",
+        "11........",
+        "3.........",
+    )), mulberry32(1))
+    game.in_flight = 1
+    # (1, 1) is taken, so the bubble lands in (0, 1), the next free cell of the search
+    game.land(1 * COLS + 1)
+    # Three fire bubbles pop, and the earth bubble hanging from them falls
+    assert game.score == 3 * 100 + 50
+    assert game.popped == 4
+    assert game.occupied == cells((0, 0))
+    assert game.shots == 1
+
+
+@pytest.mark.parametrize("game", LEVEL_GAMES, ids=lambda game: f"level-{game['levelId']}")
+def test_client_level_game_replays_to_its_result(game):
+    result = replay_level(game["levelId"], game["maxShots"], game["seed"], game["moves"])
+    assert (int(result.score), result.stars, result.finished) == (game["score"], game["stars"], True)
+    verified = asyncio.run(ReplayVerifier(workers=0).verify_level(
+        game["levelId"], game["maxShots"], game["score"], game["stars"], game["seed"], game["moves"]
+    ))
+    assert verified == result
+
+
+def test_client_infinite_game_replays_to_its_result():
+    # The run clears three waves, so later shots score with the wave multiplier
+    game = INFINITE_GAME
+    result = replay_infinite(game["seed"], game["moves"])
+    assert (int(result.score), result.wave, result.finished) == (game["score"], game["wave"], True)
+    asyncio.run(ReplayVerifier(workers=0).verify_infinite(game["score"], game["wave"], game["seed"], game["moves"]))
+
+
+@pytest.mark.parametrize("moves, message", [
+    ([31], "without being fired"),
+    ([FIRE, 120], "off the grid"),
+    ([FIRE, -3], "off the grid"),
+    ([FIRE, DROP], "do not drop"),
+    (LEVEL_GAMES[0]["moves"] + [FIRE], "after the game ended"),
+])
+def test_invalid_level_moves(moves, message):
+    with pytest.raises(ReplayError, match=message):
+        replay_level(1, 50, 42, moves)
+
+
+def test_verifier_rejects_claims_the_replay_does_not_support():
+    game = LEVEL_GAMES[0]
+    verifier = ReplayVerifier(workers=0)
+    args = (game["levelId"], game["maxShots"])
+    with pytest.raises(ReplayError, match="does not clear"):
+        asyncio.run(verifier.verify_level(*args, game["score"], game["stars"], game["seed"], game["moves"][:-2]))
+    with pytest.raises(ReplayError, match="does not match"):
+        asyncio.run(verifier.verify_level(*args, game["score"] + 100, game["stars"], game["seed"], game["moves"]))
+    with pytest.raises(ReplayError, match="does not match"):
+        asyncio.run(verifier.verify_level(*args, game["score"], game["stars"] + 1, game["seed"], game["moves"]))
+
+    game = INFINITE_GAME
+    with pytest.raises(ReplayError, match="does not end"):
+        asyncio.run(verifier.verify_infinite(game["score"], game["wave"], game["seed"], game["moves"][:-40]))
+    with pytest.raises(ReplayError, match="does not match"):
+        asyncio.run(verifier.verify_infinite(game["score"], game["wave"] + 1, game["seed"], game["moves"]))
+
+
+def test_infinite_runs_are_bounded():
+    with pytest.raises(ReplayError, match="longer than a real game"):
+        replay_infinite(1, [FIRE] * (MAX_REPLAY_MOVES + 1))
+    # Rows keep dropping during a real run
+    with pytest.raises(ReplayError, match="between rows dropping"):
+        replay_infinite(1, [FIRE] * (MAX_SHOTS_PER_DROP + 1))
+    with pytest.raises(pydantic.ValidationError):
+        ScoreReplay(seed=1, moves=[FIRE] * (MAX_REPLAY_MOVES + 1))
+    assert len(ScoreReplay(seed=1, moves=[FIRE] * MAX_REPLAY_MOVES).moves) == MAX_REPLAY_MOVES
+
+
+def test_level_masks_match_board_patterns():
+    masks = level_masks(1)
+    assert masks[1] == cells(*((row, col) for row in range(4) for col in range(COLS) if (row + col) % 2 == 0))
+    assert masks[2] == cells(*((row, col) for row in range(4) for col in range(COLS) if (row + col) % 2 == 1))
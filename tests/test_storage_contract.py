@@ -0,0 +1,217 @@
+"""StorageBackend contract, run against every backend through the `with_storage` fixture"""
+from datetime import datetime, timedelta
+import asyncio
+
+from progress_format import LEVEL_COUNT, apply_completion, default_progress, encode_progress
+
+PLAYED_AT = datetime(2026, 1, 5, 12, 0, 0)
+
+
+def defaults(player_id: str) -> dict:
+    return encode_progress(default_progress(player_id))
+
+
+def score(score_id: str, player_id: str, value: int, timestamp: datetime = PLAYED_AT) -> dict:
+    return {"id": score_id, "playerId": player_id, "score": value, "wave": value // 100, "timestamp": timestamp}
+
+
+def test_complete_level_creates_and_raises(with_storage):
+    async def scenario(storage):
+        first = await storage.complete_level("p1", (1, 500, 2), defaults("p1"), PLAYED_AT)
+        assert first["stars"][0] == "2"
+        assert first["totalStars"] == 2
+        assert first["totalScore"] == 500
+        assert first["bestScores"] == {"1": 500}
+        assert first["completedMask"] == 0b1
+        assert first["currentLevel"] == 2
+
+        # A worse run keeps stars and best score, but still counts towards the total
+        second = await storage.complete_level("p1", (1, 300, 1), defaults("p1"), PLAYED_AT)
+        assert second["stars"][0] == "2"
+        assert second["totalStars"] == 2
+        assert second["bestScores"] == {"1": 500}
+        assert second["totalScore"] == 800
+
+        third = await storage.complete_level("p1", (5, 900, 3), defaults("p1"), PLAYED_AT)
+        assert third["stars"][:5] == "20003"
+        assert third["totalStars"] == 5
+        assert third["completedMask"] == 0b10001
+        assert third["unlockedMask"] == 0b100111
+        assert third["currentLevel"] == 6
+
+        last = await storage.complete_level("p1", (LEVEL_COUNT, 100, 1), defaults("p1"), PLAYED_AT)
+        assert last["completedMask"] == 0b10001 | 1 << (LEVEL_COUNT - 1)
+        assert last["unlockedMask"] == 0b100111
+        assert (await storage.get_progress("p1"))["totalScore"] == 1800
+
+    with_storage(scenario)
+
+
+def test_apply_batch_matches_sequential_completions(with_storage):
+    completions = [(1, 400, 1), (2, 700, 3), (1, 600, 3)]
+
+    async def scenario(storage):
+        batched = await storage.apply_batch("batch", completions, (4200, 7), defaults("batch"), PLAYED_AT)
+        for completion in completions:
+            await storage.complete_level("single", completion, defaults("single"), PLAYED_AT)
+        await storage.raise_infinite_high("single", 4200, 7, defaults("single"), PLAYED_AT)
+        single = await storage.get_progress("single")
+
+        for field in ("stars", "totalStars", "totalScore", "bestScores", "completedMask", "unlockedMask",
+                      "currentLevel", "infiniteHighScore", "infiniteHighWave"):
+            assert batched[field] == single[field], field
+        assert batched["totalStars"] == 6
+        assert batched["bestScores"] == {"1": 600, "2": 700}
+
+        # Nothing but an infinite high score still creates the document
+        only_score = await storage.apply_batch("scores", [], (100, 2), defaults("scores"), PLAYED_AT)
+        assert (only_score["infiniteHighScore"], only_score["completedMask"]) == (100, 0)
+
+    with_storage(scenario)
+
+
+def test_raise_infinite_high_only_raises(with_storage):
+    async def scenario(storage):
+        await storage.raise_infinite_high("p1", 5000, 10, defaults("p1"), PLAYED_AT)
+        await storage.raise_infinite_high("p1", 3000, 12, defaults("p1"), PLAYED_AT)
+        progress_data = await storage.get_progress("p1")
+        assert progress_data["infiniteHighScore"] == 5000
+        assert progress_data["infiniteHighWave"] == 12
+        assert progress_data["stars"] == "0" * LEVEL_COUNT
+
+    with_storage(scenario)
+
+
+def test_scores_page_walks_ties_by_id(with_storage):
+    scores = [score(f"s{index:02d}", f"p{index % 4}", 1000 - index // 3 * 100) for index in range(14)]
+    expected = sorted(scores, key=lambda s: (-s["score"], s["id"]))
+
+    async def scenario(storage):
+        await storage.insert_scores(scores[7:])
+        await storage.insert_scores(scores[:7])
+        seen = []
+        after = None
+        while True:
+            page = await storage.scores_page(after, 4)
+            seen.extend(page)
+            if len(page) < 4:
+                break
+            after = (page[-1]["score"], page[-1]["id"])
+        assert [s["id"] for s in seen] == [s["id"] for s in expected]
+        assert [s["score"] for s in seen] == [s["score"] for s in expected]
+
+    with_storage(scenario)
+
+
+def test_runs_page_walks_a_time_range(with_storage):
+    start = datetime(2026, 1, 5)
+    end = start + timedelta(days=1)
+    scores = [
+        score(f"r{index:02d}", f"p{index % 3}", 100 + index, start + timedelta(hours=index // 2 * 6))
+        for index in range(10)
+    ]
+    expected = sorted((s for s in scores if start <= s["timestamp"] < end), key=lambda s: (s["timestamp"], s["id"]))
+
+    async def scenario(storage):
+        await storage.insert_scores(scores)
+        seen = []
+        after = None
+        while True:
+            page = await storage.runs_page(start, end, after, 3)
+            seen.extend(page)
+            if len(page) < 3:
+                break
+            after = (page[-1]["timestamp"], page[-1]["id"])
+        assert [run["id"] for run in seen] == [s["id"] for s in expected]
+        assert all(set(run) == {"id", "playerId", "timestamp"} for run in seen)
+
+    with_storage(scenario)
+
+
+def test_idempotency_claim_complete_release(with_storage):
+    now = datetime(2026, 1, 5, 12, 0, 0)
+    lock = now + timedelta(seconds=30)
+    expiry = now + timedelta(hours=24)
+
+    async def scenario(storage):
+        assert await storage.claim_idempotency_key("k1", "f1", now, lock, expiry) is None
+
+        pending = await storage.claim_idempotency_key("k1", "f1", now, lock, expiry)
+        assert (pending["fingerprint"], pending["status"]) == ("f1", None)
+
+        await storage.complete_idempotency_key("k1", 200, [["content-type", "application/json"]], b'{"ok":true}', expiry)
+        # A stored response is not released, and is returned to every later claim
+        await storage.release_idempotency_key("k1")
+        stored = await storage.claim_idempotency_key("k1", "f1", now, lock, expiry)
+        assert stored["status"] == 200
+        assert bytes(stored["body"]) == b'{"ok":true}'
+        assert stored["headers"] == [["content-type", "application/json"]]
+
+        # A released claim can be taken again
+        assert await storage.claim_idempotency_key("k2", "f2", now, lock, expiry) is None
+        await storage.release_idempotency_key("k2")
+        assert await storage.claim_idempotency_key("k2", "f2", now, lock, expiry) is None
+
+        # A pending claim past its lock, and any record past its expiry, are claimed over
+        later = lock + timedelta(seconds=1)
+        assert await storage.claim_idempotency_key("k2", "f2", later, later + timedelta(seconds=30), expiry) is None
+        expired = expiry + timedelta(seconds=1)
+        assert await storage.claim_idempotency_key(
+            "k1", "f1", expired, expired + timedelta(seconds=30), expired + timedelta(hours=24)
+        ) is None
+
+    with_storage(scenario)
+
+
+def test_prune_untouched_keeps_played_documents(with_storage):
+    async def scenario(storage):
+        assert await storage.insert_progress(defaults("idle"))
+        assert not await storage.insert_progress(defaults("idle"))
+        await storage.complete_level("played", (1, 100, 1), defaults("played"), PLAYED_AT)
+        await storage.raise_infinite_high("scored", 50, 1, defaults("scored"), PLAYED_AT)
+        await storage.record_achievement_stats("idle", {}, {}, [], PLAYED_AT)
+        await storage.record_achievement_stats("played", {"levelsCompleted": 1}, {}, [], PLAYED_AT)
+
+        deleted = await storage.prune_untouched(batch_size=1)
+        assert deleted == {"player_progress": 1, "player_achievements": 1}
+        assert await storage.get_progress("idle") is None
+        assert await storage.get_progress("played") is not None
+        assert await storage.get_progress("scored") is not None
+        assert await storage.get_achievements("idle") is None
+        assert (await storage.get_achievements("played"))["stats"] == {"levelsCompleted": 1}
+
+    with_storage(scenario)
+
+
+def test_concurrent_completions_lose_nothing(with_storage):
+    # Every level is completed several times with varying results, all at once
+    completions = [
+        (level_id, 100 * level_id + attempt * 37 % 500, (level_id + attempt) % 4)
+        for attempt in range(6) for level_id in range(1, LEVEL_COUNT + 1)
+    ]
+    expected = defaults("p1")
+    for completion in completions:
+        apply_completion(expected, *completion, PLAYED_AT)
+
+    async def scenario(storage):
+        await asyncio.gather(*(
+            storage.complete_level("p1", completion, defaults("p1"), PLAYED_AT) for completion in completions
+        ))
+        progress_data = await storage.get_progress("p1")
+        for field in ("stars", "totalStars", "totalScore", "bestScores", "completedMask", "unlockedMask", "currentLevel"):
+            assert progress_data[field] == expected[field], field
+        assert progress_data["totalStars"] == sum(int(digit) for digit in progress_data["stars"])
+
+    with_storage(scenario)
+
+
+def test_insert_scores_skips_stored_ids(with_storage):
+    scores = [score(f"d{index}", "p1", 100 * index) for index in range(1, 4)]
+
+    async def scenario(storage):
+        await storage.insert_scores(scores[:2])
+        # A retried batch holds runs that were already written
+        await storage.insert_scores(scores)
+        assert [s["id"] for s in await storage.scores_page(None, 10)] == ["d3", "d2", "d1"]
+
+    with_storage(scenario)
@@ -0,0 +1,76 @@
+"""Infinite mode boards, checked against the frontend's generateWaveBoard.
+
+fixtures/wave_boards.json holds boards generateWaveBoard in frontend
+src/game/replay.js produced, as rows of colour codes (index in COLORS + 1).
+"""
+from pathlib import Path
+import json
+
+import numpy as np
+import pytest
+
+import waves
+from waves import BoardCache, generate_board, generate_boards, pack_board
+
+WAVE_BOARDS = json.loads((Path(__file__).parent / "fixtures" / "wave_boards.json").read_text())
+
+
+def packed(rows) -> bytes:
+    return "".join(rows).encode()
+
+
+@pytest.mark.parametrize("known", WAVE_BOARDS, ids=lambda known: f"{known['seed']}-{known['wave']}")
+def test_board_matches_generate_wave_board(known):
+    assert pack_board(generate_board(known["seed"], known["wave"])) == packed(known["board"])
+
+
+def test_batched_boards_match_single_boards():
+    seed = WAVE_BOARDS[0]["seed"]
+    known = {board["wave"]: packed(board["board"]) for board in WAVE_BOARDS if board["seed"] == seed}
+    boards = generate_boards(seed, np.array(sorted(known)))
+    assert [pack_board(board) for board in boards] == [known[wave] for wave in sorted(known)]
+
+
+def test_cache_prefetches_the_following_waves(monkeypatch):
+    expected = {(seed, wave): pack_board(generate_board(seed, wave)) for seed in (42, 43) for wave in range(5, 13)}
+    calls = []
+
+    def counting(seed, wave_numbers):
+        calls.append(wave_numbers.tolist())
+        return generate_boards(seed, wave_numbers)
+
+    monkeypatch.setattr(waves, "generate_boards", counting)
+    cache = BoardCache(prefetch=4)
+
+    assert cache.get(42, 5) == expected[42, 5]
+    assert calls == [[5, 6, 7, 8]]
+    for wave in (6, 7, 8):
+        assert cache.get(42, wave) == expected[42, wave]
+    assert len(calls) == 1
+
+    # Running past the prefetched waves fetches the next batch
+    assert cache.get(42, 9) == expected[42, 9]
+    assert calls[-1] == [9, 10, 11, 12]
+    assert cache.stats()["size"] == 8
+    # Other seeds are kept apart
+    assert cache.get(43, 5) == expected[43, 5]
+    assert cache.stats()["hits"] == 3
+
+
+@pytest.mark.parametrize("seed, wave, status", [
+    (0, 1, 200),
+    (0xFFFFFFFF, 100000, 200),
+    (0, 0, 404),
+    (0, 100001, 404),
+    (-1, 1, 404),
+    (0x100000000, 1, 404),
+])
+def test_board_endpoint_bounds(with_app, seed, wave, status):
+    async def scenario(client):
+        return await client.get(f"/api/infinite/board/{seed}/{wave}")
+
+    response = with_app(scenario)
+    assert response.status_code == status
+    if status == 200:
+        assert response.content == pack_board(generate_board(seed, wave))
+        assert "immutable" in response.headers["Cache-Control"]